@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# the streaming endpoints need the apps loaded by get_asgi_application
+from dashboard.streams import with_streams  # noqa: E402
+
+application = with_streams(application)
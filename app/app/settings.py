@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'drf_spectacular',
     'core',
+    'branch',
     'user',
     'teacher',
     'course',
@@ -48,11 +49,19 @@ INSTALLED_APPS = [
     'notification',
     'mobile_app',
     'dashboard',
+    'job',
+    'sync',
+    'report',
+    'recommendation',
+    'history',
     'corsheaders',
 
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.BranchMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +70,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -96,9 +106,175 @@ DATABASES = {
         'NAME' : os.environ.get('DB_NAME') ,
         'USER' : os.environ.get('DB_USER') ,
         'PASSWORD' : os.environ.get('DB_PASS') ,
+        # seconds a connection is kept open and reused by the next requests
+        # of its thread, 0 opens one per request
+        'CONN_MAX_AGE' : int(os.environ.get('DB_CONN_MAX_AGE', 60)) ,
     }
 }
 
+# Read replicas, DB_REPLICA_HOSTS is a comma separated list of hosts
+# sharing the credentials of the primary. DB_REPLICA_ALIAS adds a second
+# connection to the primary itself, handy to exercise the routing locally.
+
+DATABASE_REPLICAS = []
+
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip())
+    DATABASE_REPLICAS.append(alias)
+
+if os.environ.get('DB_REPLICA_ALIAS', '').lower() in ('1', 'true'):
+    DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append('replica')
+
+# Branches with their own database, DB_BRANCH_HOSTS is a comma separated
+# list of slug=host sharing the credentials of the primary, the branch
+# named by the slug is served by the branch_<slug> alias once its
+# database field says so, see branch.models
+
+BRANCH_DATABASES = []
+
+for item in filter(None, os.environ.get('DB_BRANCH_HOSTS', '').split(',')):
+    slug, _, host = item.partition('=')
+    alias = f'branch_{slug.strip()}'
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip())
+    BRANCH_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['core.db_router.BranchRouter', 'core.db_router.ReplicaRouter']
+
+
+# Caches, the default one is local to the process, the shared one is a
+# table of the primary seen by every worker, see core.migrations
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'shared_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# slug of the branch serving the unknown hosts, created by the migrations
+DEFAULT_BRANCH = os.environ.get('DEFAULT_BRANCH', 'main')
+# seconds a process serves its cached branches, writes reload them earlier
+BRANCH_CACHE_SECONDS = int(os.environ.get('BRANCH_CACHE_SECONDS', 300))
+
+# paths of the safe requests that may read from a replica
+REPLICA_READ_PATHS = [
+    r'^/api/mobile-app/',
+    r'^/api/dashboard/(students|staff|teachers|courses|tags|classroom|schedule-data|schedule|notification)/$',
+    r'^/api/dashboard/reports/',
+    r'^/api/dashboard/kpis/$',
+]
+# seconds a client reads from the primary after a write, the pin is kept
+# in a cookie and in the shared cache
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+# replicas lagging more than this many seconds are skipped
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 2))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+
+
+# Request instrumentation, see core.metrics
+
+REQUEST_METRICS_ENABLED = True
+# requests slower than this are logged with their slowest queries
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_QUERIES = 3
+# bearer token protecting /api/metrics/, when unset only the addresses of
+# METRICS_ALLOWED_IPS are served
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = list(filter(None, os.environ.get(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')))
+
+# seconds the dashboard KPIs are cached, writes drop them earlier
+KPI_CACHE_SECONDS = int(os.environ.get('KPI_CACHE_SECONDS', 30))
+
+# resolved notifications older than this are deleted by sweep_notifications,
+# or moved to the history by archive_history
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 30))
+# course archives older than this are moved to the history by archive_history,
+# see history.partitions, in partitions of a term of months
+HISTORY_HOT_DAYS = int(os.environ.get('HISTORY_HOT_DAYS', 365))
+HISTORY_PARTITION_MONTHS = 3
+
+
+# course ranking, see course.ranking: ratings at the mean of all the
+# comments added to every course, and the weight of ln(1 + enrollments)
+RANKING_PRIOR_WEIGHT = int(os.environ.get('RANKING_PRIOR_WEIGHT', 10))
+RANKING_ENROLLMENT_WEIGHT = float(os.environ.get('RANKING_ENROLLMENT_WEIGHT', 0.1))
+RANKING_MEAN_CACHE_SECONDS = 3600
+# pages of the mobile course list when the client asks for ?page_size
+MOBILE_PAGE_SIZE = 20
+MOBILE_MAX_PAGE_SIZE = 100
+# comments embedded in the mobile course detail, newest first, and the
+# pages of /api/mobile-app/courses/{id}/comments/
+COURSE_DETAIL_COMMENTS = 10
+COMMENT_PAGE_SIZE = 20
+COMMENT_MAX_PAGE_SIZE = 100
+
+
+# changes returned by a page of /api/mobile-app/sync/
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+
+# serve the flat read-only lists from core.compiled
+COMPILED_SERIALIZERS = os.environ.get('COMPILED_SERIALIZERS', 'true').lower() in ('1', 'true')
+
+# sub-requests accepted by /api/mobile-app/batch/, and threads of the process
+# running the parallel ones
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_THREADS = 4
+
+# neighbours kept per course by recommendation.similarity
+RECOMMENDATION_NEIGHBOURS = 20
+# seconds a worker serves its index before loading the recomputed courses
+RECOMMENDATION_REFRESH_SECONDS = int(os.environ.get('RECOMMENDATION_REFRESH_SECONDS', 60))
+# enrollments within this delay are refreshed by the same job
+RECOMMENDATION_DELAY_SECONDS = int(os.environ.get('RECOMMENDATION_DELAY_SECONDS', 30))
+RECOMMENDATION_PAGE_SIZE = 10
+RECOMMENDATION_MAX_PAGE_SIZE = 50
+
+# seconds a worker serves its autocomplete index before looking for
+# catalog changes, and before rebuilding it for the enrollment counts
+AUTOCOMPLETE_CHECK_SECONDS = float(os.environ.get('AUTOCOMPLETE_CHECK_SECONDS', 5))
+AUTOCOMPLETE_MAX_AGE_SECONDS = int(os.environ.get('AUTOCOMPLETE_MAX_AGE_SECONDS', 900))
+AUTOCOMPLETE_PAGE_SIZE = 10
+AUTOCOMPLETE_MAX_PAGE_SIZE = 20
+
+
+# Response compression, see core.middleware.CompressionMiddleware
+
+# bodies smaller than this gain nothing from compression
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = 6
+# brotli levels above 5 cost too much CPU for dynamic responses
+COMPRESSION_BROTLI_QUALITY = 4
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'application/msgpack',
+    'application/vnd.oai.openapi',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'application/javascript',
+]
+
+
+# Background jobs, run by `manage.py run_jobs`
+
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', 4))
+# seconds an idle worker waits before looking for retries and scheduled jobs
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 5))
+# a job whose worker stopped refreshing its lock for this long is taken over
+# by another worker, or failed when it has no attempts left
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))
+# the delay before a retry doubles with every failed attempt
+JOB_RETRY_BASE_SECONDS = 10
+JOB_RETRY_MAX_SECONDS = 3600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -149,10 +325,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS':'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
 }
 
+# precomputed schema files written by `manage.py build_schema`
+SCHEMA_ROOT = os.environ.get('SCHEMA_ROOT', BASE_DIR / 'schema')
+# versioned schema URLs never change, cache them for a year
+SCHEMA_CACHE_SECONDS = 365 * 24 * 60 * 60
+
 AUTH_USER_MODEL = 'user.User'
\ No newline at end of file
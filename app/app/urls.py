@@ -13,25 +13,33 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from drf_spectacular.views import(
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import (
+    metrics_view,
+    SchemaView,
+    SchemaSwaggerView,
+    VersionedSchemaView,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path('api/schema/', SchemaView.as_view(), name='api-schema'),
+    path(
+        'api/schema/<str:version>/',
+        VersionedSchemaView.as_view(),
+        name='api-schema-version',
+    ),
     path(
-       'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='api-schema'),
+        'api/docs/',
+        SchemaSwaggerView.as_view(url_name='api-schema'),
         name='api-docs',
     ),
     path('api/mobile-app/', include('mobile_app.urls')),
     path('api/dashboard/', include('dashboard.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
 
 ]
 
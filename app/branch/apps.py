@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class BranchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'branch'
+
+    def ready(self):
+        """reload the cached branches on writes"""
+        from branch import context
+
+        context.connect_signals()
@@ -0,0 +1,176 @@
+"""
+Branch of the current request
+
+core.middleware.BranchMiddleware serves a request in the branch of its
+host, the requests from unknown hosts in the DEFAULT_BRANCH one. Once
+DRF authenticated the request, the branch of the user takes over, so a
+token sees its own branch whatever the host; users without a branch
+follow the host. The database of a branch only follows the host, it is
+chosen before the user is known.
+
+Outside a request nothing is scoped, the commands and the jobs see
+every branch unless they run a block under use_branch.
+
+Every process caches the branches for BRANCH_CACHE_SECONDS, saving or
+deleting one reloads them once the transaction commits.
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import SimpleLazyObject, empty
+
+from branch.models import Branch
+
+
+# (request, branch of its host) of the current request
+_request = contextvars.ContextVar('branch_request', default=None)
+# branch of the blocks run under use_branch
+_forced = contextvars.ContextVar('branch_forced', default=None)
+
+_branches = None
+_lock = threading.Lock()
+
+
+class Branches:
+    """the branches by id, slug and host"""
+
+    def __init__(self, branches):
+        self.loaded_at = time.monotonic()
+        self.by_id = {branch.id: branch for branch in branches}
+        self.by_slug = {branch.slug: branch for branch in branches}
+        self.by_host = {branch.host.lower(): branch
+                        for branch in branches if branch.host}
+
+
+def _fresh(branches):
+    """the branches were loaded less than BRANCH_CACHE_SECONDS ago"""
+    return branches is not None and \
+        time.monotonic() - branches.loaded_at < settings.BRANCH_CACHE_SECONDS
+
+
+def cached_branches():
+    """the branches cached by the process, None when they have to be
+    loaded again, for the async code that cannot query"""
+    branches = _branches
+    return branches if _fresh(branches) else None
+
+
+def get_branches():
+    """the branches cached by the process"""
+    global _branches
+    branches = _branches
+    if _fresh(branches):
+        return branches
+    with _lock:
+        if not _fresh(_branches):
+            _branches = Branches(list(Branch.objects.order_by('id')))
+        return _branches
+
+
+def reload():
+    """load the branches again on the next lookup"""
+    global _branches
+    _branches = None
+
+
+def default_branch(branches=None):
+    """the branch of the requests from unknown hosts"""
+    if branches is None:
+        branches = get_branches()
+    try:
+        return branches.by_slug[settings.DEFAULT_BRANCH]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f'No branch with the slug {settings.DEFAULT_BRANCH!r}')
+
+
+def branch_of_host(host, branches=None):
+    """the branch serving a host, among the given branches or the
+    cached ones"""
+    if branches is None:
+        branches = get_branches()
+    return branches.by_host.get(host.lower()) or default_branch(branches)
+
+
+def activate(request, branch):
+    """serve the request in the branch, return a token to restore
+    the previous state"""
+    return _request.set((request, branch))
+
+
+def deactivate(token):
+    """restore the state before activate"""
+    _request.reset(token)
+
+
+@contextlib.contextmanager
+def use_branch(branch):
+    """scope the querysets of the block to the branch and send its
+    queries to the database of the branch"""
+    token = _forced.set(branch)
+    try:
+        yield branch
+    finally:
+        _forced.reset(token)
+
+
+def host_branch():
+    """the branch whose database serves the current queries,
+    None outside a request"""
+    forced = _forced.get()
+    if forced is not None:
+        return forced
+    state = _request.get()
+    return state[1] if state is not None else None
+
+
+def current_branch_id():
+    """id of the branch the querysets are scoped to, None when unscoped"""
+    forced = _forced.get()
+    if forced is not None:
+        return forced.id
+    state = _request.get()
+    if state is None:
+        return None
+
+    request, branch = state
+    user = getattr(request, 'user', None)
+    # the session user is not loaded for its branch, DRF replaces it
+    # with the user it authenticated
+    if not (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        branch_id = getattr(user, 'branch_id', None)
+        if branch_id is not None:
+            return branch_id
+    return branch.id
+
+
+def branch_of_new_rows():
+    """default branch of the scoped models, the current one or the
+    default branch when unscoped"""
+    branch_id = current_branch_id()
+    return branch_id if branch_id is not None else default_branch().id
+
+
+def users_of(branch_id):
+    """filter of the users of the branch, the users without a branch
+    follow the host and belong to every branch"""
+    return Q(branch_id=branch_id) | Q(branch__isnull=True)
+
+
+def connect_signals():
+    """reload the branches once a saved branch commits"""
+    def on_change(sender, **kwargs):
+        transaction.on_commit(reload)
+
+    post_save.connect(on_change, sender=Branch, weak=False,
+                      dispatch_uid='branch_saved')
+    post_delete.connect(on_change, sender=Branch, weak=False,
+                        dispatch_uid='branch_deleted')
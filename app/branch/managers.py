@@ -0,0 +1,57 @@
+"""
+Managers of the models belonging to a branch
+
+The querysets only see the rows of the current branch, see
+branch.context. A queryset built outside a request, like the class
+attribute of a viewset, is scoped when a request chains it, DRF always
+does with .all(). Related objects reached through a foreign key and
+the deletes cascaded by Django use the unscoped base manager.
+
+The models reaching their branch through a relation name the lookup
+of the branch in the lookup of their manager, like 'course__branch'.
+"""
+
+from django.db import models
+from django.db.models import Q
+
+from branch import context
+
+
+class BranchQuerySet(models.QuerySet):
+    """queryset filtered by the current branch"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._branch_lookup = 'branch'
+        # the branch the query is filtered by
+        self._branch_id = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._branch_lookup = self._branch_lookup
+        clone._branch_id = self._branch_id
+        return clone
+
+    def _chain(self):
+        return super()._chain()._scope()
+
+    def _scope(self):
+        """filter by the current branch unless already done"""
+        branch_id = context.current_branch_id()
+        if (branch_id is None or branch_id == self._branch_id
+                or self.query.is_sliced or self.query.combinator):
+            return self
+        self._branch_id = branch_id
+        self.query.add_q(Q(**{f'{self._branch_lookup}_id': branch_id}))
+        return self
+
+
+class BranchManager(models.Manager.from_queryset(BranchQuerySet)):
+    """manager of a model belonging to a branch"""
+    # also the lookup of the related managers, made from the class
+    lookup = 'branch'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        queryset._branch_lookup = self.lookup
+        return queryset._scope()
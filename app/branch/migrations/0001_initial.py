@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_branch(apps, schema_editor):
+    """the branch of the existing rows and of the unknown hosts"""
+    Branch = apps.get_model('branch', 'Branch')
+    Branch.objects.using(schema_editor.connection.alias).get_or_create(
+        slug=settings.DEFAULT_BRANCH, defaults={'name': settings.DEFAULT_BRANCH.title()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(unique=True)),
+                ('host', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('database', models.CharField(default='default', max_length=50)),
+            ],
+        ),
+        migrations.RunPython(create_default_branch, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+"""
+Models for the branches of the center
+
+Courses, teachers, classrooms and the schedule belong to a branch and
+their querysets only see the branch of the request, see branch.context.
+A large branch can be served by its own database, holding the whole
+schema with a copy of its branch row, see core.db_router.BranchRouter.
+"""
+
+from django.db import models
+
+
+class Branch(models.Model):
+    """a branch of the training center"""
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=50, unique=True)
+    # requests to this host are served by the branch
+    host = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    # alias of the database of the branch, see DB_BRANCH_HOSTS
+    database = models.CharField(max_length=50, default='default')
+
+    def __str__(self):
+        return self.name
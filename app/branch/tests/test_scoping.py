@@ -0,0 +1,151 @@
+"""
+The querysets scoped to the branch of the request, see branch.context
+and branch.managers
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from branch import context as branch_context
+from branch.models import Branch
+from course.models import Course
+from notification.models import Notification
+from teacher.models import Teacher
+
+
+class BranchTestCase(TestCase):
+    """a course of a teacher in the main branch and in another one"""
+
+    def setUp(self):
+        self.main = branch_context.default_branch()
+        self.other = Branch.objects.create(name='Other', slug='other',
+                                           host='other.test')
+        branch_context.reload()
+        self.addCleanup(branch_context.reload)
+        self.teachers = {}
+        self.courses = {}
+        for branch in (self.main, self.other):
+            teacher = self.teachers[branch.slug] = Teacher.objects.create(
+                email='teacher@branch.test', first_name='Teacher',
+                last_name=branch.name, gender='Male', branch=branch)
+            self.courses[branch.slug] = Course.objects.create(
+                name=f'course of {branch.slug}', price=100,
+                instructor=teacher, branch=branch)
+
+    def ids(self, queryset):
+        return sorted(queryset.values_list('id', flat=True))
+
+
+class ScopingTests(BranchTestCase):
+    """the querysets of the scoped models"""
+
+    def test_unscoped(self):
+        self.assertEqual(Course.objects.count(), 2)
+
+    def test_scoped(self):
+        with branch_context.use_branch(self.other):
+            self.assertEqual(self.ids(Course.objects.all()),
+                             [self.courses['other'].id])
+            self.assertEqual(self.ids(Teacher.objects.filter(
+                email='teacher@branch.test')), [self.teachers['other'].id])
+
+    def test_chained_in_the_branch(self):
+        # like the queryset of a viewset, built at import
+        queryset = Course.objects.all()
+        with branch_context.use_branch(self.other):
+            chained = queryset.all()
+            self.assertEqual(self.ids(chained), [self.courses['other'].id])
+            # filtered once
+            self.assertEqual(str(chained.filter(price=100).query)
+                             .count('"branch_id" ='), 1)
+        self.assertEqual(len(queryset), 2)
+
+    def test_relations(self):
+        with branch_context.use_branch(self.other):
+            self.assertEqual(self.ids(self.teachers['main'].courses.all()),
+                             [])
+            self.assertEqual(self.ids(Notification.objects.all()), [])
+            # foreign keys use the base manager
+            course = Course.objects.get()
+            self.assertEqual(course.instructor, self.teachers['other'])
+            Notification.objects.notify(self.courses['main'], 'new', 'hi')
+            self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_new_rows(self):
+        with branch_context.use_branch(self.other):
+            course = Course.objects.create(
+                name='new', price=100, instructor=self.teachers['other'])
+        self.assertEqual(course.branch, self.other)
+        self.assertEqual(Course(name='unscoped').branch, self.main)
+
+    def test_teacher_email_per_branch(self):
+        Teacher.objects.create(email='new@branch.test', gender='Male',
+                               branch=self.other)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Teacher.objects.create(email='teacher@branch.test',
+                                   gender='Male', branch=self.other)
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class RequestBranchTests(BranchTestCase):
+    """the branch of a request, by host and by user"""
+
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.roaming = User.objects.create(email='roaming@branch.test')
+        self.member = User.objects.create(email='member@branch.test',
+                                          branch=self.main)
+        self.staff = User.objects.create(email='staff@branch.test',
+                                         is_staff=True)
+
+    def courses_of(self, user, host):
+        client = APIClient(HTTP_HOST=host)
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = client.get('/api/mobile-app/courses/')
+        self.assertEqual(response.status_code, 200)
+        return sorted(course['id'] for course in response.json())
+
+    def test_users_without_a_branch_follow_the_host(self):
+        self.assertIsNone(self.roaming.branch)
+        self.assertEqual(self.courses_of(self.roaming, 'other.test'),
+                         [self.courses['other'].id])
+        self.assertEqual(self.courses_of(self.roaming, 'unknown.test'),
+                         [self.courses['main'].id])
+
+    def test_users_of_a_branch(self):
+        self.assertEqual(self.courses_of(self.member, 'other.test'),
+                         [self.courses['main'].id])
+
+    def test_users_created_in_a_request(self):
+        with branch_context.use_branch(self.other):
+            user = get_user_model().objects.create(email='new@branch.test')
+        self.assertEqual(user.branch, self.other)
+
+    def create_teacher(self, host, email):
+        client = APIClient(HTTP_HOST=host)
+        client.force_authenticate(self.staff)
+        return client.post('/api/dashboard/teachers/', {
+            'email': email, 'first_name': 'New', 'last_name': 'Teacher',
+            'phone_number': '0123456789', 'address': 'street',
+            'gender': 'Female',
+        }, format='json')
+
+    def test_teacher_email_checked_in_the_branch(self):
+        response = self.create_teacher('other.test', 'main@branch.test')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['branch'], self.other.id)
+
+        response = self.create_teacher('main.test', 'main@branch.test')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['branch'], self.main.id)
+
+        response = self.create_teacher('other.test', 'main@branch.test')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
@@ -2,10 +2,9 @@
 Django admin cutomization
 """
 from django.contrib import admin
+from branch.models import Branch
 from user import models as UserModels
 
 
 admin.site.register(UserModels.User)
-
-
-
+admin.site.register(Branch)
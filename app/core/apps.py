@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        """install the request instrumentation"""
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from core import metrics
+
+        if getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            connection_created.connect(metrics.install_query_recorder)
+            metrics.install_serializer_timer()
@@ -0,0 +1,165 @@
+"""
+Precompiled read-only serializers for list endpoints
+
+A serializer made of column fields, files and nested serializers of
+foreign keys is compiled once into the columns it reads and a row to
+dict transform. The rows are read with values_list(), so a list builds
+no model instance and no bound field per row. Every value still goes
+through the to_representation() of its serializer field and files are
+turned into URLs like FileField does, the output is the one of the
+serializer.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields, relations, serializers
+from rest_framework.settings import api_settings
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from core.metrics import timed_data
+
+
+# field classes needing the instance or the request to represent a value
+UNSUPPORTED_FIELDS = (fields.SerializerMethodField, fields.HiddenField,
+                      fields.ModelField)
+
+
+class NotCompilable(Exception):
+    """the serializer needs model instances"""
+
+
+def file_url(value, request, storage, use_url):
+    """what FileField.to_representation returns for a stored file name"""
+    if not value:
+        return None
+    if not use_url:
+        return value
+    try:
+        url = storage.url(value)
+    except AttributeError:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _represent(to_representation):
+    def convert(value, request):
+        return to_representation(value)
+    return convert
+
+
+def _raw(value, request):
+    return value
+
+
+class CompiledSerializer:
+    """the columns a serializer reads and the transform of a row of
+    those columns into the representation of the serializer"""
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.columns = []
+        self.steps = self.compile(serializer, self.model, '')
+
+    def column(self, path):
+        """index of a column in the rows"""
+        self.columns.append(path)
+        return len(self.columns) - 1
+
+    def compile(self, serializer, model, prefix):
+        """return the (name, column, convert, nested steps) of every
+        readable field of the serializer"""
+        serializer_class = type(serializer)
+        if serializer_class.to_representation is not \
+                serializers.Serializer.to_representation:
+            raise NotCompilable(
+                f'{serializer_class.__name__} overrides to_representation')
+        return [self.compile_field(field, model, prefix)
+                for field in serializer.fields.values()
+                if not field.write_only]
+
+    def compile_field(self, field, model, prefix):
+        """return the step representing a field"""
+        name = field.field_name
+        if field.source == '*' or len(field.source_attrs) != 1:
+            raise NotCompilable(f'{name} does not read a model field')
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise NotCompilable(f'{name} does not read a model field')
+        path = prefix + model_field.name
+        foreign_key = model_field.concrete and (model_field.many_to_one
+                                                or model_field.one_to_one)
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) \
+                    or not foreign_key:
+                raise NotCompilable(f'{name} is a nested list')
+            # the foreign key column tells a missing object
+            nested = self.compile(field, model_field.related_model,
+                                  path + '__')
+            return (name, self.column(path), None, nested)
+
+        if model_field.is_relation:
+            if (foreign_key
+                    and isinstance(field, relations.PrimaryKeyRelatedField)
+                    and field.pk_field is None):
+                return (name, self.column(path), _raw, None)
+            raise NotCompilable(
+                f'{name} is a {type(field).__name__} relation')
+
+        if isinstance(field, UNSUPPORTED_FIELDS) \
+                or type(field).__module__ != fields.__name__:
+            raise NotCompilable(f'{name} is a {type(field).__name__}')
+        if isinstance(field, fields.FileField):
+            use_url = getattr(field, 'use_url',
+                              api_settings.UPLOADED_FILES_USE_URL)
+            storage = model_field.storage
+
+            def convert(value, request):
+                return file_url(value, request, storage, use_url)
+            return (name, self.column(path), convert, None)
+        return (name, self.column(path),
+                _represent(field.to_representation), None)
+
+    def represent(self, steps, row, request):
+        """return the representation of a row"""
+        data = {}
+        for name, index, convert, nested in steps:
+            value = row[index]
+            if value is None:
+                data[name] = None
+            elif nested is not None:
+                data[name] = self.represent(nested, row, request)
+            else:
+                data[name] = convert(value, request)
+        return data
+
+    def __call__(self, queryset, context=None):
+        """bind the compiled serializer to a queryset"""
+        return CompiledListSerializer(self, queryset, context or {})
+
+
+class CompiledListSerializer:
+    """a compiled serializer applied to a queryset, standing in for
+    a read-only list serializer"""
+
+    many = True
+
+    def __init__(self, compiled, queryset, context):
+        self.compiled = compiled
+        self.queryset = queryset
+        self.context = context
+
+    def rows(self):
+        """the columns of the serializer, prefetches would need instances"""
+        return (self.queryset.prefetch_related(None)
+                .values_list(*self.compiled.columns))
+
+    def _data(self):
+        request = self.context.get('request')
+        compiled = self.compiled
+        return ReturnList([compiled.represent(compiled.steps, row, request)
+                           for row in self.rows()], serializer=self)
+
+    data = timed_data(property(_data))
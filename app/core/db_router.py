@@ -0,0 +1,138 @@
+"""
+Database routers sending the queries of a branch to its own database
+and the safe reads to the read replicas
+"""
+
+import contextvars
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import DatabaseError
+
+from branch import context as branch_context
+
+
+# alias of the replica chosen for the current request, None means primary
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+# app label of the table of the database caches
+SHARED_CACHE_LABEL = 'django_cache'
+
+# alias -> (checked_at, lag in seconds)
+_lag_cache = {}
+
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+"""
+
+
+def get_replicas():
+    """return the aliases of the configured replicas"""
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def replica_lag(alias):
+    """return the replication lag of the replica in seconds,
+    the value is cached for a few seconds per process"""
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+    now = time.monotonic()
+    checked_at, lag = _lag_cache.get(alias, (None, None))
+    if checked_at is not None and now - checked_at < interval:
+        return lag
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            lag = float(cursor.fetchone()[0])
+    except DatabaseError:
+        # an unreachable replica is as good as an infinitely lagging one
+        lag = float('inf')
+
+    _lag_cache[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """return a replica that is not lagging or None for the primary"""
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG', 2)
+    healthy = [alias for alias in get_replicas()
+               if replica_lag(alias) <= max_lag]
+    if not healthy:
+        return None
+    return random.choice(healthy)
+
+
+def use_replica(alias):
+    """route the reads of the current context to the alias,
+    return a token to restore the previous routing"""
+    return _read_alias.set(alias)
+
+
+def reset_replica(token):
+    """restore the routing before use_replica"""
+    _read_alias.reset(token)
+
+
+class BranchRouter:
+    """send the queries of a branch with its own database there, the
+    branches themselves, the job queue and the shared cache stay on the
+    primary"""
+
+    # the job workers claim the jobs of every branch from the primary
+    primary_labels = ('branch', 'job', SHARED_CACHE_LABEL)
+
+    def _branch_database(self, model):
+        branch = branch_context.host_branch()
+        if (branch is None or branch.database == DEFAULT_DB_ALIAS
+                or model._meta.app_label in self.primary_labels):
+            return None
+        return branch.database
+
+    def db_for_read(self, model, **hints):
+        """read from the database of the branch"""
+        return self._branch_database(model)
+
+    def db_for_write(self, model, **hints):
+        """write to the database of the branch"""
+        return self._branch_database(model)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """the branch databases hold the whole schema"""
+        if db in getattr(settings, 'BRANCH_DATABASES', []):
+            return True
+        return None
+
+
+class ReplicaRouter:
+    """send reads to the replica selected for the request
+    and everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        """read from the replica of the request if there is one, the
+        shared cache is read from the primary, where it is written"""
+        if model._meta.app_label == SHARED_CACHE_LABEL:
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """always write to the primary"""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """primary and replicas hold the same data"""
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """replicas are migrated through replication"""
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,59 @@
+"""
+Django command to move the old archives and notifications to the history
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from history import partitions
+
+
+class Command(BaseCommand):
+    """Django command to move the old rows to the partitioned history"""
+
+    help = ('Move the course archives older than --days and the notifications '
+            'resolved more than --notification-days ago to the history '
+            'tables, export the history partitions ending before '
+            '--export-before')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.HISTORY_HOT_DAYS)
+        parser.add_argument('--notification-days', type=int,
+                            default=settings.NOTIFICATION_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--export-before', type=datetime.fromisoformat,
+                            help='date, the partitions ending before it '
+                                 'are exported and dropped')
+        parser.add_argument('--export-dir', default='.',
+                            help='directory of the exported .csv.gz files')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        now = timezone.now()
+        archives = partitions.move_archives(
+            now - timedelta(days=options['days']), options['batch_size'])
+        notifications = partitions.move_notifications(
+            now - timedelta(days=options['notification_days']),
+            options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{archives} archives and {notifications} notifications '
+            f'moved to the history !'
+        ))
+
+        before = options['export_before']
+        if before is None:
+            return
+        if not os.path.isdir(options['export_dir']):
+            raise CommandError(f"{options['export_dir']} is not a directory")
+        if timezone.is_naive(before):
+            before = timezone.make_aware(before)
+        paths = partitions.export_partitions(before, options['export_dir'])
+        for path in paths:
+            self.stdout.write(path)
+        self.stdout.write(
+            self.style.SUCCESS(f'{len(paths)} partitions exported !'))
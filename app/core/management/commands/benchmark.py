@@ -0,0 +1,278 @@
+"""
+Django command to benchmark the API endpoints of a running server
+"""
+
+import http.client
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from course.models import Course
+
+
+QUERIES_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class Fixtures:
+    """ids and tokens the scenarios pick their requests from"""
+
+    def __init__(self, samples=500):
+        course_ids = list(Course.objects.values_list('id', flat=True)
+                          [:samples * 4])
+        students = list(get_user_model().objects
+                        .filter(is_staff=False, is_superuser=False)
+                        .values_list('id', flat=True)[:samples])
+        if not course_ids or not students:
+            raise CommandError('No data to benchmark, run seed_data first')
+
+        self.course_ids = course_ids
+        self.student_ids = students
+        self.tokens = {
+            user_id: Token.objects.get_or_create(user_id=user_id)[0].key
+            for user_id in students[:50]
+        }
+        self.search_terms = ['py', 'data', 'web', 'Sara', 'design', 'math']
+        self.lock = threading.Lock()
+        self.used_pairs = set()
+
+    def course(self):
+        return random.choice(self.course_ids)
+
+    def token(self):
+        return random.choice(list(self.tokens.values()))
+
+    def new_pair(self, student_ids=None):
+        """a (student, course) pair not used by this run"""
+        student_ids = student_ids or self.student_ids
+        with self.lock:
+            while True:
+                pair = (random.choice(student_ids), self.course())
+                if pair not in self.used_pairs:
+                    self.used_pairs.add(pair)
+                    return pair
+
+
+def _auth(token):
+    return {'Authorization': f'Token {token}'}
+
+
+def _register(fixtures):
+    student_id, course_id = fixtures.new_pair(list(fixtures.tokens))
+    return ('POST', '/api/mobile-app/course-register/',
+            {'id': course_id}, _auth(fixtures.tokens[student_id]))
+
+
+def _add_student(fixtures):
+    student_id, course_id = fixtures.new_pair()
+    return ('POST', '/api/dashboard/courses/add_student/',
+            {'student_id': student_id, 'course_id': course_id}, {})
+
+
+SCENARIOS = {
+    'course-list': lambda f: ('GET', '/api/mobile-app/courses/', None, {}),
+    'course-detail': lambda f: (
+        'GET', f'/api/mobile-app/courses/{f.course()}/', None, {}),
+    'search': lambda f: (
+        'GET',
+        f'/api/mobile-app/courses/?search={random.choice(f.search_terms)}',
+        None, {}),
+    'student-courses': lambda f: (
+        'GET', '/api/mobile-app/get-courses/', None, _auth(f.token())),
+    'dashboard-course-detail': lambda f: (
+        'GET', f'/api/dashboard/courses/{f.course()}/', None, {}),
+    'schedule': lambda f: ('GET', '/api/dashboard/schedule/', None, {}),
+    'register': _register,
+    'add-student': _add_student,
+    'async-course-list': lambda f: (
+        'GET', '/api/mobile-app/async/courses/', None, {}),
+    'async-course-detail': lambda f: (
+        'GET', f'/api/mobile-app/async/courses/{f.course()}/', None, {}),
+}
+
+DEFAULT_SCENARIOS = ['course-list', 'course-detail', 'search',
+                     'student-courses', 'dashboard-course-detail', 'schedule',
+                     'register', 'add-student']
+
+
+def percentile(values, q):
+    """nearest rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q * len(values)) - 1))
+    return values[index]
+
+
+class Worker:
+    """a client keeping one keep-alive connection to the server"""
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        connection_class = (http.client.HTTPSConnection
+                            if url.scheme == 'https'
+                            else http.client.HTTPConnection)
+        self.connection = connection_class(url.netloc, timeout=timeout)
+
+    def request(self, method, path, body, headers):
+        """send a request and return (status, seconds, queries, db_ms)"""
+        headers = dict(headers, Accept='application/json')
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            return 0, time.perf_counter() - start, None, None
+        elapsed = time.perf_counter() - start
+
+        match = QUERIES_RE.search(response.getheader('Server-Timing', ''))
+        if match:
+            return (response.status, elapsed, int(match.group(2)),
+                    float(match.group(1)))
+        return response.status, elapsed, None, None
+
+
+def run_scenario(name, fixtures, base_url, concurrency, requests, duration,
+                 timeout):
+    """run one scenario with concurrent workers and summarize it"""
+    build = SCENARIOS[name]
+    results = []
+    lock = threading.Lock()
+    counter = iter(range(requests)) if requests else None
+    deadline = time.monotonic() + duration
+
+    def work():
+        worker = Worker(base_url, timeout)
+        local = []
+        while time.monotonic() < deadline:
+            if counter is not None:
+                with lock:
+                    if next(counter, None) is None:
+                        break
+            local.append(worker.request(*build(fixtures)))
+        with lock:
+            results.extend(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(work)
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed * 1000 for _, elapsed, _, _ in results)
+    queries = [count for _, _, count, _ in results if count is not None]
+    db_times = [db_ms for _, _, _, db_ms in results if db_ms is not None]
+    errors = sum(1 for status, _, _, _ in results if not 200 <= status < 300)
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'throughput_rps': round(len(results) / wall, 2) if wall else 0,
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 2) if latencies else 0,
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0,
+        },
+        'queries': {
+            'mean': round(statistics.mean(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+        'db_ms_mean': (round(statistics.mean(db_times), 2)
+                       if db_times else None),
+    }
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API"""
+
+    help = ('Drive the API of a running server with concurrent workers and '
+            'store throughput, latency percentiles and query counts as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--scenarios', nargs='+',
+                            default=DEFAULT_SCENARIOS,
+                            choices=sorted(SCENARIOS))
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='seconds per scenario')
+        parser.add_argument('--requests', type=int, default=0,
+                            help='stop a scenario after this many requests')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--label', default='')
+        parser.add_argument('--output', help='file to store the results in')
+        parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                            help='compare two result files instead of running')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        if options['compare']:
+            return self.compare(*options['compare'])
+
+        fixtures = Fixtures()
+        report = {
+            'label': options['label'],
+            'started_at': timezone.now().isoformat(),
+            'base_url': options['base_url'],
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'scenarios': {},
+        }
+        for name in options['scenarios']:
+            self.stdout.write(f'Running {name}...')
+            summary = run_scenario(name, fixtures, options['base_url'],
+                                   options['concurrency'], options['requests'],
+                                   options['duration'], options['timeout'])
+            report['scenarios'][name] = summary
+            self.stdout.write(
+                f"  {summary['throughput_rps']} req/s, "
+                f"p50 {summary['latency_ms']['p50']}ms, "
+                f"p99 {summary['latency_ms']['p99']}ms, "
+                f"queries {summary['queries']['mean']}, "
+                f"errors {summary['errors']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results saved to {options['output']}"))
+
+    def compare(self, base_path, new_path):
+        """print the change of every metric between two runs"""
+        with open(base_path) as base_file, open(new_path) as new_file:
+            base = json.load(base_file)['scenarios']
+            new = json.load(new_file)['scenarios']
+
+        for name in sorted(set(base) & set(new)):
+            self.stdout.write(name)
+            for label, getter in (
+                ('throughput_rps', lambda s: s['throughput_rps']),
+                ('p50_ms', lambda s: s['latency_ms']['p50']),
+                ('p95_ms', lambda s: s['latency_ms']['p95']),
+                ('p99_ms', lambda s: s['latency_ms']['p99']),
+                ('queries', lambda s: s['queries']['mean']),
+            ):
+                old_value, new_value = getter(base[name]), getter(new[name])
+                if old_value is None or new_value is None:
+                    continue
+                change = ((new_value - old_value) / old_value * 100
+                          if old_value else 0)
+                self.stdout.write(f'  {label:<15} {old_value:>10} -> '
+                                  f'{new_value:>10} ({change:+.1f}%)')
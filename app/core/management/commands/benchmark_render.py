@@ -0,0 +1,152 @@
+"""
+Django command to benchmark the rendering, parsing and compression of
+the largest API responses
+"""
+
+import gzip
+import json
+import statistics
+import time
+from functools import partial
+
+import msgpack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.renderers import FastJSONRenderer, MessagePackRenderer, orjson
+from course.models import Course
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ENDPOINTS = {
+    'students': '/api/dashboard/students/',
+    'dashboard-course-detail': '/api/dashboard/courses/{course}/',
+    'course-students': '/api/dashboard/courses/{course}/get_students/',
+    'schedule': '/api/dashboard/schedule/',
+    'course-list': '/api/mobile-app/courses/',
+    'mobile-course-detail': '/api/mobile-app/courses/{course}/',
+}
+
+
+def best_of(func, repeat):
+    """median seconds of a call and its last result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the renderers and the compression"""
+
+    help = ('Fetch the largest endpoints in process and compare the render '
+            'time of the DRF, fast JSON and MessagePack renderers, the parse '
+            'time of JSON and MessagePack and the bytes on the wire with gzip '
+            'and brotli')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS),
+                            choices=sorted(ENDPOINTS))
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--output', help='file to store the results in')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        course = (Course.objects.annotate(total=Count('enrollments'))
+                  .order_by('-total').first())
+        staff = get_user_model().objects.filter(is_staff=True).first()
+        if course is None or staff is None:
+            raise CommandError('No data to benchmark, run seed_data first')
+
+        client = APIClient()
+        client.force_authenticate(staff)
+        renderers = {'drf': JSONRenderer(), 'fast': FastJSONRenderer(),
+                     'msgpack': MessagePackRenderer()}
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson is not installed, the fast renderer falls back to '
+                'json'))
+
+        report = {}
+        for name in options['endpoints']:
+            path = ENDPOINTS[name].format(course=course.id)
+            with override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=[]):
+                response = client.get(path, HTTP_ACCEPT='application/json')
+            if response.status_code != 200:
+                raise CommandError(f'{path} answered {response.status_code}')
+
+            result = {'path': path}
+            outputs = {}
+            for label, renderer in renderers.items():
+                seconds, outputs[label] = best_of(
+                    lambda: renderer.render(response.data,
+                                            'application/json', {}),
+                    options['repeat'],
+                )
+                result[f'{label}_render_ms'] = round(seconds * 1000, 2)
+            parsed = {}
+            for label, loads in (
+                    ('json', json.loads),
+                    ('msgpack', partial(msgpack.unpackb, raw=False))):
+                content = outputs['fast' if label == 'json' else label]
+                seconds, parsed[label] = best_of(lambda: loads(content),
+                                                 options['repeat'])
+                result[f'{label}_parse_ms'] = round(seconds * 1000, 2)
+            if not (json.loads(outputs['drf']) == parsed['json']
+                    == parsed['msgpack']):
+                raise CommandError(f'{path}: the renderers disagree')
+            gzip_level = settings.COMPRESSION_GZIP_LEVEL
+            result['msgpack_bytes'] = len(outputs['msgpack'])
+            result['msgpack_gzip_bytes'] = len(
+                gzip.compress(outputs['msgpack'], gzip_level, mtime=0)
+            )
+
+            content = outputs['fast']
+            result['bytes'] = len(content)
+            seconds, compressed = best_of(
+                lambda: gzip.compress(content, gzip_level, mtime=0),
+                options['repeat'],
+            )
+            result.update(gzip_bytes=len(compressed),
+                          gzip_ms=round(seconds * 1000, 2))
+            if brotli is not None:
+                quality = settings.COMPRESSION_BROTLI_QUALITY
+                seconds, compressed = best_of(
+                    lambda: brotli.compress(content, quality=quality),
+                    options['repeat'],
+                )
+                result.update(br_bytes=len(compressed),
+                              br_ms=round(seconds * 1000, 2))
+
+            report[name] = result
+            self.stdout.write(
+                f"{name}: {result['bytes']} bytes, render "
+                f"{result['drf_render_ms']}ms -> "
+                f"{result['fast_render_ms']}ms, "
+                f"msgpack {result['msgpack_bytes']} bytes "
+                f"({result['msgpack_gzip_bytes']} gzipped) "
+                f"rendered in {result['msgpack_render_ms']}ms, parse "
+                f"{result['json_parse_ms']}ms -> "
+                f"{result['msgpack_parse_ms']}ms, "
+                f"gzip {result['gzip_bytes']} bytes in {result['gzip_ms']}ms"
+                + (f", br {result['br_bytes']} bytes in {result['br_ms']}ms"
+                   if brotli is not None else '')
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results saved to {options['output']}"))
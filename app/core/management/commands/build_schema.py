@@ -0,0 +1,73 @@
+"""
+Django command to precompute the OpenAPI schema
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    """Django command to build the schema served by /api/schema/"""
+
+    help = ('Render the OpenAPI schema into SCHEMA_ROOT, named after a hash '
+            'of the code, so the workers do not generate it on demand')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='rebuild even if the current version exists')
+        parser.add_argument('--check', action='store_true',
+                            help='exit with an error if the current '
+                                 'version is missing')
+        parser.add_argument('--keep', type=int, default=3,
+                            help='number of older versions to keep')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        version = schema.source_version()
+        paths = {fmt: schema.schema_path(fmt, version)
+                 for fmt in schema.RENDERERS}
+        up_to_date = all(path.exists() for path in paths.values())
+
+        if options['check']:
+            if not up_to_date:
+                self.stderr.write(f'Schema {version} is not built')
+                sys.exit(1)
+            self.stdout.write(
+                self.style.SUCCESS(f'Schema {version} is up to date'))
+            return
+
+        if up_to_date and not options['force']:
+            self.stdout.write(f'Schema {version} is up to date')
+            return
+
+        generated = schema.generate_schema()
+        Path(settings.SCHEMA_ROOT).mkdir(parents=True, exist_ok=True)
+        for fmt, path in paths.items():
+            # write then rename, a worker never reads a partial file
+            tmp_path = path.with_name(f'.{path.name}.tmp')
+            tmp_path.write_bytes(schema.render_schema(generated, fmt))
+            os.replace(tmp_path, path)
+            self.stdout.write(f'Wrote {path}')
+
+        self.prune(version, options['keep'])
+        self.stdout.write(self.style.SUCCESS(f'Schema {version} built !'))
+
+    def prune(self, version, keep):
+        """remove the oldest versions"""
+        versions = {}
+        for path in Path(settings.SCHEMA_ROOT).glob('openapi-*.*'):
+            name = path.stem[len('openapi-'):]
+            if name != version:
+                versions.setdefault(name, []).append(path)
+
+        by_age = sorted(versions.values(), key=lambda paths: max(
+            path.stat().st_mtime for path in paths))
+        for paths in by_age[:max(0, len(by_age) - keep)]:
+            for path in paths:
+                path.unlink()
@@ -0,0 +1,182 @@
+"""
+Django command to check the compiled serializers against DRF
+
+Every list route served by CompiledListMixin is called on a generated
+dataset with the compiled serializers turned off and on, for a few
+?fields selections and both JSON and MessagePack. The command fails
+unless the serializer of the route compiles and both responses are the
+same bytes, --benchmark also times both paths.
+"""
+
+import re
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from core.compiled import CompiledSerializer, NotCompilable
+from core.management.commands.check_query_budgets import Dataset, discover
+from core.mixins import CompiledListMixin
+from course.models import Course
+from teacher.models import Teacher
+
+
+QUERIES = ['', '?fields=id,name', '?fields=id,image,instructor.last_name',
+           '?search=1']
+ACCEPT = ['application/json', 'application/msgpack']
+SERIALIZE_RE = re.compile(r'serialize;dur=([\d.]+)')
+
+
+def add_edge_cases(dataset):
+    """rows exercising the conversions of the compiled serializers"""
+    User = get_user_model()
+    teacher = Teacher.objects.create(email='edge@budget.test',
+                                     first_name='Zoë', last_name='',
+                                     gender='Female',
+                                     image='uploads/teachers/a b.png')
+    Course.objects.bulk_create([
+        Course(name='Ünïcode “course”  ', price=Decimal('12345.67891'),
+               instructor=teacher, image='uploads/courses/with space.jpg',
+               rating='4.5'),
+        Course(name='cheap', price=Decimal('0.00001'), instructor=teacher,
+               rating=1),
+        Course(name='round', price=Decimal('10'), instructor=teacher,
+               image='uploads/courses/%41.png'),
+    ])
+    User.objects.create(email='edge@student.test', first_name='Édith',
+                        image='uploads/users/ü.png', gender='Female')
+    User.objects.create(email='edge2@student.test', image='', gender='Male')
+    User.objects.create(email='edge@staff.test', is_staff=True,
+                        is_superuser=True, image='uploads/users/staff.png')
+
+
+def list_routes():
+    """return the list routes of the compiled views"""
+    routes = {}
+    for key, spec in discover().items():
+        callback = spec['callback']
+        view_class = getattr(callback, 'cls', None)
+        actions = getattr(callback, 'actions', None) or {}
+        if (view_class is not None
+                and issubclass(view_class, CompiledListMixin)
+                and actions.get('get') == 'list'):
+            routes[key.split(' ', 1)[1]] = spec
+    return routes
+
+
+def serializer_class(callback):
+    """the serializer of the list action of a viewset"""
+    view = callback.cls(action_map=callback.actions, **callback.initkwargs)
+    view.action = 'list'
+    view.format_kwarg = None
+    return view.get_serializer_class()
+
+
+def serialize_ms(response):
+    """serializer time reported in the Server-Timing header"""
+    match = SERIALIZE_RE.search(response.get('Server-Timing', ''))
+    return float(match.group(1)) if match else 0.0
+
+
+class Command(BaseCommand):
+    """Django command to check the compiled serializers"""
+
+    help = ('Compare the responses of the compiled list serializers with '
+            'the DRF serializers and optionally benchmark both')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=5,
+                            help='size of the generated dataset')
+        parser.add_argument('--benchmark', action='store_true',
+                            help='time both paths of every route')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--keepdb', action='store_true',
+                            help='reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                           keepdb=options['keepdb'])
+        try:
+            dataset = Dataset(options['size'])
+            add_edge_cases(dataset)
+            with override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=[]):
+                failures = self.compare(dataset, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                keepdb=options['keepdb'])
+
+        if failures:
+            message = ['Compiled serializer check failed:'] + failures
+            raise CommandError('\n'.join(message))
+        self.stdout.write(
+            self.style.SUCCESS('The compiled serializers match DRF'))
+
+    def compare(self, dataset, options):
+        """compare both paths of every route and return the failures"""
+        failures = []
+        for path, spec in list_routes().items():
+            serializer = serializer_class(spec['callback'])
+            try:
+                CompiledSerializer(serializer())
+            except NotCompilable as exc:
+                failures.append(f'{path}: {serializer.__name__} '
+                                f'does not compile, {exc}')
+                continue
+
+            client = APIClient()
+            client.force_authenticate(dataset.user(spec['user']))
+            renderers = spec['callback'].cls.renderer_classes
+            media_types = [renderer.media_type for renderer in renderers
+                           if renderer.media_type in ACCEPT]
+            for query in QUERIES:
+                for accept in media_types:
+                    with override_settings(COMPILED_SERIALIZERS=False):
+                        expected = client.get(path + query,
+                                              HTTP_ACCEPT=accept)
+                    response = client.get(path + query, HTTP_ACCEPT=accept)
+                    if response.status_code != 200 \
+                            or expected.status_code != 200:
+                        failures.append(f'{path}{query}: status '
+                                        f'{expected.status_code} '
+                                        f'-> {response.status_code}')
+                    elif response.content != expected.content:
+                        failures.append(f'{path}{query} ({accept}): '
+                                        f'the responses differ\n'
+                                        f'    {expected.content[:200]!r}\n'
+                                        f'    {response.content[:200]!r}')
+            self.stdout.write(f'{path}: {serializer.__name__} checked')
+
+            if options['benchmark']:
+                self.benchmark(client, path, options['repeat'])
+        return failures
+
+    def benchmark(self, client, path, repeat):
+        """print the median request and serializer time of both paths"""
+        results = {}
+        for compiled in (False, True):
+            totals, serializing = [], []
+            with override_settings(COMPILED_SERIALIZERS=compiled):
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    response = client.get(path,
+                                          HTTP_ACCEPT='application/json')
+                    totals.append((time.perf_counter() - start) * 1000)
+                    serializing.append(serialize_ms(response))
+            results[compiled] = (statistics.median(totals),
+                                 statistics.median(serializing),
+                                 len(response.data))
+        drf_total, drf_serialize, rows = results[False]
+        total, serialize, _ = results[True]
+        self.stdout.write(
+            f'    {rows} rows: serialize {drf_serialize:.1f}ms -> '
+            f'{serialize:.1f}ms, '
+            f'request {drf_total:.1f}ms -> {total:.1f}ms '
+            f'({drf_total / max(total, 0.001):.1f}x)'
+        )
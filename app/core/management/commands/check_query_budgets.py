@@ -0,0 +1,416 @@
+"""
+Django command to check the query budget of every API endpoint
+
+Every route of the dashboard and the mobile app is called against a
+generated dataset at two sizes inside a rolled back transaction. A route
+fails when its query count changes with the size of the data (an N+1)
+or exceeds the budget recorded in core/query_budgets.json.
+"""
+
+import json
+import re
+import traceback
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import URLResolver, get_resolver
+from rest_framework.test import APIClient
+
+from branch import context as branch_context
+from course.models import Archive, Comment, Course, Enrollment, Tag
+from job.models import Job
+from mobile_app import autocomplete
+from notification.models import Notification
+from recommendation import index as recommendations, similarity
+from report import rollups
+from schedule.models import ClassRoom, CourseTime, Schedule
+from teacher.models import Teacher
+
+
+BUDGET_FILE = Path(__file__).resolve().parents[2] / 'query_budgets.json'
+PREFIXES = {
+    'api/dashboard/': 'staff',
+    'api/mobile-app/': 'student',
+}
+DAYS = ['saturday', 'sunday', 'monday', 'tuesday', 'wednesday', 'thuresday',
+        'friday']
+GROUP_RE = re.compile(r'\(\?P<(\w+)>[^)]*\)|<(?:\w+:)?(\w+)>')
+IGNORED_FILES = ('check_query_budgets.py', 'metrics.py', 'middleware.py')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class Dataset:
+    """objects of a generated dataset where every object has `size`
+    related rows of every kind"""
+
+    def __init__(self, size):
+        # counts cached for the previous dataset would hide the queries
+        for cache in caches.all():
+            cache.clear()
+        User = get_user_model()
+        password = make_password('budget')
+        self.staff = User.objects.create(email='staff@budget.test',
+                                         is_staff=True, password=password)
+        self.student, self.spare_student = User.objects.bulk_create([
+            User(email='student@budget.test', password=password),
+            User(email='spare@budget.test', password=password),
+        ])
+        students = [self.student] + User.objects.bulk_create([
+            User(email=f'student{index}@budget.test', password=password)
+            for index in range(size - 1)
+        ])
+
+        teachers = Teacher.objects.bulk_create([
+            Teacher(email=f'teacher{index}@budget.test', first_name='Teacher',
+                    last_name=str(index), gender='Male')
+            for index in range(size)
+        ])
+        tags = Tag.objects.bulk_create([Tag(name=f'tag{index}')
+                                        for index in range(size)])
+        courses = Course.objects.bulk_create([
+            Course(name=f'course{index}', price=100, instructor=teacher,
+                   in_progress=True, registration_open=True)
+            for teacher in teachers
+            for index in range(size)
+        ])
+        Course.tags.through.objects.bulk_create([
+            Course.tags.through(course=course, tag=tag)
+            for course in courses for tag in tags
+        ])
+
+        Enrollment.objects.bulk_create([
+            Enrollment(course=course, student=student, paid=True)
+            for course in courses for student in students
+        ])
+
+        comments = Comment.objects.bulk_create([
+            Comment(course=course, student=student, comment='budget', rating=4)
+            for course in courses for student in students
+        ])
+
+        classrooms = ClassRoom.objects.bulk_create([
+            ClassRoom(name=f'room{index}', capacity=30)
+            for index in range(size)
+        ])
+        course_times = CourseTime.objects.bulk_create([
+            CourseTime(course=course, classroom=classrooms[index % size],
+                       start_time='08:00', end_time='10:00')
+            for index, course in enumerate(courses)
+        ])
+        schedule = Schedule.objects.current()
+        for day in DAYS:
+            getattr(schedule, day).add(*course_times)
+
+        notifications = Notification.objects.bulk_create([
+            Notification(course=course, message='budget') for course in courses
+        ])
+
+        jobs = Job.objects.bulk_create([
+            Job(name='course.archive', payload={'course_id': course.id},
+                status=Job.FAILED, attempts=1, max_attempts=1)
+            for course in courses[:size]
+        ])
+
+        for course in courses[:size]:
+            for version in range(size):
+                archive = Archive.objects.create(
+                    course=course, course_version=version + 1,
+                    course_price=100, total_earnings=100 * size,
+                    total_students=size,
+                )
+                archive.students.add(*students)
+                rollups.book_archive(archive)
+        rollups.refresh_open([course.id for course in courses])
+        similarity.refresh_all()
+        # the index of the previous dataset would be refreshed mid-check
+        index = recommendations.get_index()
+        index.reset()
+        index.refresh()
+        autocomplete.changed()
+        # the requests are served by the default branch
+        with branch_context.use_branch(branch_context.default_branch()):
+            autocomplete.get_index()
+
+        self.ids = {
+            'course': courses[0].id,
+            'other_course': courses[1].id,
+            'teacher': teachers[0].id,
+            'tag': tags[0].id,
+            'student': self.student.id,
+            'spare_student': self.spare_student.id,
+            'staff': self.staff.id,
+            'classroom': classrooms[0].id,
+            'course_time': course_times[0].id,
+            'notification': notifications[0].id,
+            'comment': comments[0].id,
+            'schedule': schedule.id,
+            'job': jobs[0].id,
+        }
+        self.candidates = [
+            self.student, self.staff, courses[0], teachers[0], tags[0],
+            classrooms[0], course_times[0], notifications[0], comments[0],
+            schedule, jobs[0],
+        ]
+
+    def user(self, name):
+        """return the user to authenticate as"""
+        if not name or name == 'anonymous':
+            return None
+        return getattr(self, name)
+
+    def pk_for(self, callback):
+        """id of the object a detail route should fetch"""
+        queryset = getattr(getattr(callback, 'cls', None), 'queryset', None)
+        if queryset is None:
+            return self.ids['course']
+        for candidate in self.candidates:
+            if (isinstance(candidate, queryset.model)
+                    and queryset.filter(pk=candidate.pk).exists()):
+                return candidate.pk
+        return 0
+
+
+def iter_routes(patterns, prefix=''):
+    """yield (template, callback) of every url pattern"""
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern).lstrip('^').rstrip('$')
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, route)
+        else:
+            yield route, pattern.callback
+
+
+def discover():
+    """return the GET routes of the dashboard and the mobile app"""
+    routes = OrderedDict()
+    for route, callback in iter_routes(get_resolver().url_patterns):
+        prefix = next((p for p in PREFIXES if route.startswith(p)), None)
+        if prefix is None:
+            continue
+        template = '/' + GROUP_RE.sub(
+            lambda m: '{%s}' % (m.group(1) or m.group(2)), route)
+        if '{format}' in template:
+            continue
+
+        actions = getattr(callback, 'actions', None)
+        cls = getattr(callback, 'cls', None)
+        if actions is not None:
+            methods = [method.upper() for method in actions]
+        elif cls is not None:
+            methods = [method.upper() for method in cls.http_method_names
+                       if method not in ('options', 'head')
+                       and hasattr(cls, method)]
+        else:
+            methods = ['GET']
+
+        if 'GET' in methods:
+            routes[f'GET {template}'] = {'callback': callback,
+                                         'user': PREFIXES[prefix]}
+    return routes
+
+
+class QueryRecorder:
+    """execute wrapper keeping every query with the project frames
+    of the stack that ran it"""
+
+    def __init__(self):
+        self.queries = []
+        self.base_dir = str(settings.BASE_DIR)
+
+    def __call__(self, execute, sql, params, many, context):
+        stack = [frame for frame in traceback.extract_stack()[:-1]
+                 if frame.filename.startswith(self.base_dir)
+                 and 'site-packages' not in frame.filename
+                 and not frame.filename.endswith(IGNORED_FILES)]
+        self.queries.append((sql, stack))
+        return execute(sql, params, many, context)
+
+
+def run_route(dataset, key, spec):
+    """call a route and return (status, queries)"""
+    method, template = key.split(' ', 1)
+    path = template.format_map(_Placeholders(dataset, spec.get('callback')))
+    data = _fill(spec.get('data'), dataset.ids)
+
+    client = APIClient()
+    user = dataset.user(spec.get('user'))
+    if user is not None:
+        client.force_authenticate(user)
+
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        response = getattr(client, method.lower())(path, data, format='json')
+    return response.status_code, recorder.queries
+
+
+def _fill(data, ids):
+    """replace the "{name}" values of a request body with dataset ids"""
+    if isinstance(data, dict):
+        return {key: _fill(value, ids) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_fill(value, ids) for value in data]
+    if isinstance(data, str) and data.startswith('{') and data.endswith('}'):
+        return ids[data[1:-1]]
+    return data
+
+
+class _Placeholders(dict):
+    """format_map mapping resolving {pk} and the dataset ids"""
+
+    def __init__(self, dataset, callback):
+        super().__init__()
+        self.dataset = dataset
+        self.callback = callback
+
+    def __missing__(self, key):
+        if key == 'pk':
+            return self.dataset.pk_for(self.callback)
+        return self.dataset.ids[key]
+
+
+def describe(queries, limit=5):
+    """group queries by their shape and show where the most
+    repeated ones come from"""
+    shapes = Counter()
+    stacks = {}
+    for sql, stack in queries:
+        shape = LITERAL_RE.sub('?', sql)
+        shapes[shape] += 1
+        stacks.setdefault(shape, stack)
+
+    lines = []
+    for shape, count in shapes.most_common(limit):
+        lines.append(f'    {count}x {shape}')
+        for frame in stacks[shape][-4:]:
+            lines.append(f'        {frame.filename}:{frame.lineno} '
+                         f'in {frame.name}')
+    return '\n'.join(lines)
+
+
+class Command(BaseCommand):
+    """Django command to check the query budgets"""
+
+    help = 'Fail when an endpoint runs O(N) queries or exceeds its budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs=2, type=int, default=[2, 5])
+        parser.add_argument('--budgets', default=str(BUDGET_FILE))
+        parser.add_argument('--update', action='store_true',
+                            help='record the measured counts as the new '
+                                 'budgets')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        with open(options['budgets']) as budget_file:
+            budgets = json.load(budget_file)
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                           keepdb=options['keepdb'])
+        try:
+            results = self.measure(self.routes(budgets), budgets,
+                                   options['sizes'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                keepdb=options['keepdb'])
+
+        failures = self.failures(results, budgets, options['update'])
+
+        for key, spec in budgets.items():
+            if spec.get('skip'):
+                self.stdout.write(f"{key}: skipped, {spec['skip']}")
+
+        if options['update']:
+            for key, runs in results.items():
+                budgets.setdefault(key, {})['max_queries'] = len(runs[-1][1])
+            with open(options['budgets'], 'w') as budget_file:
+                json.dump(OrderedDict(sorted(budgets.items())), budget_file,
+                          indent=2)
+                budget_file.write('\n')
+            self.stdout.write(self.style.SUCCESS(
+                f"Budgets saved to {options['budgets']}"))
+
+        if failures:
+            message = ['Query budget check failed:'] + failures
+            raise CommandError('\n'.join(message))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(results)} endpoints within budget !'))
+
+    def routes(self, budgets):
+        """the discovered routes and those only known by their budget,
+        with the user and data of their budget"""
+        routes = discover()
+        for key, budget in budgets.items():
+            if key not in routes and budget.get('data') is not None:
+                path = key.split(' ', 1)[1].lstrip('/')
+                prefix = next((p for p in PREFIXES if path.startswith(p)),
+                              None)
+                routes[key] = {'user': PREFIXES.get(prefix)}
+            if key in routes:
+                routes[key].update({k: v for k, v in budget.items()
+                                    if k in ('user', 'data')})
+        return routes
+
+    def failures(self, results, budgets, update=False):
+        """return the routes failing or growing with the data, and those
+        over their budget unless the budgets are updated"""
+        failures = []
+        for key, runs in results.items():
+            budget = budgets.get(key)
+            (small_status, small), (status, large) = runs
+            if status >= 500 or small_status >= 500:
+                failures.append(f'{key}: status {status}\n{describe(large)}')
+                continue
+            if len(small) != len(large):
+                failures.append(
+                    f'{key}: grows with the data, '
+                    f'{len(small)} -> {len(large)} queries\n'
+                    f'{describe(large)}'
+                )
+                continue
+            if update:
+                continue
+            if budget is None or budget.get('max_queries') is None:
+                failures.append(f'{key}: no budget, {len(large)} queries')
+            elif len(large) > budget['max_queries']:
+                failures.append(
+                    f"{key}: {len(large)} queries, "
+                    f"budget is {budget['max_queries']}\n"
+                    f'{describe(large)}'
+                )
+        return failures
+
+    def measure(self, routes, budgets, sizes):
+        """call every route at every size and return their queries"""
+        results = {}
+        # the in-memory indexes are loaded by the dataset, not mid-check
+        with override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=[],
+                               SLOW_REQUEST_MS=float('inf'),
+                               RECOMMENDATION_REFRESH_SECONDS=float('inf'),
+                               AUTOCOMPLETE_CHECK_SECONDS=float('inf'),
+                               AUTOCOMPLETE_MAX_AGE_SECONDS=float('inf'),
+                               BRANCH_CACHE_SECONDS=float('inf')):
+            for size in sizes:
+                with transaction.atomic():
+                    dataset = Dataset(size)
+                    # reads first, writes change the data the reads see
+                    for key in sorted(routes,
+                                      key=lambda k: not k.startswith('GET')):
+                        if budgets.get(key, {}).get('skip'):
+                            continue
+                        try:
+                            result = run_route(dataset, key, routes[key])
+                        except Exception:
+                            result = (500, [(traceback.format_exc(), [])])
+                        results.setdefault(key, []).append(result)
+                    transaction.set_rollback(True)
+        return results
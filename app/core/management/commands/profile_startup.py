@@ -0,0 +1,138 @@
+"""
+Django command to profile the startup of a worker
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$')
+
+# run in a fresh interpreter, prints the seconds spent on every phase
+BOOT_SCRIPT = """
+import json, time
+phases = {}
+start = time.perf_counter()
+import django
+django.setup()
+phases['django.setup'] = time.perf_counter() - start
+
+start = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().reverse_dict
+phases['urls'] = time.perf_counter() - start
+
+start = time.perf_counter()
+from django.utils.module_loading import import_string
+import_string(%(application)r)
+phases['application'] = time.perf_counter() - start
+
+if %(warm_up)r:
+    start = time.perf_counter()
+    from core.warmup import warm_up
+    warm_up()
+    phases['warm up'] = time.perf_counter() - start
+
+print(json.dumps(phases))
+"""
+
+
+def parse_import_times(output):
+    """parse the -X importtime report into
+    {module: (self_us, cumulative_us)}"""
+    modules = {}
+    for line in output.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+class Command(BaseCommand):
+    """Django command to profile the worker startup"""
+
+    help = ('Boot the application in a fresh interpreter and report the '
+            'time of every startup phase and the slowest imports')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['wsgi', 'asgi'],
+                            default='asgi')
+        parser.add_argument('--limit', type=int, default=25,
+                            help='number of modules and packages to show')
+        parser.add_argument('--sort', choices=['self', 'cumulative'],
+                            default='cumulative')
+        parser.add_argument('--warm-up', action='store_true',
+                            help='also time core.warmup, needs the database')
+        parser.add_argument('--output',
+                            help='file to store the report in as JSON')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        applications = {
+            'wsgi': settings.WSGI_APPLICATION,
+            'asgi': getattr(settings, 'ASGI_APPLICATION',
+                            'app.asgi.application'),
+        }
+        script = BOOT_SCRIPT % {
+            'application': applications[options['target']],
+            'warm_up': options['warm_up'],
+        }
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=dict(os.environ),
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+        modules = parse_import_times(result.stderr)
+
+        packages = {}
+        for name, (self_us, _) in modules.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+
+        index = 0 if options['sort'] == 'self' else 1
+        slowest = sorted(modules.items(), key=lambda item: item[1][index],
+                         reverse=True)[:options['limit']]
+        heaviest = sorted(packages.items(), key=lambda item: item[1],
+                          reverse=True)[:options['limit']]
+
+        self.stdout.write('Phases')
+        for name, seconds in phases.items():
+            self.stdout.write(f'  {name:<20} {seconds * 1000:>9.1f}ms')
+        total = sum(phases.values())
+        self.stdout.write(f"  {'total':<20} {total * 1000:>9.1f}ms")
+
+        self.stdout.write(f"\nSlowest imports by {options['sort']} time")
+        self.stdout.write(f"  {'self':>9} {'cumulative':>11}  module")
+        for name, (self_us, cumulative_us) in slowest:
+            self.stdout.write(f'  {self_us / 1000:>7.1f}ms '
+                              f'{cumulative_us / 1000:>9.1f}ms  {name}')
+
+        self.stdout.write('\nImport time per top level package')
+        for package, self_us in heaviest:
+            self.stdout.write(f'  {self_us / 1000:>9.1f}ms  {package}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'target': options['target'],
+                    'phases': phases,
+                    'modules': {
+                        name: {'self_us': self_us,
+                               'cumulative_us': cumulative_us}
+                        for name, (self_us, cumulative_us) in modules.items()
+                    },
+                    'packages': packages,
+                }, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Report saved to {options['output']}"))
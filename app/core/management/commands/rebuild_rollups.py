@@ -0,0 +1,117 @@
+"""
+Django command to recompute the report rollups from scratch
+
+The archives and the courses are read in chunks of ids by a pool of
+threads with their own connections while the rollup tables are locked
+against bookings. The deltas of the chunks are merged and replace the
+rollups in the same transaction, a course ended meanwhile waits for the
+lock and is booked on top of the rebuilt rollups.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+
+from course.models import Archive, Course
+from history.models import ArchivedCourse
+from report import rollups
+from report.models import OpenCourse, Rollup
+
+
+def chunks(queryset, size):
+    """(first id, last id) of consecutive chunks of the rows"""
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    return [(ids[start], ids[min(start + size, len(ids)) - 1])
+            for start in range(0, len(ids), size)]
+
+
+def archive_chunk(model, first, last):
+    """rollup deltas of a chunk of archives, live or moved to the
+    history"""
+    try:
+        archives = (model.objects.filter(id__gte=first, id__lte=last)
+                    .select_related('course__instructor')
+                    .prefetch_related('course__tags'))
+        return rollups.archive_deltas(archives)
+    finally:
+        connections.close_all()
+
+
+def open_chunk(first, last):
+    """open bookings of a chunk of courses"""
+    try:
+        courses = rollups.courses_for_rollups(
+            Course.objects.filter(id__gte=first, id__lte=last))
+        return [rollups.open_booking(course) for course in courses]
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the rollups"""
+
+    help = ('Recompute the report rollups from the archives and the '
+            'enrollments')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        start = time.perf_counter()
+        size = options['chunk_size']
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # reads go on, bookings wait for the new rollups
+                cursor.execute(f'LOCK TABLE {Rollup._meta.db_table}, '
+                               f'{OpenCourse._meta.db_table} '
+                               f'IN EXCLUSIVE MODE')
+
+            with ThreadPoolExecutor(options['workers'],
+                                    thread_name_prefix='rollups') as pool:
+                archive_results = [
+                    pool.submit(archive_chunk, model, *chunk)
+                    for model in (Archive, ArchivedCourse)
+                    for chunk in chunks(model.objects.all(), size)
+                ]
+                open_results = [
+                    pool.submit(open_chunk, *chunk)
+                    for chunk in chunks(Course.objects.all(), size)
+                ]
+
+                deltas = {}
+                for result in archive_results:
+                    for key, chunk_delta in result.result().items():
+                        label, earnings, paid_students, archives = chunk_delta
+                        delta = deltas.setdefault(key, [label, 0, 0, 0])
+                        delta[1] += earnings
+                        delta[2] += paid_students
+                        delta[3] += archives
+                bookings = []
+                for result in open_results:
+                    for booking in result.result():
+                        if booking.paid_students:
+                            bookings.append(booking)
+                            rollups.add(deltas, booking.dimensions,
+                                        booking.earnings,
+                                        booking.paid_students)
+
+            Rollup.objects.all().delete()
+            OpenCourse.objects.all().delete()
+            Rollup.objects.bulk_create([
+                Rollup(dimension=dimension, key=key, period=period,
+                       label=label, earnings=earnings,
+                       paid_students=paid, archives=archives)
+                for (dimension, key, period), (label, earnings, paid, archives)
+                in deltas.items()
+            ], batch_size=1000)
+            OpenCourse.objects.bulk_create(bookings, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(deltas)} rollups of {len(archive_results)} archive and '
+            f'{len(open_results)} course chunks rebuilt in '
+            f'{time.perf_counter() - start:.1f}s !'
+        ))
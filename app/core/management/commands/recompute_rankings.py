@@ -0,0 +1,39 @@
+"""
+Django command to recompute the rating and the ranking of every course
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from course import ranking
+from course.models import Course
+
+
+class Command(BaseCommand):
+    """Django command to recompute the course rankings"""
+
+    help = ('Recompute the rating and the ranking score of every course with '
+            'the current mean of all the comments')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        start = time.perf_counter()
+        mean = ranking.global_mean(refresh=True)
+        ids = list(Course.objects.order_by('id').values_list('id', flat=True))
+        size = options['chunk_size']
+        changed = 0
+        for first in range(0, len(ids), size):
+            # short transactions, the courses stay writable
+            with transaction.atomic():
+                changed += ranking.update_rankings(ids[first:first + size],
+                                                   mean)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{changed} of {len(ids)} courses re-ranked with a mean rating of '
+            f'{mean:.2f} in {time.perf_counter() - start:.1f}s !'
+        ))
@@ -0,0 +1,33 @@
+"""
+Django command to recompute the course neighbours of the recommendations
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendation import similarity
+
+
+class Command(BaseCommand):
+    """Django command to refresh the course neighbours"""
+
+    help = ('Recompute the neighbours of the courses whose students changed, '
+            'or of every course with --all')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='recompute every course, after a bulk import')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        start = time.perf_counter()
+        if options['all']:
+            refreshed = similarity.refresh_all(options['chunk_size'])
+        else:
+            refreshed = similarity.refresh_dirty()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{refreshed} courses refreshed in {elapsed:.1f}s !'
+        ))
@@ -0,0 +1,39 @@
+"""
+Django command to run the queued background jobs
+"""
+
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from job.worker import Worker
+
+
+class Command(BaseCommand):
+    """Django command running a job worker"""
+
+    help = ('Claim and run the queued jobs, SIGTERM or SIGINT finishes '
+            'the running jobs and exits')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=settings.JOB_CONCURRENCY,
+                            help='number of jobs run at the same time')
+        parser.add_argument('--poll', type=float,
+                            default=settings.JOB_POLL_SECONDS,
+                            help='seconds between two looks at the queue '
+                                 'when idle')
+        parser.add_argument('--once', action='store_true',
+                            help='exit when no job is due')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        worker = Worker(options['concurrency'], options['poll'])
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: worker.stop())
+
+        self.stdout.write(f"Worker {worker.name} running "
+                          f"{worker.concurrency} jobs at a time")
+        worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS('Worker stopped !'))
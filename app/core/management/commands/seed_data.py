@@ -0,0 +1,313 @@
+"""
+Django command to generate synthetic data for load testing
+"""
+
+import csv
+import io
+import random
+import uuid
+from array import array
+from datetime import date, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from course.models import Comment, Course, Enrollment, Tag
+from mobile_app import autocomplete
+from schedule.models import ClassRoom, CourseTime, Schedule
+from teacher.models import Teacher
+
+
+CHUNK_SIZE = 50000
+NULL = '\\N'
+DAYS = ['saturday', 'sunday', 'monday', 'tuesday', 'wednesday', 'thuresday',
+        'friday']
+WORDS = ['python', 'django', 'data', 'design', 'english', 'math', 'web',
+         'mobile', 'cloud', 'security', 'marketing', 'finance', 'music', 'art',
+         'ai', 'sql']
+LEVELS = [choice for choice, _ in Course.status_choices]
+FIRST_NAMES = ['Sara', 'Omar', 'Lina', 'Karim', 'Nour', 'Adam', 'Maya',
+               'Yousef', 'Rami', 'Dana']
+LAST_NAMES = ['Haddad', 'Khalil', 'Saleh', 'Nasser', 'Aziz', 'Hamdan', 'Issa',
+              'Mansour']
+
+
+def _format(value):
+    """format a python value for COPY in csv mode"""
+    if value is None:
+        return NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return value
+
+
+def copy_rows(model, rows):
+    """bulk load dict rows into the table of the model with COPY
+
+    missing fields get their model default, the primary key is left to
+    its sequence unless the rows provide it"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    now = timezone.now()
+    concrete = [field for field in model._meta.concrete_fields
+                if not (field.primary_key and field.attname not in first)]
+
+    defaults = {}
+    for field in concrete:
+        if getattr(field, 'auto_now', False) \
+                or getattr(field, 'auto_now_add', False):
+            defaults[field.attname] = now
+        elif field.has_default():
+            defaults[field.attname] = field.get_default()
+        else:
+            defaults[field.attname] = None
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column)
+                        for field in concrete)
+    sql = (f"COPY {table} ({columns}) "
+           f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')")
+
+    def flush(buffer):
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+
+    total = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in _chain(first, rows):
+        writer.writerow([
+            _format(row.get(field.attname, defaults[field.attname]))
+            for field in concrete
+        ])
+        total += 1
+        if total % CHUNK_SIZE == 0:
+            flush(buffer)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+    if total % CHUNK_SIZE:
+        flush(buffer)
+    return total
+
+
+def _chain(first, rows):
+    """yield the first row then the rest"""
+    yield first
+    yield from rows
+
+
+def next_id(model):
+    """return the first free id of a table"""
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def zipf_weights(count, exponent=0.8):
+    """cumulative popularity weights, a few items get most of the traffic"""
+    total = 0.0
+    weights = []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+class Command(BaseCommand):
+    """Django command to seed the database with synthetic data"""
+
+    help = 'Generate synthetic data with PostgreSQL COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--staff', type=int, default=10)
+        parser.add_argument('--teachers', type=int, default=200)
+        parser.add_argument('--courses', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--tags-per-course', type=int, default=3)
+        parser.add_argument('--enrollments', type=int, default=30000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--classrooms', type=int, default=20)
+        parser.add_argument('--course-times', type=int, default=500)
+        parser.add_argument('--password', default='benchmark')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='random seed for reproducible data')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='leave the rankings, rollups, '
+                                 'recommendations and autocomplete stale')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        random.seed(options['seed'])
+        with transaction.atomic():
+            counts = seed(**{key: options[key] for key in (
+                'students', 'staff', 'teachers', 'courses', 'tags',
+                'tags_per_course', 'enrollments', 'comments',
+                'classrooms', 'course_times', 'password',
+            )})
+
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        if not options['skip_derived']:
+            self.refresh_derived()
+        self.stdout.write(self.style.SUCCESS('Database seeded !'))
+
+    def refresh_derived(self):
+        """rebuild the data computed from the seeded rows, COPY skips
+        the signals that keep it up to date"""
+        call_command('recompute_rankings', stdout=self.stdout)
+        call_command('rebuild_rollups', stdout=self.stdout)
+        call_command('refresh_recommendations', all=True, stdout=self.stdout)
+        # the servers see the new catalog version on their next check
+        autocomplete.changed()
+        entries = len(autocomplete.get_index().entries)
+        self.stdout.write(f'autocomplete entries: {entries}')
+
+
+def seed(students=0, staff=0, teachers=0, courses=0, tags=0, tags_per_course=0,
+         enrollments=0, comments=0, classrooms=0, course_times=0,
+         password='benchmark'):
+    """generate the data and return the number of rows per table"""
+    User = get_user_model()
+    run = uuid.uuid4().hex[:8]
+    hashed_password = make_password(password)
+    counts = {}
+
+    def people(count, start, prefix, **extra):
+        for index in range(count):
+            yield dict({
+                'id': start + index,
+                'email': f'{prefix}{start + index}.{run}@seed.example.com',
+                'first_name': random.choice(FIRST_NAMES),
+                'last_name': random.choice(LAST_NAMES),
+                'phone_number': f'09{random.randint(0, 999999999):09d}',
+                'address': f'{random.randint(1, 999)} Seed street',
+                'birth_day': date(1970, 1, 1) + timedelta(
+                    days=random.randint(0, 12000)),
+                'gender': random.choice(['Male', 'Female']),
+            }, **extra)
+
+    user_start = next_id(User)
+    counts['students'] = copy_rows(User, people(
+        students, user_start, 'student', password=hashed_password,
+    ))
+    counts['staff'] = copy_rows(User, people(
+        staff, user_start + students, 'staff', password=hashed_password,
+        is_staff=True,
+    ))
+    student_ids = range(user_start, user_start + students)
+
+    teacher_start = next_id(Teacher)
+    counts['teachers'] = copy_rows(Teacher, people(
+        teachers, teacher_start, 'teacher', bio='Seeded teacher', about='',
+    ))
+    teacher_ids = range(teacher_start, teacher_start + teachers)
+
+    tag_start = next_id(Tag)
+    counts['tags'] = copy_rows(Tag, (
+        {'id': tag_start + index,
+         'name': f'{random.choice(WORDS)}-{run}-{index}'}
+        for index in range(tags)
+    ))
+    tag_ids = range(tag_start, tag_start + tags)
+
+    course_start = next_id(Course)
+    counts['courses'] = copy_rows(Course, ({
+        'id': course_start + index,
+        'name': f'{random.choice(WORDS).title()} {random.choice(WORDS)} '
+                f'{index}',
+        'bio': 'Seeded course',
+        'description': 'Seeded course description',
+        'price': random.randint(10, 500),
+        'instructor_id': random.choice(teacher_ids),
+        'registration_open': random.random() < 0.7,
+        'in_progress': random.random() < 0.5,
+        'level': random.choice(LEVELS),
+        'rating': round(random.uniform(1, 5), 1),
+    } for index in range(courses)) if teacher_ids else ())
+    course_ids = range(course_start, course_start + counts['courses'])
+
+    counts['course tags'] = copy_rows(Course.tags.through, (
+        {'course_id': course_id, 'tag_id': tag_id}
+        for course_id in course_ids
+        for tag_id in random.sample(tag_ids,
+                                    min(tags_per_course, len(tag_ids)))
+    ))
+
+    # every student takes a few courses, popular courses get most of them
+    course_weights = zipf_weights(len(course_ids))
+    enrolled_courses, enrolled_students = array('q'), array('q')
+    if course_ids and student_ids:
+        per_student = enrollments / len(student_ids)
+        for student_id in student_ids:
+            count = min(int(per_student) + (random.random() < per_student % 1),
+                        len(course_ids))
+            chosen = random.choices(course_ids, cum_weights=course_weights,
+                                    k=count)
+            for course_id in set(chosen):
+                enrolled_courses.append(course_id)
+                enrolled_students.append(student_id)
+
+    counts['enrollments'] = copy_rows(Enrollment, ({
+        'course_id': course_id,
+        'student_id': student_id,
+        'paid': random.random() < 0.6,
+    } for course_id, student_id in zip(enrolled_courses, enrolled_students)))
+
+    counts['comments'] = copy_rows(Comment, ({
+        'course_id': random.choices(course_ids, cum_weights=course_weights)[0],
+        'student_id': random.choice(student_ids),
+        'comment': 'Seeded comment',
+        'rating': random.randint(1, 5),
+    } for _ in range(comments)) if course_ids and student_ids else ())
+
+    classroom_start = next_id(ClassRoom)
+    counts['classrooms'] = copy_rows(ClassRoom, ({
+        'id': classroom_start + index,
+        'name': f'Room {run}-{index}',
+        'capacity': random.choice([15, 20, 25, 30]),
+    } for index in range(classrooms)))
+    classroom_ids = range(classroom_start, classroom_start + classrooms)
+
+    # two hour slots from 8:00 to 20:00 in every classroom on every day
+    slots = [(day, classroom_id, hour)
+             for day in DAYS
+             for classroom_id in classroom_ids
+             for hour in range(8, 20, 2)]
+    slots = (random.sample(slots, min(course_times, len(slots)))
+             if course_ids else [])
+    course_time_start = next_id(CourseTime)
+    counts['course times'] = copy_rows(CourseTime, ({
+        'id': course_time_start + index,
+        'course_id': random.choice(course_ids),
+        'classroom_id': classroom_id,
+        'start_time': time(hour),
+        'end_time': time(hour + 1, 59),
+    } for index, (_, classroom_id, hour) in enumerate(slots)))
+
+    schedule = Schedule.objects.current()
+    for day in DAYS:
+        through = getattr(Schedule, day).through
+        copy_rows(through, (
+            {'schedule_id': schedule.id,
+             'coursetime_id': course_time_start + index}
+            for index, (slot_day, _, _) in enumerate(slots) if slot_day == day
+        ))
+
+    # explicit ids were used, move the sequences past them
+    models_with_ids = [User, Teacher, Tag, Course, ClassRoom, CourseTime]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(),
+                                                     models_with_ids):
+            cursor.execute(sql)
+
+    return counts
@@ -0,0 +1,45 @@
+"""
+Django command to delete the old resolved notifications
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notification.models import Notification
+
+
+class Command(BaseCommand):
+    """Django command to apply the notification retention"""
+
+    help = 'Delete the notifications resolved more than --days ago, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.NOTIFICATION_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = Notification.objects.filter(resolved_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'{expired.count()} notifications would be deleted')
+            return
+
+        deleted = 0
+        while True:
+            # short transactions, the table stays writable while sweeping
+            ids = list(expired.order_by('resolved_at')
+                       .values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += Notification.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{deleted} notifications deleted !'))
@@ -0,0 +1,248 @@
+"""
+Per-request SQL and timing instrumentation
+
+The stats of the running request live in a context variable, so the
+queries run by worker threads of async views are counted too. Queries
+are timed by an execute wrapper installed on every new connection and
+the per-route histograms are kept in memory for the metrics endpoint.
+"""
+
+import bisect
+import contextvars
+import heapq
+import os
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+# upper bounds of the latency buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RequestStats:
+    """what a single request spent its time on"""
+    __slots__ = ('started', 'queries', 'db_time', 'slowest',
+                 'serializer_time', 'serializer_depth', 'render_time',
+                 'render_started', 'compress_time', 'max_slowest')
+
+    def __init__(self, max_slowest=3):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []
+        self.max_slowest = max_slowest
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.render_time = 0.0
+        self.render_started = None
+        self.compress_time = 0.0
+
+    def add_query(self, sql, duration):
+        """count a query and keep the slowest ones"""
+        self.queries += 1
+        self.db_time += duration
+        if len(self.slowest) < self.max_slowest:
+            heapq.heappush(self.slowest, (duration, sql))
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, sql))
+
+    def server_timing(self, total):
+        """format the stats as a Server-Timing header"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serializer_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'compress;dur={self.compress_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def start_request():
+    """start collecting stats for the current context"""
+    stats = RequestStats(getattr(settings, 'SLOW_REQUEST_QUERIES', 3))
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    """stop collecting stats for the current context"""
+    _current.reset(token)
+
+
+def current_stats():
+    """return the stats of the running request if any"""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """execute wrapper timing every query of a request"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver installing the query timer"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_data(prop):
+    """wrap a serializer data property to time the outermost call"""
+    getter = prop.fget
+
+    @wraps(getter)
+    def data(self):
+        stats = _current.get()
+        if stats is None:
+            return getter(self)
+
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return getter(self)
+        finally:
+            stats.serializer_depth -= 1
+            if stats.serializer_depth == 0:
+                stats.serializer_time += time.perf_counter() - start
+
+    return property(data)
+
+
+def install_serializer_timer():
+    """time the serialization of every DRF serializer"""
+    from rest_framework import serializers
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__['data']
+        if not getattr(prop.fget, '__wrapped__', None):
+            cls.data = timed_data(prop)
+
+
+class Histogram:
+    """cumulative latency histogram of a route"""
+    __slots__ = ('counts', 'total', 'count', 'queries')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.queries = 0
+
+    def observe(self, duration, queries):
+        """add a request to the histogram"""
+        self.counts[bisect.bisect_left(BUCKETS, duration)] += 1
+        self.total += duration
+        self.count += 1
+        self.queries += queries
+
+    def quantile(self, q):
+        """estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(BUCKETS):
+                    return BUCKETS[-1]
+                upper = BUCKETS[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            if index < len(BUCKETS):
+                lower = BUCKETS[index]
+        return BUCKETS[-1]
+
+
+class Registry:
+    """per-process histograms keyed by (method, route)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, method, route, duration, queries):
+        """record a finished request"""
+        key = (method, route)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(duration, queries)
+
+    def render(self):
+        """render the histograms in the Prometheus text format"""
+        pid = os.getpid()
+        with self.lock:
+            items = sorted(self.histograms.items())
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (method, route), histogram in items:
+            labels = _labels(method, route, pid)
+            cumulative = 0
+            for bucket, bucket_count in zip(BUCKETS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(_sample('http_request_duration_seconds_bucket',
+                                     f'{labels},le="{bucket}"', cumulative))
+            lines.append(_sample('http_request_duration_seconds_bucket',
+                                 f'{labels},le="+Inf"', histogram.count))
+            lines.append(_sample('http_request_duration_seconds_sum',
+                                 labels, histogram.total))
+            lines.append(_sample('http_request_duration_seconds_count',
+                                 labels, histogram.count))
+
+        lines += [
+            '# HELP http_request_duration_quantile_seconds '
+            'Estimated latency quantiles by route.',
+            '# TYPE http_request_duration_quantile_seconds gauge',
+        ]
+        for (method, route), histogram in items:
+            labels = _labels(method, route, pid)
+            for q in QUANTILES:
+                lines.append(_sample('http_request_duration_quantile_seconds',
+                                     f'{labels},quantile="{q}"',
+                                     histogram.quantile(q)))
+
+        lines += [
+            '# HELP http_request_db_queries_total SQL queries run by route.',
+            '# TYPE http_request_db_queries_total counter',
+        ]
+        for (method, route), histogram in items:
+            lines.append(_sample('http_request_db_queries_total',
+                                 _labels(method, route, pid),
+                                 histogram.queries))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(method, route, pid):
+    """labels of the samples of a route"""
+    return f'method="{method}",route="{_escape(route)}",worker="{pid}"'
+
+
+def _sample(name, labels, value):
+    """a line of the Prometheus text format"""
+    return f'{name}{{{labels}}} {value}'
+
+
+def _escape(value):
+    """escape a Prometheus label value"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
@@ -0,0 +1,332 @@
+"""
+Custom middlewares
+
+They serve the WSGI requests with __call__ and the ASGI ones with
+__acall__, so the async views are awaited without a thread in between.
+The blocking lookups of the async path run in worker threads.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http.request import split_domain_port
+from django.utils.cache import patch_vary_headers
+
+from branch import context as branch_context
+from core import db_router, metrics
+from core.utils import run_sync
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_pin'
+
+
+class AsyncCapableMiddleware:
+    """middleware following the mode of the handler it wraps, async in
+    the ASGI application and sync in the WSGI one"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Django awaits the middleware that look like coroutines
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+
+class BranchMiddleware(AsyncCapableMiddleware):
+    """serve the request in the branch of its host, see branch.context"""
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        host, _ = split_domain_port(request.get_host())
+        branch = branch_context.branch_of_host(host)
+        token = branch_context.activate(request, branch)
+        try:
+            return self.get_response(request)
+        finally:
+            branch_context.deactivate(token)
+
+    async def __acall__(self, request):
+        host, _ = split_domain_port(request.get_host())
+        branches = branch_context.cached_branches()
+        if branches is None:
+            branches = await run_sync(branch_context.get_branches)
+        branch = branch_context.branch_of_host(host, branches)
+        token = branch_context.activate(request, branch)
+        try:
+            return await self.get_response(request)
+        finally:
+            branch_context.deactivate(token)
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """route the reads of safe requests to a read replica
+
+    a client that wrote something is pinned to the primary for
+    REPLICA_PIN_SECONDS so it always reads its own writes, the pin is
+    kept in a cookie and, for the clients dropping cookies, in the
+    shared cache seen by every worker"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.paths = [re.compile(path) for path in
+                      getattr(settings, 'REPLICA_READ_PATHS', [])]
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = db_router.use_replica(self._read_alias(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.reset_replica(token)
+
+        if self._wrote(request, response):
+            self._pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        alias = None
+        if db_router.get_replicas():
+            # the pins and the replica lags are read from the databases
+            alias = await run_sync(self._read_alias, request)
+        token = db_router.use_replica(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.reset_replica(token)
+
+        if self._wrote(request, response):
+            await run_sync(self._pin, request, response)
+        return response
+
+    def _read_alias(self, request):
+        """the replica serving the reads of the request, None for the
+        primary"""
+        if db_router.get_replicas() and self._is_replica_read(request):
+            return db_router.choose_replica()
+        return None
+
+    def _wrote(self, request, response):
+        """check if the request wrote something the client must read"""
+        return (db_router.get_replicas()
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400)
+
+    def _client_key(self, request):
+        """identify the client by its token, session or address"""
+        identity = (request.META.get('HTTP_AUTHORIZATION')
+                    or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+                    or request.META.get('REMOTE_ADDR', ''))
+        digest = hashlib.sha1(identity.encode()).hexdigest()
+        return f'db_pin:{digest}'
+
+    def _is_pinned(self, request):
+        """check if the client wrote something recently"""
+        now = time.time()
+        try:
+            if float(request.COOKIES.get(PIN_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+
+        return (caches['shared'].get(self._client_key(request)) or 0) > now
+
+    def _pin(self, request, response):
+        """pin the client to the primary"""
+        until = time.time() + self.pin_seconds
+        caches['shared'].set(self._client_key(request), until,
+                             self.pin_seconds)
+        response.set_cookie(PIN_COOKIE, str(until), max_age=self.pin_seconds,
+                            httponly=True, samesite='Lax')
+
+    def _is_replica_read(self, request):
+        """check if the request can be served from a replica"""
+        if request.method not in SAFE_METHODS:
+            return False
+        if not any(path.match(request.path_info) for path in self.paths):
+            return False
+        return not self._is_pinned(request)
+
+
+class RequestMetricsMiddleware(AsyncCapableMiddleware):
+    """record the queries, database time, serializer time and render
+    time of every request, send them in a Server-Timing header, log
+    the slow requests and feed the per-route histograms"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        self.slow_seconds = getattr(settings, 'SLOW_REQUEST_MS', 500) / 1000
+        if self.is_async:
+            # a sync hook would send every DRF response through a thread
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._record(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._record(request, response, stats)
+
+    def _record(self, request, response, stats):
+        """time the finished request and feed the histograms"""
+        total = time.perf_counter() - stats.started
+        response['Server-Timing'] = stats.server_timing(total)
+
+        match = request.resolver_match
+        route = match.route if match else 'unmatched'
+        if not match or match.url_name != 'metrics':
+            metrics.registry.observe(request.method, route, total,
+                                     stats.queries)
+
+        if total >= self.slow_seconds:
+            worst = ''.join(
+                f'\n  {duration * 1000:.1f}ms {sql}'
+                for duration, sql in sorted(stats.slowest, reverse=True)
+            )
+            logger.warning(
+                'slow request %s %s %.1fms, %d queries in %.1fms%s',
+                request.method, request.path, total * 1000,
+                stats.queries, stats.db_time * 1000, worst,
+            )
+
+        return response
+
+    def process_template_response(self, request, response):
+        """time the rendering of DRF responses"""
+        return self._time_render(response)
+
+    async def _aprocess_template_response(self, request, response):
+        return self._time_render(response)
+
+    def _time_render(self, response):
+        """start the render timer of the response"""
+        stats = metrics.current_stats()
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+            response.add_post_render_callback(self._rendered(stats))
+        return response
+
+    def _rendered(self, stats):
+        """post render callback closing the render timer"""
+        def callback(response):
+            stats.render_time += time.perf_counter() - stats.render_started
+        return callback
+
+
+class CompressionMiddleware(AsyncCapableMiddleware):
+    """compress the responses with brotli or gzip, whichever the client
+    prefers, brotli only when the brotli package is installed
+
+    small bodies, streams, media and already encoded responses are sent
+    as they are, see the COMPRESSION_* settings"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings,
+                                      'COMPRESSION_BROTLI_QUALITY', 4)
+        self.types = tuple(getattr(settings, 'COMPRESSION_CONTENT_TYPES', ()))
+        self.encoders = {'gzip': self._gzip}
+        if brotli is not None:
+            self.encoders['br'] = self._brotli
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        """encode the body of the response if it is worth it"""
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        content_type = response.get('Content-Type', '')
+        if (response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < self.min_size
+                or not content_type.startswith(self.types)):
+            return response
+
+        encoding = self.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        stats = metrics.current_stats()
+        started = time.perf_counter()
+        compressed = self.encoders[encoding](response.content)
+        if stats is not None:
+            stats.compress_time += time.perf_counter() - started
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # the bytes changed, only a weak validator still holds
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def negotiate(self, header):
+        """the supported encoding with the highest q-value,
+        brotli first on ties, None when nothing is acceptable"""
+        accepted = {}
+        for item in header.split(','):
+            name, _, params = item.strip().partition(';')
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    continue
+            accepted[name.strip().lower()] = quality
+
+        default = accepted.get('*', 0)
+        ranked = [(accepted.get(name, default), name == 'br', name)
+                  for name in self.encoders]
+        quality, _, name = max(ranked)
+        return name if quality > 0 else None
+
+    def _gzip(self, content):
+        return gzip.compress(content, self.gzip_level, mtime=0)
+
+    def _brotli(self, content):
+        return brotli.compress(content, quality=self.brotli_quality)
@@ -0,0 +1,362 @@
+"""
+Reusable viewset mixins
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import relations, serializers, status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+
+from core.compiled import CompiledSerializer, NotCompilable
+from core.parsers import MessagePackParser
+from core.renderers import MessagePackRenderer
+from job.serializers import JobSerializer
+
+
+logger = logging.getLogger(__name__)
+
+_missing = object()
+
+
+class QueryPlan:
+    """select_related, prefetch_related and only() needed
+    to serialize the instances of a model"""
+
+    def __init__(self, model):
+        self.model = model
+        self.select = []
+        self.prefetch = []
+        self.only = {model._meta.pk.name}
+        self.only_allowed = True
+
+    def apply(self, queryset):
+        """return the queryset optimized by the plan"""
+        if self.select:
+            queryset = queryset.select_related(*self.select)
+        for path, plan in self.prefetch:
+            related = plan.apply(plan.model._default_manager.all())
+            queryset = queryset.prefetch_related(
+                Prefetch(path, queryset=related)
+            )
+        if self.only_allowed:
+            # DISTINCT queries need the ordering columns in the select list
+            names = queryset.query.order_by or self.model._meta.ordering
+            ordering = {name.lstrip('-') for name in names
+                        if isinstance(name, str) and '__' not in name
+                        and name != '?'}
+            queryset = queryset.only(*sorted(self.only | ordering))
+        return queryset
+
+    def describe(self):
+        """human readable version of the plan"""
+        parts = []
+        if self.select:
+            parts.append(f"select_related({', '.join(self.select)})")
+        for path, plan in self.prefetch:
+            parts.append(f'prefetch({path}: {plan.describe()})')
+        if self.only_allowed:
+            parts.append(f"only({', '.join(sorted(self.only))})")
+        return ' '.join(parts) or 'all()'
+
+
+def _child(field):
+    """return the serializer of the items of a list field"""
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+def build_plan(serializer, model, plan=None, prefix=''):
+    """walk the readable fields of the serializer and collect the
+    relations and columns they read from the model"""
+    plan = plan or QueryPlan(model)
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if field.source == '*':
+            if isinstance(field, serializers.BaseSerializer):
+                build_plan(field, model, plan, prefix)
+            else:
+                plan.only_allowed = False
+            continue
+
+        if isinstance(field, serializers.SerializerMethodField):
+            # method fields may read anything from the instance
+            plan.only_allowed = False
+            continue
+
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            plan.only_allowed = False
+            continue
+
+        path = prefix + model_field.name
+        if not model_field.is_relation:
+            plan.only.add(path)
+            continue
+
+        if model_field.concrete and (model_field.many_to_one
+                                     or model_field.one_to_one):
+            plan.only.add(path)
+            nested = _child(field)
+            if isinstance(nested, serializers.BaseSerializer):
+                plan.select.append(path)
+                build_plan(nested, model_field.related_model, plan,
+                           path + '__')
+            elif len(field.source_attrs) > 1:
+                # dotted source, load the whole related row
+                plan.select.append(path)
+                plan.only_allowed = False
+            continue
+
+        if model_field.one_to_many or model_field.many_to_many:
+            related_model = model_field.related_model
+            child_plan = QueryPlan(related_model)
+            nested = _child(field)
+            if nested is not None:
+                build_plan(nested, related_model, child_plan)
+            elif not isinstance(field, relations.ManyRelatedField):
+                child_plan.only_allowed = False
+            if model_field.one_to_many:
+                # the reverse foreign key is needed to attach the rows
+                child_plan.only.add(model_field.field.name)
+            plan.prefetch.append((path, child_plan))
+            continue
+
+        plan.only_allowed = False
+
+    return plan
+
+
+def restrict_fields(serializer, selection):
+    """drop the fields of the serializer missing from a selection
+    like {'id': {}, 'instructor': {'first_name': {}}}"""
+    serializer = _child(serializer)
+    if serializer is None or not selection:
+        return
+    for name in list(serializer.fields):
+        if name not in selection:
+            serializer.fields.pop(name)
+        elif selection[name]:
+            restrict_fields(serializer.fields[name], selection[name])
+
+
+def selected_fields(serializer):
+    """the fields left in a serializer by restrict_fields, sorted, so
+    the unknown and repeated names of ?fields share the same key"""
+    serializer = _child(serializer)
+    if serializer is None:
+        return ()
+    return tuple(sorted((name, selected_fields(field))
+                        for name, field in serializer.fields.items()))
+
+
+class BoundedCache(OrderedDict):
+    """dict dropping the least recently used entries past maxsize,
+    shared by the request threads of the worker"""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self:
+                return default
+            self.move_to_end(key)
+            return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            if len(self) > self.maxsize:
+                self.popitem(last=False)
+
+
+def parse_fields(value):
+    """parse ?fields=id,name,instructor.first_name"""
+    selection = {}
+    items = (part.strip() for part in (value or '').split(','))
+    for item in filter(None, items):
+        node = selection
+        for name in item.split('.'):
+            node = node.setdefault(name, {})
+    return selection
+
+
+class AutoPrefetchMixin:
+    """optimize the queryset of safe actions for the serializer used
+    by the action, including a ?fields=a,b,c.d selection, so nested
+    responses run a fixed number of queries"""
+
+    # keyed by the fields left after the ?fields selection, the plans of
+    # the selections have their own cache so that clients sending many
+    # selections only evict each other
+    _plans = BoundedCache(512)
+    _selection_plans = BoundedCache(256)
+
+    def get_field_selection(self):
+        """return the fields requested with ?fields"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return {}
+        return parse_fields(request.query_params.get('fields'))
+
+    def get_serializer(self, *args, **kwargs):
+        """restrict the serializer to the selected fields"""
+        serializer = super().get_serializer(*args, **kwargs)
+        restrict_fields(serializer, self.get_field_selection())
+        return serializer
+
+    def get_query_plan(self, model, serializer=None):
+        """return the plan for serializing instances of the model"""
+        if serializer is None:
+            serializer = self.get_serializer()
+        serializer = _child(serializer)
+        key = (type(serializer), model, selected_fields(serializer))
+        plans = self._plans
+        if self.get_field_selection():
+            plans = self._selection_plans
+        plan = plans.get(key)
+        if plan is None:
+            plan = plans[key] = build_plan(serializer, model)
+            logger.debug('query plan for %s: %s', type(serializer).__name__,
+                         plan.describe())
+        return plan
+
+    def optimize_queryset(self, queryset, serializer=None):
+        """apply the plan of the serializer to the queryset"""
+        if serializer is None:
+            serializer = self.get_serializer()
+        serializer = _child(serializer)
+        meta = getattr(serializer, 'Meta', None)
+        if getattr(meta, 'model', None) is not queryset.model:
+            return queryset
+        self.query_plan = self.get_query_plan(queryset.model, serializer)
+        return self.query_plan.apply(queryset)
+
+    def filter_queryset(self, queryset):
+        """optimize the queryset of safe actions"""
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS:
+            queryset = self.optimize_queryset(queryset)
+        return queryset
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """show the chosen plan in debug mode"""
+        response = super().finalize_response(request, response,
+                                             *args, **kwargs)
+        plan = getattr(self, 'query_plan', None)
+        if settings.DEBUG and plan is not None:
+            response['X-Query-Plan'] = plan.describe()
+        return response
+
+
+class CompiledListMixin:
+    """serve the list action from a compiled serializer, see
+    core.compiled, when the serializer of the action and its ?fields
+    selection compile, other actions go through the DRF serializers"""
+
+    # keyed by the fields left after the ?fields selection, like the
+    # query plans of AutoPrefetchMixin
+    _compiled = BoundedCache(512)
+    _selection_compiled = BoundedCache(256)
+    compiled_serializer = None
+
+    def get_compiled_serializer(self, model):
+        """return the compiled serializer of the list, None when the
+        serializer needs model instances"""
+        if not settings.COMPILED_SERIALIZERS or self.is_paginated():
+            return None
+        serializer_class = self.get_serializer_class()
+        serializer = serializer_class()
+        selection = parse_fields(self.request.query_params.get('fields'))
+        restrict_fields(serializer, selection)
+        key = (serializer_class, selected_fields(serializer))
+        cache = self._selection_compiled if selection else self._compiled
+        compiled = cache.get(key, _missing)
+        if compiled is _missing:
+            try:
+                compiled = CompiledSerializer(serializer)
+            except NotCompilable as exc:
+                logger.debug('%s is not compiled: %s',
+                             serializer_class.__name__, exc)
+                compiled = None
+            cache[key] = compiled
+        if compiled is None or compiled.model is not model:
+            return None
+        return compiled
+
+    def is_paginated(self):
+        """the list of the request is paginated, the pages are served
+        from model instances"""
+        paginator = self.paginator
+        if paginator is None:
+            return False
+        requested = getattr(paginator, 'requested', None)
+        return requested is None or requested(self.request)
+
+    def list(self, request, *args, **kwargs):
+        """list the rows read by the compiled serializer"""
+        queryset = self.get_queryset()
+        self.compiled_serializer = self.get_compiled_serializer(
+            queryset.model)
+        if self.compiled_serializer is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(queryset)
+        serializer = self.compiled_serializer(queryset,
+                                              self.get_serializer_context())
+        return Response(serializer.data)
+
+    def optimize_queryset(self, queryset, serializer=None):
+        """the compiled serializer selects its own columns"""
+        if self.compiled_serializer is not None:
+            return queryset
+        return super().optimize_queryset(queryset, serializer)
+
+
+class BackgroundJobMixin:
+    """let the client run a slow save as a background job
+
+    serializers opting in define enqueue(validated_data) returning the
+    queued job, the client asks for it with ?background=true or the
+    Prefer: respond-async header and gets 202 and the job status URL"""
+
+    def run_in_background(self):
+        """True when the client asked for a background job"""
+        request = self.request
+        prefer = request.headers.get('Prefer', '')
+        return (request.query_params.get('background') == 'true'
+                or 'respond-async' in prefer.replace(' ', '').split(','))
+
+    def enqueue(self, serializer):
+        """queue the save of a validated serializer"""
+        job = serializer.enqueue(serializer.validated_data)
+        location = reverse('job-detail', args=[job.id], request=self.request)
+        return Response(JobSerializer(job).data,
+                        status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': location})
+
+
+class MessagePackMixin:
+    """negotiate MessagePack request bodies and responses besides
+    JSON, JSON stays the default for clients accepting anything"""
+
+    renderer_classes = (api_settings.DEFAULT_RENDERER_CLASSES
+                        + [MessagePackRenderer])
+    parser_classes = (api_settings.DEFAULT_PARSER_CLASSES
+                      + [MessagePackParser])
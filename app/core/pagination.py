@@ -0,0 +1,43 @@
+"""
+Pagination of the API lists
+"""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """cursor pagination the clients opt in to with ?page_size or
+    ?cursor, the other requests keep getting the whole list"""
+
+    page_size = settings.MOBILE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.MOBILE_MAX_PAGE_SIZE
+
+    def requested(self, request):
+        """the client asked for a page"""
+        return (self.cursor_query_param in request.query_params
+                or self.page_size_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RankedCoursePagination(OptionalCursorPagination):
+    """pages of the courses, best ranked first, read from the ranking
+    index"""
+
+    ordering = ('-ranking_score', '-id')
+
+
+class CommentPagination(CursorPagination):
+    """pages of the comments of a course, newest first, read from the
+    (course, created_at, id) index. The cursor positions on the date,
+    the backfilled comments that share one page through it by offset"""
+
+    ordering = ('-created_at', '-id')
+    page_size = settings.COMMENT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.COMMENT_MAX_PAGE_SIZE
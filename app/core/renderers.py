@@ -0,0 +1,64 @@
+"""
+Renderers shared by the APIs
+"""
+
+import msgpack
+from django.db.models.fields.files import FieldFile
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONEncoder(encoders.JSONEncoder):
+    """DRF encoder also writing files as their URL"""
+
+    def default(self, obj):
+        if isinstance(obj, FieldFile):
+            return obj.url if obj else None
+        return super().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer using orjson when it is installed
+
+    the output is the one of the DRF renderer: compact, UTF-8, dates,
+    times and decimals encoded by the DRF encoder, so both renderers
+    can be swapped. Indented output (browsable API, ?indent) falls back
+    to the DRF renderer."""
+
+    encoder_class = JSONEncoder
+
+    if orjson is not None:
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or data is None or self.ensure_ascii or indent:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default,
+                           option=self.options)
+        # same escaping as the DRF renderer, for JSONP and inline scripts
+        return (ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+                .replace(b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack renderer, the data is the one of the JSON renderer
+    with the same encoding of dates, times, decimals and files"""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder_class = JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encoder_class().default,
+                             use_bin_type=True, datetime=False)
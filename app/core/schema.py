@@ -0,0 +1,94 @@
+"""
+Precomputed OpenAPI schema
+
+The schema only changes with the code, so `manage.py build_schema`
+renders it once into SCHEMA_ROOT and the workers serve the stored
+files. The files are named after a hash of the sources the schema is
+built from, a file built from other sources is never served: the
+schema is then generated on demand and kept in memory by the worker.
+"""
+
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import django
+import drf_spectacular
+import rest_framework
+from django.conf import settings
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = {'yaml': OpenApiYamlRenderer, 'json': OpenApiJsonRenderer}
+
+# directories holding no code the schema depends on
+IGNORED_DIRS = {'migrations', 'management', '__pycache__', 'schema'}
+
+_loaded = {}
+
+
+def _source_files():
+    """the python files of the project, in a stable order"""
+    base = Path(settings.BASE_DIR)
+    for root, dirs, files in os.walk(base):
+        dirs[:] = sorted(name for name in dirs
+                         if name not in IGNORED_DIRS
+                         and not name.startswith('.'))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = Path(root) / name
+                yield path.relative_to(base).as_posix(), path
+
+
+@lru_cache(maxsize=None)
+def source_version():
+    """hash of the project code and of the libraries generating the schema"""
+    digest = hashlib.sha256()
+    for module in (django, rest_framework, drf_spectacular):
+        digest.update(f'{module.__name__}=={module.__version__}\n'.encode())
+    for name, path in _source_files():
+        digest.update(name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def schema_path(fmt, version=None):
+    """path of the schema artifact of a version"""
+    version = version or source_version()
+    return Path(settings.SCHEMA_ROOT) / f'openapi-{version}.{fmt}'
+
+
+def generate_schema():
+    """generate the schema the same way SpectacularAPIView does"""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(
+        urlconf=spectacular_settings.SERVE_URLCONF,
+    )
+    return generator.get_schema(request=None,
+                                public=spectacular_settings.SERVE_PUBLIC)
+
+
+def render_schema(schema, fmt):
+    """render the schema to the bytes served for a format"""
+    renderer = RENDERERS[fmt]()
+    return renderer.render(schema, renderer.media_type, {})
+
+
+def load_schema(fmt):
+    """return the rendered schema, from the artifact when it matches
+    the current sources, generated on demand otherwise"""
+    content = _loaded.get(fmt)
+    if content is None:
+        path = schema_path(fmt)
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            logger.warning('%s not found, generating the schema on demand, '
+                           'run build_schema to precompute it', path)
+            content = render_schema(generate_schema(), fmt)
+        _loaded[fmt] = content
+    return content
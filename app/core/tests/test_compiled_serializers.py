@@ -0,0 +1,27 @@
+"""
+The compiled serializers against DRF, see check_compiled_serializers
+"""
+
+import io
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from core.management.commands.check_compiled_serializers import (
+    Command, add_edge_cases,
+)
+from core.management.commands.check_query_budgets import Dataset
+
+
+class CompiledSerializerTests(TestCase):
+    """the compiled list serializers send the same bytes as DRF"""
+
+    def test_compiled_serializers_match_drf(self):
+        dataset = Dataset(5)
+        add_edge_cases(dataset)
+        command = Command(stdout=io.StringIO())
+        with override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=[]):
+            failures = command.compare(dataset, {'benchmark': False})
+        if failures:
+            message = ['Compiled serializer check failed:'] + failures
+            self.fail('\n'.join(message))
@@ -0,0 +1,85 @@
+"""
+The sync and async modes of the custom middleware, see core.middleware
+"""
+
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import override_settings
+
+from branch import context as branch_context
+from core import metrics
+from core.middleware import (
+    BranchMiddleware, CompressionMiddleware, ReplicaRoutingMiddleware,
+    RequestMetricsMiddleware,
+)
+
+
+MIDDLEWARE = (BranchMiddleware, CompressionMiddleware,
+              ReplicaRoutingMiddleware, RequestMetricsMiddleware)
+
+
+class MiddlewareModeTests(SimpleTestCase):
+    """the middleware take the mode of the handler they wrap"""
+
+    def test_async_handler(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        for middleware in MIDDLEWARE:
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(asyncio.iscoroutinefunction(
+                    middleware(get_response)))
+
+    def test_sync_handler(self):
+        for middleware in MIDDLEWARE:
+            with self.subTest(middleware=middleware.__name__):
+                self.assertFalse(asyncio.iscoroutinefunction(
+                    middleware(lambda request: HttpResponse())))
+
+    def test_template_response_hook_follows_the_mode(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(asyncio.iscoroutinefunction(
+            RequestMetricsMiddleware(get_response).process_template_response))
+        self.assertFalse(asyncio.iscoroutinefunction(
+            RequestMetricsMiddleware(lambda request: HttpResponse())
+            .process_template_response))
+
+
+@override_settings(ALLOWED_HOSTS=['*'], COMPRESSION_MIN_SIZE=10)
+class AsyncMiddlewareTests(TestCase):
+    """the async path does what the sync one does"""
+
+    def setUp(self):
+        self.request = RequestFactory().get('/api/mobile-app/courses/',
+                                            HTTP_ACCEPT_ENCODING='gzip')
+        # looked up in the async path only when they are not cached
+        branch_context.reload()
+        branch_context.get_branches()
+
+    def test_branch_is_active_in_the_view(self):
+        seen = []
+
+        async def get_response(request):
+            seen.append(branch_context.current_branch_id())
+            return HttpResponse()
+
+        async_to_sync(BranchMiddleware(get_response))(self.request)
+        self.assertEqual(seen, [branch_context.default_branch().id])
+        self.assertIsNone(branch_context.current_branch_id())
+
+    def test_stats_and_compression(self):
+        async def get_response(request):
+            self.assertIsNotNone(metrics.current_stats())
+            return HttpResponse('x' * 100, content_type='application/json')
+
+        middleware = RequestMetricsMiddleware(
+            CompressionMiddleware(get_response))
+        response = async_to_sync(middleware)(self.request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIsNone(metrics.current_stats())
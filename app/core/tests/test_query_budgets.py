@@ -0,0 +1,23 @@
+"""
+The query budgets of the API endpoints, see check_query_budgets
+"""
+
+import io
+import json
+
+from django.test import TestCase
+
+from core.management.commands.check_query_budgets import BUDGET_FILE, Command
+
+
+class QueryBudgetTests(TestCase):
+    """every endpoint runs a fixed number of queries within its budget"""
+
+    def test_endpoints_within_budget(self):
+        with open(BUDGET_FILE) as budget_file:
+            budgets = json.load(budget_file)
+        command = Command(stdout=io.StringIO())
+        results = command.measure(command.routes(budgets), budgets, [2, 5])
+        failures = command.failures(results, budgets)
+        if failures:
+            self.fail('\n'.join(['Query budget check failed:'] + failures))
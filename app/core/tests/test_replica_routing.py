@@ -0,0 +1,149 @@
+"""
+The routing of the safe reads to the replicas, see core.db_router and
+core.middleware.ReplicaRoutingMiddleware
+"""
+
+import time
+import unittest
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+
+from core import db_router
+from core.management.commands.check_query_budgets import Dataset
+from core.middleware import PIN_COOKIE, ReplicaRoutingMiddleware
+from course.models import Course
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=2,
+                   REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaRoutingTests(TestCase):
+    """the middleware picks the database, the router follows it; only
+    the routing is checked, nothing is read from the replica"""
+
+    def setUp(self):
+        # a replica in sync, checked now
+        db_router._lag_cache['replica'] = (time.monotonic(), 0)
+        self.factory = RequestFactory(HTTP_AUTHORIZATION='Token client')
+        self.seen = []
+
+    def tearDown(self):
+        db_router._lag_cache.clear()
+        caches['shared'].clear()
+
+    def serve(self, request, status=200):
+        """the database of the course reads of the request"""
+        def get_response(request):
+            self.seen.append(Course.objects.all().db)
+            return HttpResponse(status=status)
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return self.seen.pop(), response
+
+    def test_safe_read(self):
+        alias, response = self.serve(
+            self.factory.get('/api/mobile-app/courses/'))
+        self.assertEqual(alias, 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        # reads outside a request go to the primary
+        self.assertEqual(Course.objects.all().db, 'default')
+
+    def test_other_paths_read_the_primary(self):
+        alias, _ = self.serve(self.factory.get('/api/dashboard/jobs/'))
+        self.assertEqual(alias, 'default')
+
+    def test_writes_go_to_the_primary(self):
+        alias, _ = self.serve(self.factory.post('/api/mobile-app/courses/'))
+        self.assertEqual(alias, 'default')
+        self.assertEqual(db_router.ReplicaRouter().db_for_write(Course),
+                         'default')
+
+    def test_lagging_replica_is_skipped(self):
+        db_router._lag_cache['replica'] = (time.monotonic(), 5)
+        alias, _ = self.serve(self.factory.get('/api/mobile-app/courses/'))
+        self.assertEqual(alias, 'default')
+
+    def test_writer_reads_its_writes(self):
+        _, response = self.serve(
+            self.factory.post('/api/mobile-app/courses/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        # pinned by the shared cache, for the clients dropping cookies
+        alias, _ = self.serve(self.factory.get('/api/mobile-app/courses/'))
+        self.assertEqual(alias, 'default')
+
+        # pinned by the cookie, whatever the cache says
+        caches['shared'].clear()
+        request = self.factory.get('/api/mobile-app/courses/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        alias, _ = self.serve(request)
+        self.assertEqual(alias, 'default')
+
+        # other clients keep reading from the replica
+        alias, _ = self.serve(RequestFactory().get('/api/mobile-app/courses/'))
+        self.assertEqual(alias, 'replica')
+
+    def test_failed_writes_do_not_pin(self):
+        _, response = self.serve(
+            self.factory.post('/api/mobile-app/courses/'), status=400)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        alias, _ = self.serve(self.factory.get('/api/mobile-app/courses/'))
+        self.assertEqual(alias, 'replica')
+
+    def test_pin_expires(self):
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.serve(self.factory.post('/api/mobile-app/courses/'))
+        alias, _ = self.serve(self.factory.get('/api/mobile-app/courses/'))
+        self.assertEqual(alias, 'replica')
+
+    def test_shared_cache_is_read_from_the_primary(self):
+        model = type('CacheEntry', (), {'_meta': type(
+            'Meta', (), {'app_label': db_router.SHARED_CACHE_LABEL})})
+        token = db_router.use_replica('replica')
+        try:
+            self.assertEqual(db_router.ReplicaRouter().db_for_read(model),
+                             'default')
+        finally:
+            db_router.reset_replica(token)
+
+
+@unittest.skipUnless('replica' in settings.DATABASES,
+                     'set DB_REPLICA_ALIAS=1 for the aliased replica')
+@override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=['replica'])
+class AliasedReplicaTests(TransactionTestCase):
+    """the reads of a request run on the replica connection, an alias
+    of the primary database"""
+
+    # the runner sets up the databases of the skipped tests too
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        db_router._lag_cache.clear()
+        self.dataset = Dataset(2)
+
+    def replica_queries(self, **extra):
+        """the queries of a course list run on the replica"""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connections['replica'].execute_wrapper(record):
+            response = self.client.get('/api/mobile-app/courses/', **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), Course.objects.count())
+        return queries
+
+    def test_reads_use_the_replica(self):
+        self.assertTrue(self.replica_queries())
+
+    def test_pinned_reads_use_the_primary(self):
+        self.client.cookies[PIN_COOKIE] = str(time.time() + 60)
+        self.assertFalse(self.replica_queries())
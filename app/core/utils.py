@@ -0,0 +1,19 @@
+"""
+Helpers shared by the apps
+"""
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+def run_sync(func, *args, **kwargs):
+    """run a blocking call in a worker thread of the pool, every
+    thread keeps its own database connection for the next calls, the
+    connections past CONN_MAX_AGE or broken are closed afterwards"""
+    def wrapper():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)()
@@ -0,0 +1,94 @@
+"""
+Views of the core app
+"""
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import (
+    SCHEMA_KWARGS,
+    SpectacularAPIView,
+    SpectacularSwaggerView,
+)
+
+from core import metrics, schema
+
+
+def metrics_view(request):
+    """serve the per-route histograms of this worker
+    in the Prometheus text format, to the holders of METRICS_TOKEN
+    or, without a token, to the addresses of METRICS_ALLOWED_IPS"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        allowed = constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+        )
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in getattr(
+            settings, 'METRICS_ALLOWED_IPS', ())
+    if not allowed:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+class SchemaView(SpectacularAPIView):
+    # serve the schema built by the build_schema command, clients
+    # revalidate it with its ETag. The docstring is published in the
+    # schema, keep the one of drf-spectacular.
+    __doc__ = SpectacularAPIView.__doc__
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('lang'):
+            # translated schemas are not precomputed
+            return super().get(request, *args, **kwargs)
+
+        renderer = request.accepted_renderer
+        etag = f'"{schema.source_version()}-{renderer.format}"'
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            response = HttpResponse(schema.load_schema(renderer.format),
+                                    content_type=content_type)
+        response['ETag'] = etag
+        self.patch_cache_control(response)
+        return response
+
+    def patch_cache_control(self, response):
+        """cache the schema until the next deploy"""
+        patch_cache_control(response, public=True, no_cache=True)
+
+
+class VersionedSchemaView(SchemaView):
+    """serve the schema of one version of the code, the
+    content of the URL never changes"""
+
+    @extend_schema(exclude=True)
+    def get(self, request, *args, **kwargs):
+        if kwargs.get('version') != schema.source_version():
+            raise Http404
+        return super().get(request)
+
+    def patch_cache_control(self, response):
+        """cache the schema forever"""
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=settings.SCHEMA_CACHE_SECONDS)
+
+
+class SchemaSwaggerView(SpectacularSwaggerView):
+    """swagger UI loading the versioned schema"""
+
+    @extend_schema(exclude=True)
+    def get(self, request, *args, **kwargs):
+        self.url = reverse('api-schema-version',
+                           kwargs={'version': schema.source_version()})
+        return super().get(request, *args, **kwargs)
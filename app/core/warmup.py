@@ -0,0 +1,135 @@
+"""
+Warm up a worker before it accepts traffic
+
+The first request of a fresh worker pays for loading the URL
+configuration, the schema, the query plans of the viewsets, the
+in-memory indexes and the database connections. gunicorn calls
+warm_up() after forking a worker, so that cost is paid before the
+worker gets requests. With a preloaded application the master warms up
+the caches once, without the databases, and the forked workers inherit
+them.
+"""
+
+import logging
+import time
+
+from asgiref.sync import SyncToAsync
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from core import db_router, schema
+from core.mixins import AutoPrefetchMixin
+
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_views(patterns):
+    """yield the view functions of the url patterns"""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _iter_views(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern.callback
+
+
+def load_urls():
+    """import every view and build the reverse lookup tables"""
+    get_resolver().reverse_dict
+
+
+def load_schema():
+    """read the precomputed schema, or generate it"""
+    for fmt in schema.RENDERERS:
+        schema.load_schema(fmt)
+
+
+def build_query_plans():
+    """build the query plans of the viewset actions"""
+    for callback in _iter_views(get_resolver().url_patterns):
+        view_class = getattr(callback, 'cls', None)
+        actions = getattr(callback, 'actions', None)
+        if not (actions and issubclass(view_class, AutoPrefetchMixin)):
+            continue
+
+        for action in set(actions.values()):
+            view = view_class(**callback.initkwargs)
+            view.action, view.request, view.format_kwarg = action, None, None
+            view.args, view.kwargs = (), {}
+            try:
+                serializer = view.get_serializer()
+                meta = getattr(serializer, 'Meta', None)
+                model = getattr(meta, 'model', None)
+                if model is not None:
+                    view.get_query_plan(model, serializer)
+            except Exception:
+                # the serializer of the action needs a request
+                logger.debug('no query plan for %s.%s',
+                             view_class.__name__, action)
+
+
+def _open_connections():
+    """open the connections of the current thread, they are kept for
+    its first requests when CONN_MAX_AGE allows it"""
+    for connection in connections.all():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.settings_dict['CONN_MAX_AGE']:
+            connection.close()
+
+
+def connect_databases(asgi=False):
+    """check every database and the lag of the replicas, then open the
+    connections of the thread serving the sync views, the main thread
+    of a WSGI worker, the single sync thread of an ASGI worker"""
+    for alias in db_router.get_replicas():
+        db_router.replica_lag(alias)
+
+    if asgi:
+        # the connections are per thread, those of the main thread
+        # would never serve a request
+        SyncToAsync.single_thread_executor.submit(_open_connections).result()
+        connections.close_all()
+    else:
+        _open_connections()
+
+
+def load_indexes():
+    """load the recommendation and autocomplete indexes of the process"""
+    from mobile_app import autocomplete
+    from recommendation.index import get_index
+    get_index()
+    autocomplete.get_index()
+
+
+STEPS = [
+    ('urls', load_urls),
+    ('schema', load_schema),
+    ('query plans', build_query_plans),
+    ('indexes', load_indexes),
+    ('databases', connect_databases),
+]
+
+
+def warm_up(databases=True, asgi=False):
+    """run every warm up step and return the seconds spent on each,
+    a failing step is logged and does not stop the worker"""
+    timings = {}
+    for name, step in STEPS:
+        if step in (connect_databases, load_indexes) and not databases:
+            continue
+        start = time.perf_counter()
+        try:
+            if step is connect_databases:
+                step(asgi=asgi)
+            else:
+                step()
+        except Exception:
+            logger.exception('warm up step %r failed', name)
+        timings[name] = time.perf_counter() - start
+
+    logger.info('worker warmed up in %.0fms (%s)',
+                sum(timings.values()) * 1000,
+                ', '.join(f'{name} {seconds * 1000:.0f}ms'
+                          for name, seconds in timings.items()))
+    return timings
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0015_archive_archived_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='ranking_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-ranking_score', '-id'], name='course_ranking_idx'),
+        ),
+    ]
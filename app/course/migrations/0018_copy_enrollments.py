@@ -0,0 +1,117 @@
+from django.core.management.color import no_style
+from django.db import migrations, transaction
+
+
+BATCH_SIZE = 10000
+
+
+def copy_enrollments(apps, schema_editor):
+    """copy the course students into the enrollments in batches of ids
+
+    every batch commits on its own and a rerun starts again at the
+    batch of the last copied id. The enrollment of the first course of
+    a course student keeps its id, so the API ids do not change, a
+    course student linked to more courses gets new ids for the others.
+    A student listed twice in a course keeps the first row, course
+    students without a student or a course are dropped."""
+    CourseStudent = apps.get_model('course', 'CourseStudent')
+    Course = apps.get_model('course', 'Course')
+    Enrollment = apps.get_model('course', 'Enrollment')
+    connection = schema_editor.connection
+    enrollment = Enrollment._meta.db_table
+    course_student = CourseStudent._meta.db_table
+    link = Course.students.through._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {course_student}')
+        last_id, = cursor.fetchone()
+        # the kept ids are at most last_id, the new ones come after
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {enrollment} '
+                       f'WHERE id <= %s', [last_id])
+        start, = cursor.fetchone()
+        cursor.execute(f"""
+            SELECT setval(pg_get_serial_sequence('{enrollment}', 'id'),
+                          greatest(%s, (SELECT max(id) FROM {enrollment}), 1))
+        """, [last_id])
+
+    while start < last_id:
+        end = start + BATCH_SIZE
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {enrollment} (id, course_id, student_id, paid,
+                                          enrolled_at)
+                SELECT CASE WHEN pending.first_course THEN pending.id
+                            ELSE nextval(pg_get_serial_sequence('{enrollment}',
+                                                                'id'))
+                       END,
+                       pending.course_id, pending.student_id,
+                       pending.paid, now()
+                FROM (
+                    SELECT DISTINCT ON (link.course_id, student.student_id)
+                           student.id, link.course_id, student.student_id,
+                           student.paid,
+                           link.course_id = min(link.course_id) OVER (
+                               PARTITION BY student.id) AS first_course
+                    FROM {course_student} student
+                    JOIN {link} link ON link.coursestudent_id = student.id
+                    WHERE student.id > %s AND student.id <= %s
+                      AND student.student_id IS NOT NULL
+                    ORDER BY link.course_id, student.student_id, student.id
+                ) pending
+                ON CONFLICT (course_id, student_id) DO NOTHING
+            """, [start, end])
+        start = end
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Enrollment]):
+            cursor.execute(sql)
+        cursor.execute(f"""
+            SELECT count(*), count(enrollment.id)
+            FROM (
+                SELECT DISTINCT link.course_id, student.student_id
+                FROM {course_student} student
+                JOIN {link} link ON link.coursestudent_id = student.id
+                WHERE student.student_id IS NOT NULL
+            ) pair
+            LEFT JOIN {enrollment} enrollment
+              USING (course_id, student_id)
+        """)
+        expected, copied = cursor.fetchone()
+    if copied != expected:
+        raise RuntimeError(f'{expected} enrollments to copy, but only '
+                           f'{copied} copied')
+
+
+def restore_course_students(apps, schema_editor):
+    """copy the enrollments back into the course students"""
+    CourseStudent = apps.get_model('course', 'CourseStudent')
+    Course = apps.get_model('course', 'Course')
+    Enrollment = apps.get_model('course', 'Enrollment')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {CourseStudent._meta.db_table} (id, student_id, paid)
+            SELECT id, student_id, paid FROM {Enrollment._meta.db_table}
+            ON CONFLICT DO NOTHING
+        """)
+        cursor.execute(f"""
+            INSERT INTO {Course.students.through._meta.db_table} (course_id, coursestudent_id)
+            SELECT course_id, id FROM {Enrollment._meta.db_table}
+            ON CONFLICT DO NOTHING
+        """)
+        for sql in connection.ops.sequence_reset_sql(no_style(), [CourseStudent]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    # batches commit one by one, an interrupted copy resumes on rerun
+    atomic = False
+
+    dependencies = [
+        ('course', '0017_enrollment'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_enrollments, restore_course_students),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0018_copy_enrollments'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='course',
+            name='students',
+        ),
+        migrations.DeleteModel(
+            name='CourseStudent',
+        ),
+    ]
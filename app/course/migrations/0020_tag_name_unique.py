@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:37
+
+from django.db import migrations, models
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """merge the tags with the same normalized name into the oldest one
+
+    the courses of the duplicates are linked to the kept tag. The tag
+    rollups and the recommendation neighbours still count the merged
+    tags until `manage.py rebuild_rollups` and
+    `manage.py refresh_recommendations --all` run."""
+    Course = apps.get_model('course', 'Course')
+    Tag = apps.get_model('course', 'Tag')
+    through = Course.tags.through
+    groups = {}
+    for id, name in Tag.objects.order_by('id').values_list('id', 'name'):
+        groups.setdefault(' '.join(name.split()), []).append((id, name))
+
+    for name, tags in groups.items():
+        (kept, kept_name), duplicates = tags[0], [id for id, _ in tags[1:]]
+        if duplicates:
+            course_ids = (through.objects.filter(tag_id__in=duplicates)
+                          .values_list('course_id', flat=True).distinct())
+            through.objects.bulk_create(
+                [through(course_id=course_id, tag_id=kept) for course_id in course_ids],
+                ignore_conflicts=True,
+            )
+            Tag.objects.filter(id__in=duplicates).delete()
+        if kept_name != name:
+            Tag.objects.filter(id=kept).update(name=name)
+
+    # check the deferred foreign keys now, the pending checks would
+    # forbid altering the table in this transaction
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0019_remove_coursestudent'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_created_at(apps, schema_editor):
+    """date the existing comments by their last update, without
+    recording a sync change for every comment"""
+    Comment = apps.get_model('course', 'Comment')
+    table = Comment._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_trigger WHERE tgrelid = %s::regclass "
+                       "AND tgname = 'sync_change'", [table])
+        tracked = cursor.fetchone() is not None
+        if tracked:
+            cursor.execute(f'ALTER TABLE {table} DISABLE TRIGGER sync_change')
+        cursor.execute(f'UPDATE {table} SET created_at = updated_at')
+        if tracked:
+            cursor.execute(f'ALTER TABLE {table} ENABLE TRIGGER sync_change')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0020_tag_name_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['course', '-created_at', '-id'], name='comment_course_created_idx'),
+        ),
+        # the new index starts with the course
+        migrations.AlterField(
+            model_name='comment',
+            name='course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='course.course'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:51
+
+import branch.context
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('course', '0021_comment_created_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='course',
+            name='course_ranking_idx',
+        ),
+        # the existing courses belong to the default branch
+        migrations.AddField(
+            model_name='course',
+            name='branch',
+            field=models.ForeignKey(db_index=False, default=branch.context.branch_of_new_rows, on_delete=django.db.models.deletion.PROTECT, related_name='courses', to='branch.branch'),
+        ),
+        # the ranking of a branch, also the index of its courses
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['branch', '-ranking_score', '-id'], name='course_ranking_idx'),
+        ),
+    ]
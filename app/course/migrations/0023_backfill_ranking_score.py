@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db import migrations
+
+
+# the mean of a catalog without comments, see course.ranking
+DEFAULT_MEAN = 3.0
+
+
+def backfill_ranking_score(apps, schema_editor):
+    """rank the existing courses as course.ranking.update_rankings
+    does, they were all left at 0, without recording a sync change for
+    every course, the score is not synced"""
+    Course = apps.get_model('course', 'Course')
+    Comment = apps.get_model('course', 'Comment')
+    Enrollment = apps.get_model('course', 'Enrollment')
+    course = Course._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT avg(rating) FROM {Comment._meta.db_table}')
+        mean, = cursor.fetchone()
+        cursor.execute("SELECT 1 FROM pg_trigger WHERE tgrelid = %s::regclass "
+                       "AND tgname = 'sync_change'", [course])
+        tracked = cursor.fetchone() is not None
+        if tracked:
+            cursor.execute(f'ALTER TABLE {course} DISABLE TRIGGER sync_change')
+        cursor.execute(f"""
+            WITH comments AS (
+                SELECT course_id, count(*) AS count, sum(rating) AS total
+                FROM {Comment._meta.db_table}
+                GROUP BY course_id
+            ),
+            enrolled AS (
+                SELECT course_id, count(*) AS count
+                FROM {Enrollment._meta.db_table}
+                GROUP BY course_id
+            )
+            UPDATE {course} course
+            SET ranking_score =
+                (%(prior)s * %(mean)s + coalesce(comments.total, 0))
+                / (%(prior)s + coalesce(comments.count, 0))
+                + %(enrollment_weight)s * ln(1 + coalesce(enrolled.count, 0))
+            FROM {course} ranked
+            LEFT JOIN comments ON comments.course_id = ranked.id
+            LEFT JOIN enrolled ON enrolled.course_id = ranked.id
+            WHERE course.id = ranked.id
+        """, {
+            'prior': float(settings.RANKING_PRIOR_WEIGHT),
+            'mean': DEFAULT_MEAN if mean is None else float(mean),
+            'enrollment_weight': float(settings.RANKING_ENROLLMENT_WEIGHT),
+        })
+        if tracked:
+            cursor.execute(f'ALTER TABLE {course} ENABLE TRIGGER sync_change')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0022_course_branch'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ranking_score, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0023_backfill_ranking_score'),
+    ]
+
+    operations = [
+        # the comments keep an index of their course meanwhile
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['course', '-id'], name='comment_course_newest_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_course_created_idx',
+        ),
+    ]
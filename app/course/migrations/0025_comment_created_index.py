@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0024_comment_newest_index'),
+    ]
+
+    operations = [
+        # the comments keep an index of their course meanwhile
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['course', '-created_at', '-id'], name='comment_course_created_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_course_newest_idx',
+        ),
+    ]
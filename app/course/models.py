@@ -3,6 +3,10 @@ Models for the course
 """
 
 from django.db import models
+from django.utils import timezone
+from branch.context import branch_of_new_rows
+from branch.managers import BranchManager
+from branch.models import Branch
 from teacher.models import Teacher
 from user.models import User
 import os
@@ -20,6 +24,10 @@ def image_file_path(instance, filename):
 class Course(models.Model):
     """a course in the system"""
 
+    # indexed by course_ranking_idx
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT,
+                               related_name='courses',
+                               default=branch_of_new_rows, db_index=False)
     name = models.CharField(max_length=255)
     bio = models.CharField(max_length=255, blank=True, default = '')
     description = models.CharField(max_length=255, default = '', blank=True)
@@ -44,34 +52,52 @@ class Course(models.Model):
 
     level = models.CharField(max_length=20, choices=status_choices, default='all_levels')
     rating = models.DecimalField(decimal_places =1, max_digits =2, default=3)
-    students = models.ManyToManyField(
-        'coursestudent',
-        related_name='courses',
-        blank=True,
-        null=True,
-    )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # bayesian average of the comments, see course.ranking
+    ranking_score = models.FloatField(default=0)
+
+    objects = BranchManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['branch', '-ranking_score', '-id'],
+                         name='course_ranking_idx'),
+        ]
+
     def __str__(self):
         return f'{self.name}, {self.instructor}'
 
 
-class CourseStudent(models.Model):
-    """a student in the course"""
-    student = models.ForeignKey(
-        User,
-        on_delete=models.CASCADE,
-        related_name='course_student',
-        blank=True,
-        null=True,
-    )
+class Enrollment(models.Model):
+    """a student enrolled in a course"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE,
+                               related_name='enrollments', db_index=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE,
+                                related_name='enrollments', db_index=False)
     paid = models.BooleanField(default=False)
+    enrolled_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # also the index of the students of a course
+            models.UniqueConstraint(fields=['course', 'student'],
+                                    include=['paid'],
+                                    name='enrollment_one_per_student'),
+        ]
+        indexes = [
+            # the courses of a student
+            models.Index(fields=['student', 'course'], include=['paid'],
+                         name='enrollment_student_idx'),
+        ]
 
     def __str__(self):
         return f'{self.student.first_name} {self.student.last_name}'
 
 
 class Tag(models.Model):
-    """Tags for filtering the courses"""
-    name = models.CharField(max_length=255)
+    """Tags for filtering the courses, see course.tags"""
+    name = models.CharField(max_length=255, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -79,8 +105,9 @@ class Tag(models.Model):
 
 class Comment(models.Model):
     """comments for a course"""
+    # indexed by comment_course_created_idx
     course = models.ForeignKey(Course, on_delete=models.CASCADE,
-                               related_name='comments')
+                               related_name='comments', db_index=False)
 
     student = models.ForeignKey(User, on_delete=models.CASCADE,
                                 related_name='comments')
@@ -92,6 +119,15 @@ class Comment(models.Model):
                                 MinValueValidator(1),  # Minimum value
                                 MaxValueValidator(5),  # Maximum value
                                 ])
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # the comments of a course, newest first
+            models.Index(fields=['course', '-created_at', '-id'],
+                         name='comment_course_created_idx'),
+        ]
 
 
 class Archive(models.Model):
@@ -102,4 +138,5 @@ class Archive(models.Model):
     students = models.ManyToManyField(User, related_name='history')
     course_price = models.DecimalField(decimal_places=5, max_digits=10)
     total_earnings = models.DecimalField(decimal_places=5, max_digits=10)
-    total_students = models.IntegerField()
\ No newline at end of file
+    total_students = models.IntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
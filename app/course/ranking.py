@@ -0,0 +1,89 @@
+"""
+Ranking of the courses in the mobile app
+
+A course is ranked by the Bayesian average of its comment ratings: its
+ratings plus RANKING_PRIOR_WEIGHT ratings at the mean of all the
+comments, so one 5 star comment does not outrank a course rated by
+many students. RANKING_ENROLLMENT_WEIGHT * ln(1 + enrollments) is
+added to favour the courses students take.
+
+The score is kept in the indexed Course.ranking_score and recomputed
+with Course.rating, the mean of the comments, when a comment is posted
+or deleted and when the enrollments change. The mean of all the
+comments moves slowly, it is cached for RANKING_MEAN_CACHE_SECONDS and
+`manage.py recompute_rankings` recomputes every course with it.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Avg
+
+from course.models import Comment, Course, Enrollment
+
+
+MEAN_CACHE_KEY = 'ranking:mean'
+# the mean of a catalog without comments, the default rating
+DEFAULT_MEAN = 3.0
+
+
+def global_mean(refresh=False):
+    """mean rating of all the comments"""
+    mean = None if refresh else cache.get(MEAN_CACHE_KEY)
+    if mean is None:
+        mean = Comment.objects.aggregate(mean=Avg('rating'))['mean']
+        mean = DEFAULT_MEAN if mean is None else float(mean)
+        cache.set(MEAN_CACHE_KEY, mean, settings.RANKING_MEAN_CACHE_SECONDS)
+    return mean
+
+
+def update_rankings(course_ids, mean=None):
+    """recompute the rating and the ranking score of the courses,
+    return the number of courses whose values changed"""
+    course_ids = sorted(set(course_ids))
+    if not course_ids:
+        return 0
+    course = Course._meta.db_table
+    using = router.db_for_write(Course)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"""
+            WITH comments AS (
+                SELECT course_id, count(*) AS count, sum(rating) AS total
+                FROM {Comment._meta.db_table}
+                WHERE course_id = ANY(%(ids)s)
+                GROUP BY course_id
+            ),
+            enrolled AS (
+                SELECT course_id, count(*) AS count
+                FROM {Enrollment._meta.db_table}
+                WHERE course_id = ANY(%(ids)s)
+                GROUP BY course_id
+            ),
+            ranked AS (
+                SELECT course.id,
+                       CASE WHEN comments.count > 0
+                            THEN round(comments.total / comments.count, 1)
+                            ELSE course.rating END AS rating,
+                       (%(prior)s * %(mean)s + coalesce(comments.total, 0))
+                       / (%(prior)s + coalesce(comments.count, 0))
+                       + %(enrollment_weight)s
+                         * ln(1 + coalesce(enrolled.count, 0))
+                       AS ranking_score
+                FROM {course} course
+                LEFT JOIN comments ON comments.course_id = course.id
+                LEFT JOIN enrolled ON enrolled.course_id = course.id
+                WHERE course.id = ANY(%(ids)s)
+            )
+            UPDATE {course} course
+            SET rating = ranked.rating, ranking_score = ranked.ranking_score
+            FROM ranked
+            WHERE course.id = ranked.id
+              AND (course.rating, course.ranking_score)
+                  IS DISTINCT FROM (ranked.rating, ranked.ranking_score)
+        """, {
+            'ids': course_ids,
+            'prior': float(settings.RANKING_PRIOR_WEIGHT),
+            'mean': global_mean() if mean is None else mean,
+            'enrollment_weight': float(settings.RANKING_ENROLLMENT_WEIGHT),
+        })
+        return cursor.rowcount
@@ -2,21 +2,26 @@
 Serializers for the course API
 """
 
+from django.conf import settings
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
 from course.models import (
     Course,
     Tag,
-    CourseStudent,
+    Enrollment,
     Comment,
     Archive,
 )
-from schedule.models import CourseTime
+from course import ranking, tags as course_tags
+from course.tasks import archive_course
 from teacher.models import Teacher
-from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from notification.models import Notification
 from schedule.models import ClassRoom
-from django.db.models import Max
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Count, Sum
+from django.db.models.functions import Floor
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -30,7 +35,28 @@ class TagSerializer(serializers.ModelSerializer):
     """serializer for the tag model"""
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ['id', 'name']
+        # checked on the normalized name by validate_name
+        extra_kwargs = {'name': {'validators': []}}
+
+    def validate_name(self, value):
+        """normalize the name, it must not name another tag"""
+        name = course_tags.normalize_name(value)
+        tags = Tag.objects.filter(name=name)
+        if self.instance is not None:
+            tags = tags.exclude(id=self.instance.id)
+        if tags.exists():
+            raise serializers.ValidationError(
+                'tag with this name already exists.')
+        return name
+
+
+class CourseTagSerializer(TagSerializer):
+    """a tag of a course, named by an existing or a new tag"""
+
+    def validate_name(self, value):
+        """normalize the name"""
+        return course_tags.normalize_name(value)
 
 
 class StudentSerializer(serializers.ModelSerializer):
@@ -45,65 +71,58 @@ class CourseStudentListSerializer(serializers.ListSerializer):
     instances at the same time"""
     def update(self, instance, validated_data):
         """update  the instances all at once """
-        course_students = instance.students.all()
+        course_students = instance.enrollments.all()
         new_course_students = validated_data
         # Extract IDs of existing course students
-        existing_ids = [course_student.id for course_student in course_students]
+        existing_ids = [course_student.id
+                        for course_student in course_students]
         for new_course_student in new_course_students:
             if new_course_student['id'] in existing_ids:
-                course_student_instance = CourseStudent.objects.get(id=
-                                                                    new_course_student['id'])
+                course_student_instance = Enrollment.objects.get(
+                    id=new_course_student['id'])
                 course_student_instance.paid = new_course_student['paid']
                 course_student_instance.save()
             else:
-                 raise Exception("unvalid course_student id ")
-        return instance.students.all()
+                raise Exception("unvalid course_student id ")
+        return Enrollment.objects.filter(course=instance)
 
 
 class CourseStudentSerializer(serializers.ModelSerializer):
-    """serializer to represent student in the course"""
+    """serializer to represent student in the course, an enrollment
+    shown with the fields of the former course student"""
     student = StudentSerializer(read_only=True)
     id = serializers.IntegerField()
+
     class Meta:
-        model=CourseStudent
-        fields = '__all__'
-        read_only_fields = ['students']
+        model = Enrollment
+        fields = ['id', 'student', 'paid']
         list_serializer_class = CourseStudentListSerializer
 
 
-
-
 class TeacherSerializer(serializers.ModelSerializer):
     """serializer for the teacher"""
     id = serializers.IntegerField(read_only=False)
+
     class Meta:
         model = Teacher
-        fields = ['id', 'email', 'first_name', 'last_name','image']
-        read_only_fields = ['email', 'first_name', 'last_name','image']
-
+        fields = ['id', 'email', 'first_name', 'last_name', 'image']
+        read_only_fields = ['email', 'first_name', 'last_name', 'image']
 
 
 class DetailCourseSerializer(serializers.ModelSerializer):
     """Detailed Course serializer used for creation"""
     tags = serializers.ListField(child=serializers.CharField(max_length=100))
+
     class Meta:
         model = Course
-        fields = ['id', 'image', 'name',  'bio', 'description', 'instructor', 'tags',
-                  'price', 'registration_open', 'in_progress']
-
-
-    def _get_or_create_tags(self, tags, course):
-        """handle getting or creating tags as needed"""
-        for tag in tags :
-            tag_obj, _ = Tag.objects.get_or_create(name=tag)
-            course.tags.add(tag_obj)
-
+        fields = ['id', 'image', 'name', 'bio', 'description', 'instructor',
+                  'tags', 'price', 'registration_open', 'in_progress']
 
     def create(self, validated_data):
         """create a course"""
         tags = validated_data.pop('tags', [])
         course = Course.objects.create(**validated_data)
-        self._get_or_create_tags(tags, course)
+        course_tags.set_course_tags(course, tags)
 
         return course
 
@@ -112,8 +131,7 @@ class DetailCourseSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags', None)
 
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            course_tags.set_course_tags(instance, tags, replace=True)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -122,27 +140,24 @@ class DetailCourseSerializer(serializers.ModelSerializer):
         return instance
 
 
-
 class DetailCourseSerializerv2(serializers.ModelSerializer):
     """special detailed serializer for the response"""
-    tags = TagSerializer(many=True, required=False)
+    tags = CourseTagSerializer(many=True, required=False)
     instructor = TeacherSerializer()
-    students = CourseStudentSerializer(many=True)
+    students = CourseStudentSerializer(source='enrollments', many=True)
+
     class Meta:
         model = Course
-        fields = '__all__'
-
-    def _get_or_create_tags(self, tags, course):
-        """handle getting or creating tags as needed"""
-        for tag in tags :
-            tag_obj, _ = Tag.objects.get_or_create(**tag)
-            course.tags.add(tag_obj)
+        fields = ['id', 'tags', 'instructor', 'students', 'name', 'bio',
+                  'description', 'price', 'image', 'registration_open',
+                  'in_progress', 'level', 'rating', 'branch']
+        read_only_fields = ['branch']
 
     def create(self, validated_data):
         """create a course"""
         tags = validated_data.pop('tags', [])
         course = Course.objects.create(**validated_data)
-        self._get_or_create_tags(tags, course)
+        course_tags.set_course_tags(course, [tag['name'] for tag in tags])
 
         return course
 
@@ -150,8 +165,9 @@ class DetailCourseSerializerv2(serializers.ModelSerializer):
         """update a course"""
         tags = validated_data.pop('tags', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            course_tags.set_course_tags(instance,
+                                        [tag['name'] for tag in tags],
+                                        replace=True)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -159,6 +175,34 @@ class DetailCourseSerializerv2(serializers.ModelSerializer):
         return instance
 
 
+def notify_capacity(course):
+    """ask to close the registration of a full course, the
+    registrations past the capacity add up in one notification"""
+    # also run by the jobs, outside the branch of a request
+    max_capacity = (ClassRoom._base_manager.filter(branch_id=course.branch_id)
+                    .aggregate(max_capacity=Max('capacity')))
+    max_capacity = max_capacity['max_capacity']
+    students = course.enrollments.count()
+
+    if max_capacity is not None and students >= max_capacity:
+        instructor = course.instructor
+        message = (f'{students} students registered to {course.name}/'
+                   f'{instructor.first_name} {instructor.last_name} '
+                   f'close registration ?')
+        Notification.objects.notify(course, Notification.CAPACITY, message)
+
+
+def enroll(course, student):
+    """enroll the student in the course, the unique constraint of the
+    enrollments rejects a second registration"""
+    try:
+        with transaction.atomic():
+            return Enrollment.objects.create(course=course, student=student)
+    except IntegrityError:
+        raise serializers.ValidationError(
+            "Student is already enrolled in the course")
+
+
 class AddStudentToCourseSerializer(serializers.Serializer):
     """serializer to use in the dashboard for
     adding a student to a course"""
@@ -171,18 +215,8 @@ class AddStudentToCourseSerializer(serializers.Serializer):
         student = get_user_model().objects.get(id=validated_data['student_id'])
         course = Course.objects.get(id=validated_data['course_id'])
 
-        if course.students.filter(student=student).exists():
-            raise serializers.ValidationError("Student is already enrolled in the course")
-        course_student = CourseStudent.objects.create(student=student)
-        course.students.add(course_student)
-        max_capacity = ClassRoom.objects.aggregate(max_capacity=Max('capacity'))
-        max_capacity = max_capacity['max_capacity']
-        print(f"Number of students: {course.students.count()}, Max capacity: {max_capacity}")
-
-
-        if course.students.count() == max_capacity:
-            message = f"""{course.students.count()} students registered to {course.name}/{course.instructor.first_name} {course.instructor.last_name} close registration ?"""
-            Notification.objects.create(course=course, message=message)
+        enroll(course, student)
+        notify_capacity(course)
 
         return course
 
@@ -199,8 +233,7 @@ class RemoveStudentFromCourseSerializer(serializers.Serializer):
         student = get_user_model().objects.get(id=validated_data['student_id'])
         course = Course.objects.get(id=validated_data['course_id'])
 
-        if course.students.filter(student=student).exists():
-            course.students.filter(student=student).first().delete()
+        Enrollment.objects.filter(course=course, student=student).delete()
         return course
 
 
@@ -221,9 +254,10 @@ class TempTeacherSerializer(serializers.ModelSerializer):
 class MobileAppCourseSerializer(serializers.ModelSerializer):
     """Serializer for the course in the mobile app"""
     instructor = TempTeacherSerializer()
+
     class Meta:
         model = Course
-        fields = ['id', 'image', 'name','price', 'instructor', 'rating']
+        fields = ['id', 'image', 'name', 'price', 'instructor', 'rating']
 
 
 class PostCommentSerializer(serializers.ModelSerializer):
@@ -233,20 +267,12 @@ class PostCommentSerializer(serializers.ModelSerializer):
         fields = ['comment', 'rating']
 
     def create(self, validated_data):
-        """update the rating of the course"""
+        """update the rating and the ranking of the course"""
         instance = super().create(validated_data)
-        request = self.context.get('request')
-        course_id = request.parser_context['kwargs']['pk']
-        course = Course.objects.get(id=course_id)
-        course.rating = (validated_data['rating']+course.rating)/2
-        course.save()
-
+        ranking.update_rankings([instance.course_id])
         return instance
 
 
-
-
-
 class StudentCommentSerializer(serializers.ModelSerializer):
     """Serializer for the student of the comment"""
     class Meta:
@@ -258,59 +284,118 @@ class GetCommentSerializer(serializers.Serializer):
     """Serializer for comment section"""
     student = StudentCommentSerializer(read_only=True)
     comment = serializers.CharField()
-    rating = serializers.DecimalField(decimal_places = 1,
-                                     max_digits =2,)
+    rating = serializers.DecimalField(decimal_places=1, max_digits=2)
     read_only_fields = ['student', 'comment', 'rating']
 
 
+class CourseCommentSerializer(serializers.ModelSerializer):
+    """Serializer for the pages of the comments of a course"""
+    student = StudentCommentSerializer(read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'student', 'comment', 'rating', 'created_at']
+        read_only_fields = fields
+
+
+def latest_comments(course_id):
+    """the newest comments of a course embedded in its detail"""
+    return list(Comment.objects.filter(course_id=course_id)
+                .select_related('student')
+                .order_by('-created_at', '-id')
+                [:settings.COURSE_DETAIL_COMMENTS])
+
+
+def rating_summary(course_id):
+    """aggregate the ratings of a course in a single query
+    and return the percentage of every rating"""
+    rows = (Comment.objects.filter(course__id=course_id)
+            .annotate(bucket=Floor('rating'))
+            .values('bucket')
+            .annotate(count=Count('id'), total=Sum('rating')))
+    rating_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+    total_comments = 0
+    ratings_sum = 0
+    for row in rows:
+        rating_counts[int(row['bucket'])] += row['count']
+        total_comments += row['count']
+        ratings_sum += row['total']
+
+    if total_comments == 0:
+        return {
+            'one': 0,
+            'two': 0,
+            'three': 0,
+            'four': 0,
+            'five': 0,
+            'total_rating': 0
+        }
+
+    total_rating = ratings_sum/total_comments
+    percent_ratings = {str(rating): (count / total_comments) * 100
+                       for rating, count in rating_counts.items()}
+
+    return {
+        'one': f"{percent_ratings.get('1', 0)}%",
+        'two': f"{percent_ratings.get('2', 0)}%",
+        'three': f"{percent_ratings.get('3', 0)}%",
+        'four': f"{percent_ratings.get('4', 0)}%",
+        'five': f"{percent_ratings.get('5', 0)}%",
+        'total_rating': total_rating
+    }
+
 
 class MobileAppDetailCourseSerializer(serializers.ModelSerializer):
     """serializer for the course in the mobile app"""
     tags = TagSerializer(many=True)
-    comments = GetCommentSerializer(many=True)
+    comments = serializers.SerializerMethodField()
     instructor = MobileAppTeacherSerializer()
     ratings = serializers.SerializerMethodField()
 
+    @extend_schema_field(GetCommentSerializer(many=True))
+    def get_comments(self, obj):
+        """the newest comments, the others are paged by the comments
+        endpoint of the course"""
+        return GetCommentSerializer(latest_comments(obj.id), many=True).data
+
     def get_ratings(self, obj):
-        """method to calculate and return ratings"""
-        course_id = obj.id
-        comments = Comment.objects.filter(course__id=course_id)
-        total_comments = comments.count()
-        if total_comments == 0:
-            return {
-                'one': 0,
-                'two': 0,
-                'three': 0,
-                'four': 0,
-                'five': 0,
-                'total_rating': 0
-            }
-
-        ratings = [comment.rating for comment in comments]
-        total_rating = sum(ratings)/total_comments
-        course = Course.objects.get(id=course_id)
-        course.rating = total_rating
-        course.save()
-
-        #Calculate percentage of every rating
-        rating_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        int_ratings = [int(rating) for rating in ratings]
-        for rating in int_ratings:
-            rating_counts[rating]+=1
-        percent_ratings = {str(rating): (count / total_comments) * 100 for rating, count in rating_counts.items()}
+        """method to calculate and return ratings, the rating of the
+        course is kept up to date by the comment writes"""
+        return rating_summary(obj.id)
 
-        return {
-            'one': f"{percent_ratings.get('1', 0)}%",
-            'two': f"{percent_ratings.get('2', 0)}%",
-            'three': f"{percent_ratings.get('3', 0)}%",
-            'four': f"{percent_ratings.get('4', 0)}%",
-            'five': f"{percent_ratings.get('5', 0)}%",
-            'total_rating': total_rating
-        }
     class Meta:
         model = Course
         fields = ['id', 'image', 'name', 'bio', 'description', 'price', 'tags',
-                   'instructor', 'comments', 'ratings']
+                  'instructor', 'comments', 'ratings']
+
+
+class SyncCourseSerializer(serializers.ModelSerializer):
+    """Serializer for the courses of the mobile sync"""
+    class Meta:
+        model = Course
+        fields = ['id', 'image', 'name', 'bio', 'description', 'price',
+                  'level', 'rating', 'registration_open', 'in_progress',
+                  'instructor', 'tags', 'updated_at']
+        read_only_fields = fields
+
+
+class SyncTagSerializer(serializers.ModelSerializer):
+    """Serializer for the tags of the mobile sync"""
+    class Meta:
+        model = Tag
+        fields = ['id', 'name', 'updated_at']
+        read_only_fields = fields
+
+
+class SyncCommentSerializer(serializers.ModelSerializer):
+    """Serializer for the comments of the mobile sync"""
+    student = StudentCommentSerializer(read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'course', 'student', 'comment', 'rating',
+                  'updated_at']
+        read_only_fields = fields
 
 
 class RegisterSerializer(serializers.Serializer):
@@ -323,57 +408,45 @@ class RegisterSerializer(serializers.Serializer):
         and add course to the student"""
 
         student = self.context['request'].user
-        course_student = CourseStudent.objects.create(student=student)
         course = Course.objects.get(id=validated_data['id'])
-        if course.students.filter(student=student).exists():
-            raise serializers.ValidationError("Student is already enrolled in the course")
-        course.students.add(course_student)
-        ax_capacity = ClassRoom.objects.aggregate(max_capacity=Max('capacity'))
-        max_capacity = max_capacity['max_capacity']
-
-        if course.students.count() >= max_capacity:
-            message = f"""{course.students.count()} students registered to {course.name}/{course.instructor.first_name} {course.instructor.last_name} close registration ?"""
-            Notification.objects.create(course=course, message=message)
+        enroll(course, student)
+        notify_capacity(course)
 
         return student
 
 
-
 class ArchiveSerializer(serializers.ModelSerializer):
     """Serializer for the archive of the course"""
     students = StudentCommentSerializer(many=True, read_only=True)
+
     class Meta:
         model = Archive
-        fields = ['course_version', 'course_price', 'students', 'total_students', 'total_earnings']
-        read_only_fields = ['course_version', 'course_price', 'students', 'total_students', 'total_earnings']
+        fields = ['course_version', 'course_price', 'students',
+                  'total_students', 'total_earnings']
+        read_only_fields = fields
+
+    def get_course(self):
+        """the course routed to the request"""
+        request = self.context.get('request')
+        return get_object_or_404(Course.objects.all(),
+                                 id=request.parser_context['kwargs']['pk'])
+
+    def validate(self, attrs):
+        """only a course in progress can be archived"""
+        attrs['course'] = self.get_course()
+        if not attrs['course'].in_progress:
+            raise serializers.ValidationError('course is not in progress')
+        return attrs
 
     def create(self, validated_data):
         """clear the course and save its data
         to an archeive instance"""
 
-        request = self.context.get('request')
-        course_id = request.parser_context['kwargs']['pk']
-        course = Course.objects.get(id=course_id)
-        if course.in_progress:
-            students = course.students.filter(paid=True)
-            course_price = course.price
-            total_students = course.students.filter(paid=True).count()
-            total_earnings = total_students*course_price
-            course_version = Archive.objects.filter(course=course).count()+1
-            archive = Archive.objects.create(course=course,
-                                            course_price=course_price,
-                                            total_students=total_students,
-                                            total_earnings=total_earnings,
-                                            course_version=course_version)
-            for student in students:
-                archive.students.add(student.student)
-
-            course.students.all().delete()
-            CourseTime.objects.filter(course=course).delete()
-            course.in_progress = False
-            course.save()
-
-        else:
-            raise Exception('course is not in progress')
-
-        return archive
+        archive_id = archive_course(course_id=validated_data['course'].id)
+        return Archive.objects.get(id=archive_id)
+
+    def enqueue(self, validated_data):
+        """archive the course in a background job"""
+        course_id = validated_data['course'].id
+        return archive_course.enqueue(key=f'course.archive:{course_id}',
+                                      course_id=course_id)
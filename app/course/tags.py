@@ -0,0 +1,58 @@
+"""
+Tags of the courses
+
+Tag names are unique once normalized. The tags of a course are upserted
+by name in one INSERT ... ON CONFLICT and linked with one bulk insert,
+so concurrent requests naming the same new tag share one row instead of
+racing on get_or_create.
+"""
+
+from django.db import connections, router
+
+from course.models import Course, Tag
+
+
+def normalize_name(name):
+    """tag name without surrounding and repeated whitespace"""
+    return ' '.join(name.split())
+
+
+def upsert_tags(names):
+    """ids of the tags of the names, creating the missing ones"""
+    names = sorted({normalize_name(name) for name in names} - {''})
+    tag = Tag._meta.db_table
+    ids = {}
+    using = router.db_for_write(Tag)
+    with connections[using].cursor() as cursor:
+        # a tag inserted by a transaction committing meanwhile is neither
+        # inserted nor seen by the statement, the next one sees it
+        while len(ids) < len(names):
+            missing = [name for name in names if name not in ids]
+            cursor.execute(f"""
+                WITH names AS (SELECT unnest(%s::varchar[]) AS name),
+                inserted AS (
+                    INSERT INTO {tag} (name, updated_at)
+                    SELECT name, now() FROM names ORDER BY name
+                    ON CONFLICT (name) DO NOTHING
+                    RETURNING id, name
+                )
+                SELECT id, name FROM inserted
+                UNION ALL
+                SELECT {tag}.id, {tag}.name FROM {tag} JOIN names USING (name)
+            """, [missing])
+            ids.update((name, id) for id, name in cursor.fetchall())
+    return [ids[name] for name in names]
+
+
+def set_course_tags(course, names, replace=False):
+    """link the tags of the names to the course, unlinking its other
+    tags when replacing"""
+    ids = upsert_tags(names)
+    through = Course.tags.through
+    if replace:
+        (through.objects.filter(course_id=course.id)
+         .exclude(tag_id__in=ids).delete())
+    through.objects.bulk_create(
+        [through(course_id=course.id, tag_id=id) for id in ids],
+        ignore_conflicts=True,
+    )
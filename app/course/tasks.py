@@ -0,0 +1,51 @@
+"""
+Background tasks of the course API
+"""
+
+from django.db import transaction
+
+from course import ranking
+from course.models import Course, Archive
+from history.models import ArchivedCourse
+from job.registry import JobError, task
+from recommendation import similarity
+from report import rollups
+from schedule.models import CourseTime
+
+
+# archiving twice would empty the course twice, never retry it
+@task('course.archive', max_attempts=1)
+def archive_course(course_id):
+    """clear the course and save its data
+    to an archive instance, return the archive id"""
+
+    with transaction.atomic():
+        course = Course.objects.select_for_update().get(id=course_id)
+        if not course.in_progress:
+            raise JobError('course is not in progress')
+
+        students = list(course.enrollments.filter(paid=True)
+                        .values_list('student_id', flat=True))
+        total_students = len(students)
+        archive = Archive.objects.create(
+            course=course,
+            course_price=course.price,
+            total_students=total_students,
+            total_earnings=total_students*course.price,
+            course_version=(
+                Archive.objects.filter(course=course).count()
+                + ArchivedCourse.objects.filter(course=course).count() + 1
+            ),
+        )
+        archive.students.add(*filter(None, students))
+
+        course.enrollments.all().delete()
+        CourseTime.objects.filter(course=course).delete()
+        course.in_progress = False
+        course.save()
+        rollups.book_archive(archive)
+        rollups.refresh_open([course.id])
+        similarity.mark_dirty([course.id])
+        ranking.update_rankings([course.id])
+
+    return archive.id
@@ -0,0 +1,92 @@
+"""
+The copy of the course students into the enrollments, see
+0018_copy_enrollments
+"""
+
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase
+
+from course.models import Course, Enrollment
+from teacher.models import Teacher
+
+
+copy_enrollments = import_module(
+    'course.migrations.0018_copy_enrollments').copy_enrollments
+
+
+class CopyEnrollmentsTests(TestCase):
+    """every course of a course student becomes an enrollment"""
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.apps = executor.loader.project_state(
+            ('course', '0018_copy_enrollments')).apps
+        CourseStudent = self.apps.get_model('course', 'CourseStudent')
+        self.Link = self.apps.get_model('course', 'Course').students.through
+        with connection.schema_editor() as editor:
+            editor.create_model(CourseStudent)
+            editor.create_model(self.Link)
+
+        User = get_user_model()
+        self.first, self.second = User.objects.bulk_create([
+            User(email='first@copy.test'), User(email='second@copy.test'),
+        ])
+        teacher = Teacher.objects.create(
+            email='teacher@copy.test', first_name='Teacher', last_name='Copy',
+            gender='Male')
+        self.course, self.other = Course.objects.bulk_create([
+            Course(name=name, price=100, instructor=teacher)
+            for name in ('course', 'other')
+        ])
+        self.both, self.twice, self.again = CourseStudent.objects.bulk_create([
+            CourseStudent(student_id=self.first.id, paid=True),
+            CourseStudent(student_id=self.second.id, paid=True),
+            CourseStudent(student_id=self.second.id, paid=False),
+        ])
+        self.Link.objects.bulk_create([
+            self.Link(course_id=self.course.id, coursestudent_id=self.both.id),
+            self.Link(course_id=self.other.id, coursestudent_id=self.both.id),
+            self.Link(course_id=self.course.id,
+                      coursestudent_id=self.twice.id),
+            self.Link(course_id=self.course.id,
+                      coursestudent_id=self.again.id),
+        ])
+
+    def copy(self):
+        with connection.schema_editor() as editor:
+            copy_enrollments(self.apps, editor)
+        return {(enrollment.course_id, enrollment.student_id): enrollment
+                for enrollment in Enrollment.objects.all()}
+
+    def test_every_course_is_copied(self):
+        enrollments = self.copy()
+        self.assertEqual(set(enrollments), {
+            (self.course.id, self.first.id),
+            (self.other.id, self.first.id),
+            (self.course.id, self.second.id),
+        })
+        # the first course keeps the id, the others get new ones
+        self.assertEqual(enrollments[self.course.id, self.first.id].id,
+                         self.both.id)
+        self.assertGreater(enrollments[self.other.id, self.first.id].id,
+                           self.again.id)
+
+    def test_a_student_listed_twice_keeps_the_first_row(self):
+        enrollment = self.copy()[self.course.id, self.second.id]
+        self.assertEqual(enrollment.id, self.twice.id)
+        self.assertTrue(enrollment.paid)
+
+    def test_rerun_copies_nothing_more(self):
+        enrollments = self.copy()
+        self.assertEqual(self.copy(), enrollments)
+
+    def test_skipped_course_students_fail_the_copy(self):
+        # the copy resumes after the highest enrollment id it could own
+        Enrollment.objects.create(id=self.again.id, course=self.other,
+                                  student=self.second)
+        with self.assertRaises(RuntimeError):
+            self.copy()
@@ -0,0 +1,109 @@
+"""
+The ranking of the courses, see course.ranking
+"""
+
+import math
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from course import ranking
+from course.models import Comment, Course, Enrollment
+from teacher.models import Teacher
+
+
+@override_settings(RANKING_PRIOR_WEIGHT=10, RANKING_ENROLLMENT_WEIGHT=0.1)
+class RankingTests(TestCase):
+    """a course with a single 5 star comment and one with ten 4 star
+    comments of enrolled students"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        User = get_user_model()
+        self.students = User.objects.bulk_create([
+            User(email=f'student{index}@ranking.test') for index in range(10)
+        ])
+        teacher = Teacher.objects.create(
+            email='teacher@ranking.test', first_name='Teacher',
+            last_name='Ranking', gender='Male')
+        self.lucky, self.popular, self.new = Course.objects.bulk_create([
+            Course(name=name, price=100, instructor=teacher)
+            for name in ('lucky', 'popular', 'new')
+        ])
+        Comment.objects.bulk_create(
+            [Comment(course=self.lucky, student=self.students[0],
+                     comment='great', rating=5)]
+            + [Comment(course=self.popular, student=student,
+                       comment='good', rating=4)
+               for student in self.students])
+        Enrollment.objects.bulk_create([
+            Enrollment(course=self.popular, student=student)
+            for student in self.students
+        ])
+        self.ids = [self.lucky.id, self.popular.id, self.new.id]
+
+    def reload(self, course):
+        return Course.objects.get(id=course.id)
+
+    def test_bayesian_average(self):
+        self.assertEqual(ranking.update_rankings(self.ids), 3)
+        mean = 45 / 11
+        self.assertAlmostEqual(self.reload(self.lucky).ranking_score,
+                               (10 * mean + 5) / 11)
+        self.assertAlmostEqual(self.reload(self.popular).ranking_score,
+                               (10 * mean + 40) / 20 + 0.1 * math.log(11))
+        # a course without comments is ranked at the mean
+        self.assertAlmostEqual(self.reload(self.new).ranking_score, mean)
+        self.assertGreater(self.reload(self.popular).ranking_score,
+                           self.reload(self.lucky).ranking_score)
+
+    def test_rating(self):
+        Comment.objects.create(course=self.lucky, student=self.students[1],
+                               comment='meh', rating=2)
+        ranking.update_rankings(self.ids)
+        self.assertEqual(str(self.reload(self.lucky).rating), '3.5')
+        # no comment, the rating is kept
+        self.assertEqual(str(self.reload(self.new).rating), '3.0')
+
+    def test_unchanged(self):
+        ranking.update_rankings(self.ids)
+        self.assertEqual(ranking.update_rankings(self.ids + self.ids), 0)
+        self.assertEqual(ranking.update_rankings([]), 0)
+
+    def test_cached_mean(self):
+        self.assertAlmostEqual(ranking.global_mean(), 45 / 11)
+        Comment.objects.all().delete()
+        self.assertAlmostEqual(ranking.global_mean(), 45 / 11)
+        self.assertEqual(ranking.global_mean(refresh=True),
+                         ranking.DEFAULT_MEAN)
+
+    def test_recompute_command(self):
+        ranking.global_mean()
+        Comment.objects.filter(course=self.popular).update(rating=1)
+        call_command('recompute_rankings', chunk_size=2, stdout=StringIO())
+        mean = 15 / 11
+        self.assertAlmostEqual(self.reload(self.new).ranking_score, mean)
+        self.assertEqual(str(self.reload(self.popular).rating), '1.0')
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_comment_reranks(self):
+        ranking.update_rankings(self.ids)
+        client = APIClient()
+        for student in self.students[1:4]:
+            client.force_authenticate(student)
+            response = client.post(
+                f'/api/mobile-app/courses/{self.new.id}/post_comment/',
+                {'comment': 'best', 'rating': 5}, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        # three 5 star comments outrank ten 4 star ones
+        response = client.get('/api/mobile-app/courses/')
+        self.assertEqual([course['id'] for course in response.json()],
+                         [self.new.id, self.popular.id, self.lucky.id])
+        self.assertEqual(str(self.reload(self.new).rating), '5.0')
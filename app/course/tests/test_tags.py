@@ -0,0 +1,202 @@
+"""
+The tags of the courses, see course.tags and 0020_tag_name_unique
+"""
+
+import threading
+import time
+from importlib import import_module
+
+import psycopg2
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from core.management.commands.check_query_budgets import Dataset
+from course import tags as course_tags
+from course.models import Course, Tag
+from teacher.models import Teacher
+
+
+merge_duplicate_tags = import_module(
+    'course.migrations.0020_tag_name_unique').merge_duplicate_tags
+
+
+def tag_names(course):
+    return sorted(course.tags.values_list('name', flat=True))
+
+
+class TagsTestCase(TestCase):
+    """a course tagged python"""
+
+    def setUp(self):
+        teacher = Teacher.objects.create(
+            email='teacher@tags.test', first_name='Teacher', last_name='Tags',
+            gender='Male')
+        self.course = Course.objects.create(name='course', price=100,
+                                            instructor=teacher)
+        self.python = Tag.objects.create(name='python')
+        self.course.tags.add(self.python)
+
+
+class UpsertTests(TagsTestCase):
+    """upserting the tags by name"""
+
+    def test_normalized_names(self):
+        ids = course_tags.upsert_tags([' python', 'web  dev ', 'web dev',
+                                       '  '])
+        web = Tag.objects.get(name='web dev')
+        # by name, an existing tag is reused
+        self.assertEqual(ids, [self.python.id, web.id])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_one_statement(self):
+        with self.assertNumQueries(1):
+            course_tags.upsert_tags(['python', 'django', 'rest'])
+
+    def test_add(self):
+        course_tags.set_course_tags(self.course, ['django', 'python'])
+        course_tags.set_course_tags(self.course, ['django'])
+        self.assertEqual(tag_names(self.course), ['django', 'python'])
+
+    def test_replace(self):
+        course_tags.set_course_tags(self.course, ['django', 'rest'])
+        link = Course.tags.through.objects.get(course=self.course,
+                                               tag__name='django')
+        course_tags.set_course_tags(self.course, ['django', 'web'],
+                                    replace=True)
+        self.assertEqual(tag_names(self.course), ['django', 'web'])
+        # the kept links are not recreated
+        self.assertTrue(Course.tags.through.objects.filter(id=link.id)
+                        .exists())
+        # the unlinked tags stay
+        self.assertTrue(Tag.objects.filter(name='rest').exists())
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class TagApiTests(TestCase):
+    """tags named through the dashboard"""
+
+    def setUp(self):
+        self.dataset = Dataset(2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.dataset.staff)
+
+    def test_course_tags(self):
+        course = self.dataset.ids['course']
+        response = self.client.patch(
+            f'/api/dashboard/courses/{course}/',
+            {'tags': [{'name': ' tag0 '}, {'name': 'new  tag'}]},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        names = sorted(tag['name'] for tag in response.json()['tags'])
+        self.assertEqual(names, ['new tag', 'tag0'])
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_rename_to_an_existing_name(self):
+        Tag.objects.create(name='other')
+        response = self.client.patch(
+            f'/api/dashboard/tags/{self.dataset.ids["tag"]}/',
+            {'name': ' other '}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.json())
+
+
+class ConcurrentUpsertTests(TransactionTestCase):
+    """a tag inserted by a transaction committing meanwhile"""
+
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        self.max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        self.other = psycopg2.connect(**connection.get_connection_params())
+        self.addCleanup(self.other.close)
+
+    def tearDown(self):
+        connection.settings_dict['CONN_MAX_AGE'] = self.max_age
+
+    def waiting(self):
+        with self.other.cursor() as cursor:
+            cursor.execute("""
+                SELECT count(*) FROM pg_locks
+                WHERE NOT granted AND pid <> pg_backend_pid()
+            """)
+            return cursor.fetchone()[0]
+
+    def test_shares_the_row(self):
+        with self.other.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {Tag._meta.db_table} (name, updated_at)
+                VALUES ('python', now()) RETURNING id
+            """)
+            inserted, = cursor.fetchone()
+
+        result = []
+
+        def upsert():
+            try:
+                result.append(course_tags.upsert_tags(['python']))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=upsert)
+        thread.start()
+        # the upsert waits on the unique index for the other transaction
+        deadline = time.monotonic() + 5
+        while not self.waiting() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.other.commit()
+        thread.join(5)
+
+        self.assertEqual(result, [[inserted]])
+        self.assertEqual(Tag.objects.filter(name='python').count(), 1)
+
+
+class MergeDuplicatesTests(TestCase):
+    """the merge of the duplicate tags before the unique index"""
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.apps = executor.loader.project_state(
+            ('course', '0019_remove_coursestudent')).apps
+        # the duplicates the unique index forbids now
+        with connection.schema_editor() as editor:
+            editor.alter_field(
+                Tag, Tag._meta.get_field('name'),
+                self.apps.get_model('course', 'Tag')._meta.get_field('name'))
+
+        teacher = Teacher.objects.create(
+            email='teacher@tags.test', first_name='Teacher', last_name='Tags',
+            gender='Male')
+        self.first, self.second = Course.objects.bulk_create([
+            Course(name=name, price=100, instructor=teacher)
+            for name in ('first', 'second')
+        ])
+        self.oldest, self.spaced, self.twice, self.other = (
+            Tag.objects.bulk_create([
+                Tag(name='web  dev'), Tag(name='web dev '),
+                Tag(name='web dev'), Tag(name='python'),
+            ]))
+        self.first.tags.add(self.oldest, self.twice)
+        self.second.tags.add(self.spaced, self.other)
+
+    def merge(self):
+        with connection.schema_editor() as editor:
+            merge_duplicate_tags(self.apps, editor)
+
+    def test_merged_into_the_oldest(self):
+        self.merge()
+        self.assertEqual(
+            sorted(Tag.objects.values_list('id', 'name')),
+            [(self.oldest.id, 'web dev'), (self.other.id, 'python')])
+        self.assertEqual(tag_names(self.first), ['web dev'])
+        self.assertEqual(tag_names(self.second), ['python', 'web dev'])
+
+    def test_nothing_to_merge(self):
+        self.merge()
+        tags = list(Tag.objects.values_list('id', 'name'))
+        self.merge()
+        self.assertEqual(list(Tag.objects.values_list('id', 'name')), tags)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        """invalidate the cached KPIs on writes"""
+        from dashboard import kpis
+
+        kpis.connect_signals()
@@ -0,0 +1,95 @@
+"""
+Headline numbers of the dashboard
+
+Every table is counted with one conditional aggregation and the counts
+are cached together for KPI_CACHE_SECONDS in the cache shared by the
+workers, a single entry costs a single write of the database cache.
+Saving or deleting a row of a counted table drops the cached counts
+once the transaction commits, the TTL bounds how stale the queryset
+updates, which send no signal, can leave them.
+
+The counts are those of the current branch, every branch has its own
+cached counts.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+
+from branch import context as branch_context
+from course.models import Course, Enrollment
+from notification.models import Notification
+from teacher.models import Teacher
+
+
+CACHE_KEY = 'kpis:{}'
+
+
+def in_branch(lookup):
+    """filter of the rows of a branch by the lookup of their branch"""
+    return lambda branch_id: Q(**{f'{lookup}_id': branch_id})
+
+
+# (name, model, filter of a branch, aggregates) of the counted tables
+COUNTERS = [
+    ('users', get_user_model(), branch_context.users_of, {
+        'students': Count('id', filter=Q(is_staff=False, is_superuser=False)),
+        'staff': Count('id', filter=Q(is_staff=True) | Q(is_superuser=True)),
+    }),
+    ('teachers', Teacher, in_branch('branch'), {
+        'teachers': Count('id'),
+    }),
+    ('courses', Course, in_branch('branch'), {
+        'courses': Count('id'),
+        'registration_open_courses': Count('id',
+                                           filter=Q(registration_open=True)),
+        'in_progress_courses': Count('id', filter=Q(in_progress=True)),
+    }),
+    ('enrollments', Enrollment, in_branch('course__branch'), {
+        'active_enrollments': Count('id'),
+        'paid_enrollments': Count('id', filter=Q(paid=True)),
+    }),
+    ('notifications', Notification, in_branch('course__branch'), {
+        'unread_notifications': Count('id', filter=Q(is_read=False)),
+    }),
+]
+
+
+def get_kpis():
+    """return the KPIs, counting the tables on a cache miss"""
+    branch_id = branch_context.current_branch_id()
+    key = CACHE_KEY.format(branch_id or 'all')
+    cache = caches['shared']
+    kpis = cache.get(key)
+    if kpis is None:
+        kpis = {}
+        for _, model, branch_filter, aggregates in COUNTERS:
+            queryset = model._base_manager.all()
+            if branch_id is not None:
+                queryset = queryset.filter(branch_filter(branch_id))
+            kpis.update(queryset.aggregate(**aggregates))
+        cache.set(key, kpis, settings.KPI_CACHE_SECONDS)
+
+    enrollments = kpis['active_enrollments']
+    kpis['paid_ratio'] = (round(kpis['paid_enrollments'] / enrollments, 4)
+                          if enrollments else 0.0)
+    return kpis
+
+
+def connect_signals():
+    """drop the cached counts of every branch when a row of a counted
+    table changes"""
+
+    def invalidate(sender, **kwargs):
+        keys = [CACHE_KEY.format(branch_id)
+                for branch_id in [*branch_context.get_branches().by_id, 'all']]
+        transaction.on_commit(lambda: caches['shared'].delete_many(keys))
+
+    for name, model, _, _ in COUNTERS:
+        post_save.connect(invalidate, sender=model, weak=False,
+                          dispatch_uid=f'kpis_{name}_saved')
+        post_delete.connect(invalidate, sender=model, weak=False,
+                            dispatch_uid=f'kpis_{name}_deleted')
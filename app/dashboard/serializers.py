@@ -0,0 +1,19 @@
+"""
+Serializers for the dashboard
+"""
+
+from rest_framework import serializers
+
+
+class KpiSerializer(serializers.Serializer):
+    """headline numbers of the dashboard"""
+    students = serializers.IntegerField()
+    staff = serializers.IntegerField()
+    teachers = serializers.IntegerField()
+    courses = serializers.IntegerField()
+    registration_open_courses = serializers.IntegerField()
+    in_progress_courses = serializers.IntegerField()
+    active_enrollments = serializers.IntegerField()
+    paid_enrollments = serializers.IntegerField()
+    paid_ratio = serializers.FloatField()
+    unread_notifications = serializers.IntegerField()
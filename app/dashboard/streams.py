@@ -0,0 +1,176 @@
+"""
+Streaming endpoints of the dashboard
+
+Django 3.2 cannot stream a response from an async view, so the
+endpoints are plain ASGI applications placed in front of the Django
+application (see app/asgi.py). An open stream is a coroutine waiting
+on a queue of the notification broadcaster, thousands of idle clients
+cost no thread. The authentication and permissions are the ones of the
+viewset action routed to the same URL.
+"""
+
+import asyncio
+import io
+
+from corsheaders.middleware import CorsMiddleware
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.http.request import split_domain_port
+from django.urls import resolve, reverse
+
+from branch import context as branch_context
+from core.utils import run_sync
+from notification.broadcaster import get_broadcaster
+from notification.events import RETRY_MS, fetch_events, parse_event_id
+
+
+# comment line sent on idle streams so proxies keep them open
+KEEPALIVE_SECONDS = 15
+BACKLOG_BATCH = 500
+
+
+def _authorize(request):
+    """run the authentication and permission checks of the view
+    routed to the request, return the error response or None"""
+    callback = resolve(request.path_info).func
+    view = callback.cls(action_map=callback.actions, **callback.initkwargs)
+    view.args, view.kwargs = (), {}
+    request = view.initialize_request(request)
+    view.request = request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(request)
+    except Exception as exc:
+        response = view.finalize_response(request, view.handle_exception(exc))
+        return response.render()
+    return None
+
+
+def _add_cors_headers(request, response):
+    """add the headers the CORS middleware adds to django responses"""
+    if 'corsheaders.middleware.CorsMiddleware' in settings.MIDDLEWARE:
+        response = CorsMiddleware(lambda request: response)(request)
+    return response
+
+
+async def _start_response(send, request, response):
+    """send the status and headers of a django response"""
+    response = _add_cors_headers(request, response)
+    headers = [(name.encode('latin1'), value.encode('latin1'))
+               for name, value in response.items()]
+    await send({'type': 'http.response.start', 'status': response.status_code,
+                'headers': headers})
+
+
+async def _send_response(send, request, response):
+    """send a rendered django response"""
+    await _start_response(send, request, response)
+    await send({'type': 'http.response.body', 'body': response.content})
+
+
+async def _wait_disconnect(receive):
+    """return when the client goes away"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def notification_stream(scope, receive, send):
+    """stream the new notifications as server-sent events,
+    resuming after the Last-Event-ID of the client"""
+    request = ASGIRequest(scope, io.BytesIO())
+    if request.method != 'GET':
+        await _send_response(send, request, HttpResponseNotAllowed(['GET']))
+        return
+    # served in front of the middlewares, see core.middleware.BranchMiddleware
+    host, _ = split_domain_port(request.get_host())
+    branch_token = branch_context.activate(
+        request, await run_sync(branch_context.branch_of_host, host)
+    )
+    try:
+        await _stream_notifications(request, receive, send)
+    finally:
+        branch_context.deactivate(branch_token)
+
+
+async def _stream_notifications(request, receive, send):
+    """authorize the request and stream the notifications
+    of its branch"""
+    error = await run_sync(_authorize, request)
+    if error is not None:
+        await _send_response(send, request, error)
+        return
+
+    after = parse_event_id(request.headers.get('Last-Event-ID')
+                           or request.GET.get('last_event_id'))
+    # the notifications are in the database of the host branch
+    database = branch_context.host_branch().database
+    broadcaster = get_broadcaster(database)
+    # subscribe before reading the backlog so nothing falls in between
+    queue = broadcaster.subscribe(branch_context.current_branch_id())
+    disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        response = HttpResponse(
+            content_type='text/event-stream; charset=utf-8')
+        response['Cache-Control'] = 'no-cache'
+        # do not let nginx buffer the events
+        response['X-Accel-Buffering'] = 'no'
+        await _start_response(send, request, response)
+        await _send_event(send, f'retry: {RETRY_MS}\n\n')
+
+        # id: event of the backlog, also queued when saved meanwhile
+        sent = {}
+        while after is not None:
+            events = await run_sync(fetch_events, after=after,
+                                    limit=BACKLOG_BATCH, using=database)
+            for event_id, _, event in events:
+                await _send_event(send, event)
+                sent[event_id] = event
+                after = event_id
+            if len(events) < BACKLOG_BATCH:
+                break
+
+        while not disconnect.done():
+            get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({get, disconnect},
+                                         timeout=KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if get not in done:
+                get.cancel()
+                if not disconnect.done():
+                    await _send_event(send, ': keepalive\n\n')
+                continue
+
+            item = get.result()
+            if item is None:
+                # too slow, the client reconnects with its Last-Event-ID
+                break
+            event_id, _, event = item
+            # a coalesced notification comes again with its new count
+            if sent.pop(event_id, None) != event:
+                await _send_event(send, event)
+    finally:
+        broadcaster.unsubscribe(queue)
+        disconnect.cancel()
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _send_event(send, text):
+    """send a chunk of the stream"""
+    await send({'type': 'http.response.body', 'body': text.encode(),
+                'more_body': True})
+
+
+def with_streams(application):
+    """serve the streaming endpoints in front of the django application"""
+    routes = {reverse('notification-stream'): notification_stream}
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'http':
+            path = scope['path'][len(scope.get('root_path', '')):]
+            if path in routes:
+                return await routes[path](scope, receive, send)
+        return await application(scope, receive, send)
+
+    return app
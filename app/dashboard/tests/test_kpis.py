@@ -0,0 +1,115 @@
+"""
+The headline numbers of the dashboard, see dashboard.kpis
+"""
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from branch import context as branch_context
+from branch.models import Branch
+from core.management.commands.check_query_budgets import Dataset
+from course.models import Course, Enrollment
+from dashboard import kpis
+from teacher.models import Teacher
+
+
+# 3 students and a staff user, 4 courses of 2 teachers with 2 paid
+# students and a notification each
+EXPECTED = {
+    'students': 3,
+    'staff': 1,
+    'teachers': 2,
+    'courses': 4,
+    'registration_open_courses': 4,
+    'in_progress_courses': 4,
+    'active_enrollments': 8,
+    'paid_enrollments': 8,
+    'paid_ratio': 1.0,
+    'unread_notifications': 4,
+}
+
+
+class KpiTests(TestCase):
+    """counting and caching the KPIs"""
+
+    def setUp(self):
+        self.dataset = Dataset(2)
+
+    def test_counts(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(kpis.get_kpis(), EXPECTED)
+        counts = [query['sql'] for query in queries
+                  if query['sql'].startswith('SELECT COUNT(')
+                  and 'shared_cache' not in query['sql']]
+        # one aggregation per table
+        self.assertEqual(len(counts), len(kpis.COUNTERS))
+        with self.assertNumQueries(1):
+            self.assertEqual(kpis.get_kpis(), EXPECTED)
+
+    def test_paid_ratio(self):
+        Enrollment.objects.filter(student=self.dataset.student).update(
+            paid=False)
+        self.assertEqual(kpis.get_kpis()['paid_ratio'], 0.5)
+
+    def test_no_enrollments(self):
+        Enrollment.objects.all().delete()
+        self.assertEqual(kpis.get_kpis()['paid_ratio'], 0.0)
+
+    def test_invalidated_on_commit(self):
+        kpis.get_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            Teacher.objects.create(email='new@budget.test',
+                                   first_name='New', last_name='Teacher',
+                                   gender='Male')
+            # still cached until the transaction commits
+            self.assertEqual(kpis.get_kpis()['teachers'], 2)
+        self.assertEqual(kpis.get_kpis()['teachers'], 3)
+
+    def test_updates_wait_for_the_ttl(self):
+        kpis.get_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.update(registration_open=False)
+        self.assertEqual(kpis.get_kpis()['registration_open_courses'], 4)
+
+    def test_per_branch(self):
+        other = Branch.objects.create(name='Other', slug='other',
+                                      host='other.test')
+        branch_context.reload()
+        self.addCleanup(branch_context.reload)
+        Teacher.objects.create(email='other@budget.test', first_name='Other',
+                               last_name='Teacher', gender='Male',
+                               branch=other)
+
+        with branch_context.use_branch(other):
+            counts = kpis.get_kpis()
+        # the users without a branch belong to every branch
+        self.assertEqual((counts['students'], counts['staff']), (3, 1))
+        self.assertEqual((counts['teachers'], counts['courses']), (1, 0))
+        with branch_context.use_branch(branch_context.default_branch()):
+            self.assertEqual(kpis.get_kpis()['teachers'], 2)
+        self.assertEqual(kpis.get_kpis()['teachers'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(name='other', price=100, branch=other,
+                                  instructor=Teacher.objects.get(
+                                      email='other@budget.test'))
+        with branch_context.use_branch(other):
+            self.assertEqual(kpis.get_kpis()['courses'], 1)
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class KpiViewTests(TestCase):
+    """the KPI endpoint of the dashboard"""
+
+    def setUp(self):
+        self.dataset = Dataset(2)
+        self.client = APIClient()
+
+    def test_view(self):
+        self.client.force_authenticate(self.dataset.staff)
+        response = self.client.get('/api/dashboard/kpis/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), EXPECTED)
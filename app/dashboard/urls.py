@@ -17,10 +17,13 @@ router.register('classroom', views.ClassRoomViewSet)
 router.register('schedule-data', views.CourseTimeViewset)
 router.register('schedule', views.ScheduleViewset)
 router.register('notification', views.NotificationsViewSet)
+router.register('jobs', views.JobViewSet)
+router.register('reports', views.ReportViewSet, basename='report')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('token/', views.CreateTokenView.as_view(), name='token'),
     path('me/', views.ManageUserView.as_view(), name='me'),
+    path('kpis/', views.KpiView.as_view(), name='kpis'),
     path('schedules/create/', views.CreateScheduleView.as_view(), name='schedule'),
 ]
\ No newline at end of file
@@ -4,6 +4,8 @@ Views for the dahboard
 """
 
 
+from operator import attrgetter
+
 from rest_framework.response import Response
 from rest_framework import(
     viewsets,
@@ -20,6 +22,7 @@ from teacher import(
 )
 from course import(
     models as course_models,
+    ranking,
     serializers as course_serializers
 )
 
@@ -29,7 +32,8 @@ from schedule import (
 )
 from notification import (
     serializers as notification_serializers,
-    models as notification_models
+    models as notification_models,
+    events as notification_events,
 )
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
@@ -41,9 +45,35 @@ from drf_spectacular.utils import (
 )
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
-from django.db.models import Q
+from django.db.models import DateField, F, Max, Q, Sum, Value
+from django.db.models.functions import TruncYear
 from rest_framework.decorators import action
 from rest_framework import status
+from core.mixins import (AutoPrefetchMixin, BackgroundJobMixin,
+                         CompiledListMixin)
+from job import (
+    serializers as job_serializers,
+    models as job_models,
+)
+from branch import context as branch_context
+from dashboard import kpis, serializers as dashboard_serializers
+from history import serializers as history_serializers
+from history.models import ArchivedCourse
+from recommendation import similarity
+from report import (
+    rollups,
+    serializers as report_serializers,
+    models as report_models,
+)
+
+
+def in_branch(users):
+    """the users of the current branch, the users are not scoped by
+    their manager, the authentication looks them up in every branch"""
+    branch_id = branch_context.current_branch_id()
+    if branch_id is None:
+        return users
+    return users.filter(branch_context.users_of(branch_id))
 
 
 @extend_schema_view(
@@ -58,10 +88,8 @@ from rest_framework import status
         ]
     ),
 )
-
-
-
-class StudentViewSet(viewsets.ModelViewSet):
+class StudentViewSet(CompiledListMixin, AutoPrefetchMixin,
+                     viewsets.ModelViewSet):
     """manage the student API"""
     serializer_class = serializers.DetailAppUserSerializer
     queryset = get_user_model().objects.filter(is_staff=False, is_superuser=False)
@@ -74,6 +102,10 @@ class StudentViewSet(viewsets.ModelViewSet):
             return serializers.AppUserSerializer
         return self.serializer_class
 
+    def get_queryset(self):
+        """the students of the branch"""
+        return in_branch(super().get_queryset())
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -94,8 +126,8 @@ class StudentViewSet(viewsets.ModelViewSet):
         ]
     ),
 )
-
-class StaffViewSet(viewsets.ModelViewSet):
+class StaffViewSet(CompiledListMixin, AutoPrefetchMixin,
+                   viewsets.ModelViewSet):
     """manage the staff API"""
     serializer_class = serializers.DetailDashboardUser
     queryset = get_user_model().objects.filter(Q(is_staff=True) | Q(is_superuser=True))
@@ -112,7 +144,7 @@ class StaffViewSet(viewsets.ModelViewSet):
         """filter the staff"""
         access = self.request.query_params.get('access')
         gender = self.request.query_params.get('gender')
-        queryset = self.queryset
+        queryset = in_branch(self.queryset)
 
         if access:
             if access=='is_superuser':
@@ -134,6 +166,16 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = serializers.DashboardTokenSerializer
     renderer_class = api_settings.DEFAULT_RENDERER_CLASSES
 
+
+class KpiView(generics.GenericAPIView):
+    """headline numbers of the dashboard in one request"""
+    serializer_class = dashboard_serializers.KpiSerializer
+
+    def get(self, request, *args, **kwargs):
+        """return the cached KPIs"""
+        return Response(self.get_serializer(kpis.get_kpis()).data)
+
+
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated User"""
     serializer_class = serializers.DetailDashboardUser
@@ -158,9 +200,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         ]
     ),
 )
-
-
-class TeacherViewSet(viewsets.ModelViewSet):
+class TeacherViewSet(AutoPrefetchMixin, viewsets.ModelViewSet):
     """manage the teacher API"""
     serializer_class = teacher_serializers.DetailDashboardTeacher
     queryset = teacher_models.Teacher.objects.all()
@@ -201,10 +241,24 @@ class TeacherViewSet(viewsets.ModelViewSet):
                 enum=[1,0]
             ),
         ]
-    )
+    ),
+    end_course=extend_schema(
+        responses={
+            200: course_serializers.ArchiveSerializer,
+            202: job_serializers.JobSerializer,
+        },
+        parameters=[
+            OpenApiParameter(
+                'background',
+                OpenApiTypes.BOOL,
+                description='archive in a background job, follow it at '
+                            'the Location',
+            ),
+        ]
+    ),
 )
-
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(CompiledListMixin, AutoPrefetchMixin, BackgroundJobMixin,
+                    viewsets.ModelViewSet):
     """manage  the course API"""
     serializer_class = course_serializers.DetailCourseSerializerv2
     queryset = course_models.Course.objects.all()
@@ -237,7 +291,11 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         instance = serializer.save()
-        serializer = course_serializers.DetailCourseSerializerv2(instance)
+        similarity.mark_dirty([instance.id])
+        # ranked at the mean rating until it gets comments
+        ranking.update_rankings([instance.id])
+        serializer = course_serializers.DetailCourseSerializerv2(
+            self.refetch_course(instance))
         return Response(serializer.data)
 
     def update(self, request, *args, **kwargs):
@@ -249,10 +307,30 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         updated_instance = serializer.save()
+        rollups.refresh_open([updated_instance.id])
+        similarity.mark_dirty([updated_instance.id])
 
-        serializer = course_serializers.DetailCourseSerializerv2(updated_instance)
+        serializer = course_serializers.DetailCourseSerializerv2(
+            self.refetch_course(updated_instance)
+        )
         return Response(serializer.data)
 
+    def perform_destroy(self, instance):
+        """take the deleted course out of the open rollups and the
+        recommendations"""
+        course_id = instance.id
+        super().perform_destroy(instance)
+        rollups.refresh_open([course_id])
+        similarity.mark_dirty([course_id])
+
+    def refetch_course(self, course):
+        """reload a course with everything the detailed
+        response serializer reads"""
+        queryset = course_models.Course.objects.filter(id=course.id)
+        return self.optimize_queryset(
+            queryset, course_serializers.DetailCourseSerializerv2()
+        ).get()
+
     def get_queryset(self):
         """filter the courses"""
         max_price = self.request.query_params.get('price')
@@ -274,7 +352,8 @@ class CourseViewSet(viewsets.ModelViewSet):
     def get_students(self, request, pk=None):
         """get the students registered in the course"""
         course = self.get_object()
-        students = course.students.all()
+        students = self.optimize_queryset(
+            course_models.Enrollment.objects.filter(course=course))
         serializer = self.get_serializer(students, many=True)
         return Response(serializer.data)
 
@@ -285,7 +364,8 @@ class CourseViewSet(viewsets.ModelViewSet):
         partial = kwargs.get('partial', False)
         serializer = self.get_serializer(course, data=request.data, partial=partial, many=True)
         serializer.is_valid(raise_exception=True)
-        instances = serializer.save()
+        instances = self.optimize_queryset(serializer.save())
+        rollups.refresh_open([course.id])
         serializer = self.get_serializer(instances, many=True)
         return Response(serializer.data)
 
@@ -295,7 +375,10 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         course = serializer.save()
-        serializer = course_serializers.DetailCourseSerializerv2(course)
+        similarity.mark_dirty([course.id])
+        ranking.update_rankings([course.id])
+        serializer = course_serializers.DetailCourseSerializerv2(
+            self.refetch_course(course))
         return Response(serializer.data)
 
     @action(methods=['POST'], detail=False)
@@ -304,7 +387,11 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         course = serializer.save()
-        serializer = course_serializers.DetailCourseSerializerv2(course)
+        rollups.refresh_open([course.id])
+        similarity.mark_dirty([course.id])
+        ranking.update_rankings([course.id])
+        serializer = course_serializers.DetailCourseSerializerv2(
+            self.refetch_course(course))
         return Response(serializer.data)
 
     @action(methods=['POST'], detail=True)
@@ -314,20 +401,29 @@ class CourseViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        if self.run_in_background():
+            return self.enqueue(serializer)
         archive = serializer.save()
         return Response(serializer.data)
 
     @action(methods=['GET'], detail=True)
     def get_archive(self, request, pk=None):
-        """Get the archive of the course"""
-        queryset = course_models.Archive.objects.filter(course_id=pk)
-        serializer = self.get_serializer(queryset, many=True)
+        """Get the archive of the course, with the versions moved to the
+        history"""
+        archives = self.optimize_queryset(
+            course_models.Archive.objects.filter(course_id=pk))
+        history = self.optimize_queryset(
+            ArchivedCourse.objects.filter(course_id=pk),
+            history_serializers.ArchivedCourseSerializer(),
+        )
+        archives = sorted([*history, *archives],
+                          key=attrgetter('course_version'))
+        serializer = self.get_serializer(archives, many=True)
         return Response(serializer.data)
 
 
-
-
-class TagViewSet(mixins.ListModelMixin,
+class TagViewSet(CompiledListMixin, AutoPrefetchMixin,
+                 mixins.ListModelMixin,
                  mixins.DestroyModelMixin,
                  mixins.UpdateModelMixin,
                  viewsets.GenericViewSet):
@@ -336,8 +432,7 @@ class TagViewSet(mixins.ListModelMixin,
     queryset = course_models.Tag.objects.all()
 
 
-
-class ClassRoomViewSet(viewsets.ModelViewSet):
+class ClassRoomViewSet(AutoPrefetchMixin, viewsets.ModelViewSet):
     """manage the classroom model"""
     serializer_class = schedule_serializers.ClassRoomSerializer
     queryset = schedule_models.ClassRoom.objects.all()
@@ -348,7 +443,8 @@ class CreateScheduleView(generics.CreateAPIView):
     serializer_class = schedule_serializers.ScheduleSerializer
 
 
-class ScheduleViewset(mixins.ListModelMixin, viewsets.GenericViewSet):
+class ScheduleViewset(AutoPrefetchMixin, mixins.ListModelMixin,
+                      viewsets.GenericViewSet):
     """get the serializer class"""
     serializer_class = schedule_serializers.ScheduleSerializer
     queryset = schedule_models.Schedule.objects.all()
@@ -382,9 +478,7 @@ class ScheduleViewset(mixins.ListModelMixin, viewsets.GenericViewSet):
             return Response(status=status.HTTP_404_NOT_FOUND)
 
 
-
-
-class CourseTimeViewset(viewsets.ModelViewSet):
+class CourseTimeViewset(AutoPrefetchMixin, viewsets.ModelViewSet):
     """manage the course times inside the schedule"""
     serializer_class = schedule_serializers.CourseTimeDaySerializer
     queryset = schedule_models.CourseTime.objects.all()
@@ -422,7 +516,40 @@ class CourseTimeViewset(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class NotificationsViewSet(mixins.ListModelMixin,
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'after',
+                OpenApiTypes.INT,
+                description='only the notifications newer than this id',
+            ),
+            OpenApiParameter(
+                'is_read',
+                OpenApiTypes.BOOL,
+                description='filter on the read state',
+            ),
+            OpenApiParameter(
+                'resolved',
+                OpenApiTypes.BOOL,
+                description='filter on the answered notifications',
+            ),
+        ]
+    ),
+    stream=extend_schema(
+        responses={200: OpenApiTypes.STR},
+        parameters=[
+            OpenApiParameter(
+                'Last-Event-ID',
+                OpenApiTypes.INT,
+                location=OpenApiParameter.HEADER,
+                description='resume after this notification id',
+            )
+        ]
+    ),
+)
+class NotificationsViewSet(AutoPrefetchMixin,
+                           mixins.ListModelMixin,
                            viewsets.GenericViewSet):
     """View for listing notifications"""
     serializer_class = notification_serializers.NotificationSerializer
@@ -433,13 +560,45 @@ class NotificationsViewSet(mixins.ListModelMixin,
         ont top"""
 
         queryset = self.queryset
+        params = self.request.query_params
+        after = notification_events.parse_event_id(params.get('after'))
+        if after is not None:
+            queryset = queryset.filter(id__gt=after)
+        if params.get('is_read') in ('true', 'false'):
+            queryset = queryset.filter(is_read=params['is_read'] == 'true')
+        if params.get('resolved') in ('true', 'false'):
+            queryset = queryset.filter(
+                resolved_at__isnull=params['resolved'] == 'false')
         queryset = queryset.order_by('-id')
         return queryset
 
+    @action(methods=['GET'], detail=False,
+            renderer_classes=[notification_events.EventStreamRenderer])
+    def stream(self, request, *args, **kwargs):
+        """server-sent events of the new notifications
+
+        the ASGI server keeps the stream open (see dashboard.streams),
+        this view only sends the notifications after Last-Event-ID and
+        lets the EventSource reconnect"""
+        after = notification_events.parse_event_id(
+            request.headers.get('Last-Event-ID')
+            or request.query_params.get('last_event_id')
+        )
+        events = []
+        if after is not None:
+            events = notification_events.fetch_events(after=after)
+        body = f'retry: {notification_events.RETRY_MS}\n\n'
+        body += ''.join(event for _, _, event in events)
+        return Response(body, headers={'Cache-Control': 'no-cache'})
+
     def get_serializer_class(self):
         """return serializer for the request"""
         if self.action == 'descision':
             return notification_serializers.DescisionSerializer
+        if self.action == 'batch_descision':
+            return notification_serializers.BatchDescisionSerializer
+        if self.action == 'mark_read':
+            return notification_serializers.MarkReadSerializer
         return self.serializer_class
 
     @action(methods=['POST'], detail=False)
@@ -452,3 +611,162 @@ class NotificationsViewSet(mixins.ListModelMixin,
         message = serializer.save()
 
         return Response({'message': message})
+
+    @action(methods=['POST'], detail=False)
+    def batch_descision(self, request, *args, **kwargs):
+        """process the descisions of many notifications
+        in one transaction"""
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+
+        return Response({'results': results})
+
+    @action(methods=['POST'], detail=False)
+    def mark_read(self, request, *args, **kwargs):
+        """mark notifications as read"""
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = serializer.save()
+
+        return Response({'updated': updated})
+
+    @action(methods=['GET'], detail=False)
+    def unread_count(self, request, *args, **kwargs):
+        """count the unread notifications"""
+
+        unread = notification_models.Notification.objects.filter(
+            is_read=False).count()
+        return Response({'unread': unread})
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'status',
+                OpenApiTypes.STR,
+                description='status',
+                enum=[choice for choice, _ in job_models.Job.status_choices],
+            ),
+            OpenApiParameter(
+                'name',
+                OpenApiTypes.STR,
+                description='task name',
+            ),
+        ]
+    )
+)
+class JobViewSet(AutoPrefetchMixin,
+                 mixins.ListModelMixin,
+                 mixins.RetrieveModelMixin,
+                 viewsets.GenericViewSet):
+    """View for following the background jobs"""
+    serializer_class = job_serializers.JobSerializer
+    queryset = job_models.Job.objects.all()
+
+    def get_queryset(self):
+        """filter the jobs, newest first"""
+        queryset = self.queryset
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('name'):
+            queryset = queryset.filter(name=params['name'])
+        return queryset.order_by('-id')
+
+    @action(methods=['POST'], detail=True)
+    def retry(self, request, pk=None):
+        """queue a failed job again"""
+        job = self.get_object()
+        if job.status != job_models.Job.FAILED:
+            return Response({'detail': 'only a failed job can be retried'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        job = job_models.Job.objects.enqueue(job.name, job.payload,
+                                             key=job.key)
+        return Response(self.get_serializer(job).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+
+REPORT_BY = OpenApiParameter(
+    'by',
+    OpenApiTypes.STR,
+    description='dimension of the report',
+    enum=[choice for choice, _ in report_models.Rollup.dimension_choices],
+)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        responses=report_serializers.RollupSerializer(many=True),
+        parameters=[
+            REPORT_BY,
+            OpenApiParameter(
+                'period',
+                OpenApiTypes.STR,
+                description='group the archives by month, year or all time',
+                enum=['month', 'year', 'all'],
+            ),
+            OpenApiParameter('start', OpenApiTypes.DATE,
+                             description='first month of the report'),
+            OpenApiParameter('end', OpenApiTypes.DATE,
+                             description='last month of the report'),
+        ]
+    ),
+    open=extend_schema(
+        responses=report_serializers.RollupSerializer(many=True),
+        parameters=[REPORT_BY],
+    ),
+)
+class ReportViewSet(viewsets.GenericViewSet):
+    """earnings and paid students by teacher, course, level
+    or tag, read from the rollups only"""
+    serializer_class = report_serializers.RollupSerializer
+    queryset = report_models.Rollup.objects.all()
+
+    def get_params(self):
+        """validate the query parameters"""
+        serializer = report_serializers.ReportQuerySerializer(
+            data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def list(self, request, *args, **kwargs):
+        """earnings of the ended courses by period"""
+        params = self.get_params()
+        queryset = self.get_queryset().filter(dimension=params['by'],
+                                              period__isnull=False)
+        if params.get('start'):
+            queryset = queryset.filter(
+                period__gte=params['start'].replace(day=1))
+        if params.get('end'):
+            queryset = queryset.filter(period__lte=params['end'])
+
+        if params['period'] == 'year':
+            queryset = queryset.annotate(bucket=TruncYear('period'))
+        elif params['period'] == 'month':
+            queryset = queryset.annotate(bucket=F('period'))
+        else:
+            queryset = queryset.annotate(
+                bucket=Value(None, output_field=DateField()))
+        rows = (queryset.values('key', 'bucket')
+                .annotate(label=Max('label'), earnings=Sum('earnings'),
+                          paid_students=Sum('paid_students'),
+                          archives=Sum('archives'))
+                .order_by('bucket', '-earnings', 'key'))
+        return Response(self.get_serializer(rows, many=True).data)
+
+    @action(methods=['GET'], detail=False)
+    def open(self, request, *args, **kwargs):
+        """paid students of the courses still running"""
+        params = self.get_params()
+        rows = (self.get_queryset()
+                .filter(dimension=params['by'], period__isnull=True)
+                .exclude(paid_students=0, earnings=0)
+                .annotate(bucket=Value(None, output_field=DateField()))
+                .values('key', 'label', 'bucket', 'earnings',
+                        'paid_students', 'archives')
+                .order_by('-earnings', 'key'))
+        return Response(self.get_serializer(rows, many=True).data)
@@ -0,0 +1,106 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:42
+
+from django.db import migrations, models
+
+
+# partitioned by range of their date, see history.partitions
+CREATE_TABLES = """
+CREATE TABLE history_archive (
+    id bigint NOT NULL,
+    course_id bigint NOT NULL,
+    course_version integer NOT NULL,
+    course_price numeric(10, 5) NOT NULL,
+    total_earnings numeric(10, 5) NOT NULL,
+    total_students integer NOT NULL,
+    archived_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, archived_at)
+) PARTITION BY RANGE (archived_at);
+CREATE INDEX history_archive_course_idx ON history_archive (course_id);
+
+CREATE TABLE history_archive_students (
+    id bigint NOT NULL,
+    archive_id bigint NOT NULL,
+    user_id bigint NOT NULL,
+    archived_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, archived_at)
+) PARTITION BY RANGE (archived_at);
+CREATE INDEX history_archive_students_archive_idx ON history_archive_students (archive_id);
+CREATE INDEX history_archive_students_user_idx ON history_archive_students (user_id);
+
+CREATE TABLE history_notification (
+    id bigint NOT NULL,
+    course_id bigint NOT NULL,
+    kind varchar(20) NOT NULL,
+    message varchar(255) NOT NULL,
+    count integer NOT NULL,
+    is_read boolean NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL,
+    resolved_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, resolved_at)
+) PARTITION BY RANGE (resolved_at);
+CREATE INDEX history_notification_course_idx ON history_notification (course_id);
+"""
+
+DROP_TABLES = """
+DROP TABLE history_notification;
+DROP TABLE history_archive_students;
+DROP TABLE history_archive;
+"""
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('course', '0021_comment_created_at'),
+        ('notification', '0002_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TABLES, DROP_TABLES),
+        migrations.CreateModel(
+            name='ArchivedCourse',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('course_version', models.IntegerField()),
+                ('course_price', models.DecimalField(decimal_places=5, max_digits=10)),
+                ('total_earnings', models.DecimalField(decimal_places=5, max_digits=10)),
+                ('total_students', models.IntegerField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'history_archive',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedStudent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'history_archive_students',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ResolvedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('message', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField()),
+                ('is_read', models.BooleanField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'history_notification',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+"""
+Models for the history tables
+
+The course archives and the resolved notifications are moved out of
+the live tables once old, see history.partitions. The history tables
+are partitioned by period and created by the migrations, the foreign
+keys are not constraints in the database, a row outlives the rows it
+points to until Django cascades a delete.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import models
+from course.models import Course
+
+
+User = get_user_model()
+
+
+class ArchivedCourse(models.Model):
+    """An archive of a course moved out of course_archive, partitioned
+    by archived_at"""
+    id = models.BigIntegerField(primary_key=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE,
+                               related_name='archive_history')
+    course_version = models.IntegerField()
+    students = models.ManyToManyField(User, through='ArchivedStudent',
+                                      related_name='+')
+    course_price = models.DecimalField(decimal_places=5, max_digits=10)
+    total_earnings = models.DecimalField(decimal_places=5, max_digits=10)
+    total_students = models.IntegerField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'history_archive'
+
+
+class ArchivedStudent(models.Model):
+    """A student of a moved archive, in the partition of the archive"""
+    id = models.BigIntegerField(primary_key=True)
+    archive = models.ForeignKey(ArchivedCourse, on_delete=models.CASCADE,
+                                related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'history_archive_students'
+
+
+class ResolvedNotification(models.Model):
+    """A resolved notification moved out of notification_notification,
+    partitioned by resolved_at"""
+    id = models.BigIntegerField(primary_key=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE,
+                               related_name='+')
+    kind = models.CharField(max_length=20)
+    message = models.CharField(max_length=255)
+    count = models.PositiveIntegerField()
+    is_read = models.BooleanField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    resolved_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'history_notification'
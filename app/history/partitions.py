@@ -0,0 +1,191 @@
+"""
+Partitions of the history tables
+
+The course archives older than HISTORY_HOT_DAYS and the notifications
+resolved more than NOTIFICATION_RETENTION_DAYS ago are moved out of the
+live tables, so the live queries and their indexes only hold the recent
+rows. Every batch is moved by one statement deleting the rows and
+inserting them in the history, whose tables are partitioned by range of
+their date, one partition per HISTORY_PARTITION_MONTHS months from
+January, created on demand.
+
+The moved archives are still read by the archive of a course. The
+partitions ending before a date can be exported to gzipped CSV files
+and dropped, the exported rows are out of the API.
+"""
+
+import gzip
+import os
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils.dateparse import parse_datetime
+
+from course.models import Archive
+from history.models import (ArchivedCourse, ArchivedStudent,
+                            ResolvedNotification)
+from notification.models import Notification
+
+
+# the partitioned tables
+HISTORIES = [ArchivedCourse, ArchivedStudent, ResolvedNotification]
+BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def period_start(moment):
+    """first day of the period of a date"""
+    months = settings.HISTORY_PARTITION_MONTHS
+    return date(moment.year, (moment.month - 1) // months * months + 1, 1)
+
+
+def next_period(start):
+    """first day of the period after the one starting at start"""
+    month = start.month - 1 + settings.HISTORY_PARTITION_MONTHS
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def create_partitions(cursor, table, first, last):
+    """create the missing partitions of the table from the period of
+    first to the period of last"""
+    start = period_start(first)
+    while start <= last.date():
+        end = next_period(start)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table}_{start:%Y_%m}
+            PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)
+        """, [start, end])
+        start = end
+
+
+def partitions(cursor, table):
+    """(name, start, end) of the partitions of the table, oldest first"""
+    cursor.execute("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+    """, [table])
+    found = []
+    for name, bound in cursor.fetchall():
+        start, end = BOUND_RE.search(bound).groups()
+        found.append((name, parse_datetime(start), parse_datetime(end)))
+    return sorted(found, key=lambda partition: partition[1])
+
+
+def _move(model, column, histories, cutoff, batch_size, sql):
+    """create the partitions of the history models, run the move
+    statement of a batch until no row is older than the cutoff, return
+    the number of rows moved"""
+    using = router.db_for_write(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f'SELECT min({column}) FROM {table} '
+                       f'WHERE {column} < %s', [cutoff])
+        first, = cursor.fetchone()
+        if first is None:
+            return 0
+        for history in histories:
+            create_partitions(cursor, history._meta.db_table, first, cutoff)
+
+    moved = 0
+    while True:
+        # short transactions, the live table stays writable
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, {'cutoff': cutoff, 'size': batch_size})
+            if not cursor.rowcount:
+                return moved
+            moved += cursor.rowcount
+
+
+def move_archives(cutoff, batch_size):
+    """move the archives older than the cutoff and their students to
+    the history, return the number of archives moved"""
+    return _move(Archive, 'archived_at', [ArchivedCourse, ArchivedStudent],
+                 cutoff, batch_size, f"""
+        WITH batch AS (
+            SELECT id, archived_at FROM {Archive._meta.db_table}
+            WHERE archived_at < %(cutoff)s
+            ORDER BY id LIMIT %(size)s
+            FOR UPDATE
+        ),
+        students AS (
+            DELETE FROM {Archive.students.through._meta.db_table} student
+            USING batch WHERE student.archive_id = batch.id
+            RETURNING student.id, student.archive_id, student.user_id,
+                      batch.archived_at
+        ),
+        moved_students AS (
+            INSERT INTO {ArchivedStudent._meta.db_table}
+                (id, archive_id, user_id, archived_at)
+            SELECT * FROM students
+        ),
+        moved AS (
+            DELETE FROM {Archive._meta.db_table} archive
+            USING batch WHERE archive.id = batch.id
+            RETURNING archive.id, archive.course_id, archive.course_version,
+                      archive.course_price, archive.total_earnings,
+                      archive.total_students, archive.archived_at
+        )
+        INSERT INTO {ArchivedCourse._meta.db_table}
+            (id, course_id, course_version, course_price, total_earnings,
+             total_students, archived_at)
+        SELECT * FROM moved
+    """)
+
+
+def move_notifications(cutoff, batch_size):
+    """move the notifications resolved before the cutoff to the
+    history, return the number of notifications moved"""
+    return _move(Notification, 'resolved_at', [ResolvedNotification],
+                 cutoff, batch_size, f"""
+        WITH batch AS (
+            SELECT id FROM {Notification._meta.db_table}
+            WHERE resolved_at < %(cutoff)s
+            ORDER BY id LIMIT %(size)s
+            FOR UPDATE
+        ),
+        moved AS (
+            DELETE FROM {Notification._meta.db_table} notification
+            USING batch WHERE notification.id = batch.id
+            RETURNING notification.id, notification.course_id,
+                      notification.kind, notification.message,
+                      notification.count, notification.is_read,
+                      notification.created_at, notification.updated_at,
+                      notification.resolved_at
+        )
+        INSERT INTO {ResolvedNotification._meta.db_table}
+            (id, course_id, kind, message, count, is_read, created_at,
+             updated_at, resolved_at)
+        SELECT * FROM moved
+    """)
+
+
+def export_partitions(before, directory):
+    """write the partitions ending before a date to gzipped CSV files
+    in the directory and drop them, return the paths of the files"""
+    using = router.db_for_write(ArchivedCourse)
+    connection = connections[using]
+    paths = []
+    for model in HISTORIES:
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            expired = [name for name, _, end in partitions(cursor, table)
+                       if end <= before]
+        for name in expired:
+            path = os.path.join(directory, f'{name}.csv.gz')
+            # a partition is dropped once its file is complete
+            with gzip.open(f'{path}.part', 'wb') as file, \
+                    connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', file)
+            os.replace(f'{path}.part', path)
+            with transaction.atomic(using=using), \
+                    connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+            paths.append(path)
+    return paths
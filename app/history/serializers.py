@@ -0,0 +1,13 @@
+"""
+Serializers for the history tables
+"""
+
+from course.serializers import ArchiveSerializer
+from history.models import ArchivedCourse
+
+
+class ArchivedCourseSerializer(ArchiveSerializer):
+    """Serializer for an archive moved to the history, read like the
+    archives of course_archive"""
+    class Meta(ArchiveSerializer.Meta):
+        model = ArchivedCourse
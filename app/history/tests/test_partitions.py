@@ -0,0 +1,153 @@
+"""
+The history tables partitioned by period, see history.partitions
+"""
+
+import csv
+import gzip
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.management.commands.check_query_budgets import Dataset
+from course.models import Archive
+from history import partitions
+from history.models import (ArchivedCourse, ArchivedStudent,
+                            ResolvedNotification)
+from notification.models import Notification
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class PeriodTests(SimpleTestCase):
+    """the periods of the partitions, from January"""
+
+    @override_settings(HISTORY_PARTITION_MONTHS=3)
+    def test_quarters(self):
+        self.assertEqual(partitions.period_start(aware(2023, 2, 15)),
+                         date(2023, 1, 1))
+        self.assertEqual(partitions.period_start(aware(2023, 12, 31)),
+                         date(2023, 10, 1))
+        self.assertEqual(partitions.next_period(date(2023, 10, 1)),
+                         date(2024, 1, 1))
+
+    @override_settings(HISTORY_PARTITION_MONTHS=1)
+    def test_months(self):
+        self.assertEqual(partitions.period_start(aware(2023, 2, 15)),
+                         date(2023, 2, 1))
+        self.assertEqual(partitions.next_period(date(2023, 12, 1)),
+                         date(2024, 1, 1))
+
+
+@override_settings(HISTORY_PARTITION_MONTHS=3)
+class MoveTests(TestCase):
+    """2 archives of a course in 2 quarters of 2023 and a recent one"""
+
+    def setUp(self):
+        self.dataset = Dataset(2)
+        self.course = self.dataset.ids['course']
+        self.archives = list(Archive.objects.filter(course_id=self.course)
+                             .order_by('id'))
+        self.other_archives = list(
+            Archive.objects.exclude(course_id=self.course).order_by('id'))
+        for archive, archived_at in zip(self.archives,
+                                        [aware(2023, 2, 15),
+                                         aware(2023, 5, 10)]):
+            Archive.objects.filter(id=archive.id).update(
+                archived_at=archived_at)
+        self.cutoff = timezone.now() - timedelta(days=365)
+
+    def partition_of(self, model, id):
+        """the partition holding a row of a history table"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text '
+                           f'FROM {model._meta.db_table} WHERE id = %s',
+                           [id])
+            return cursor.fetchone()[0]
+
+    def test_move_archives(self):
+        first, second = self.archives
+        students = set(first.students.values_list('id', flat=True))
+        self.assertEqual(partitions.move_archives(self.cutoff, 1), 2)
+
+        self.assertEqual(
+            list(Archive.objects.order_by('id')), self.other_archives)
+        self.assertEqual(self.partition_of(ArchivedCourse, first.id),
+                         'history_archive_2023_01')
+        self.assertEqual(self.partition_of(ArchivedCourse, second.id),
+                         'history_archive_2023_04')
+        moved = ArchivedStudent.objects.filter(archive_id=first.id)
+        self.assertEqual(set(moved.values_list('user_id', flat=True)),
+                         students)
+        self.assertEqual(
+            self.partition_of(ArchivedStudent, moved.first().id),
+            'history_archive_students_2023_01')
+        self.assertFalse(Archive.students.through.objects
+                         .filter(archive_id=first.id).exists())
+
+        # nothing left before the cutoff
+        self.assertEqual(partitions.move_archives(self.cutoff, 1), 0)
+
+    def test_archive_of_the_course(self):
+        partitions.move_archives(self.cutoff, 100)
+        client = APIClient()
+        client.force_authenticate(self.dataset.staff)
+        with override_settings(ALLOWED_HOSTS=['*']):
+            response = client.get(
+                f'/api/dashboard/courses/{self.course}/get_archive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([archive['course_version']
+                          for archive in response.json()], [1, 2])
+
+    def test_move_notifications(self):
+        old, recent, *_ = Notification.objects.order_by('id')
+        Notification.objects.filter(id=old.id).update(
+            resolved_at=aware(2023, 8, 1))
+        Notification.objects.filter(id=recent.id).update(
+            resolved_at=timezone.now())
+        cutoff = timezone.now() - timedelta(days=30)
+
+        self.assertEqual(partitions.move_notifications(cutoff, 10), 1)
+        self.assertFalse(Notification.objects.filter(id=old.id).exists())
+        self.assertEqual(ResolvedNotification.objects.get(id=old.id).message,
+                         old.message)
+        self.assertEqual(self.partition_of(ResolvedNotification, old.id),
+                         'history_notification_2023_07')
+
+    def test_export(self):
+        partitions.move_archives(self.cutoff, 100)
+        with tempfile.TemporaryDirectory() as directory:
+            paths = partitions.export_partitions(aware(2023, 4, 1),
+                                                 directory)
+            self.assertEqual(
+                sorted(os.path.basename(path) for path in paths),
+                ['history_archive_2023_01.csv.gz',
+                 'history_archive_students_2023_01.csv.gz'])
+            with gzip.open(paths[0], 'rt') as file:
+                rows = list(csv.DictReader(file))
+        self.assertEqual([int(row['id']) for row in rows],
+                         [self.archives[0].id])
+
+        # the exported rows are out of the history
+        self.assertEqual(list(ArchivedCourse.objects.values_list('id',
+                                                                 flat=True)),
+                         [self.archives[1].id])
+        # the partitions up to the cutoff were created by the move
+        with connection.cursor() as cursor:
+            first, *_ = partitions.partitions(cursor,
+                                              ArchivedCourse._meta.db_table)
+        self.assertEqual(first[0], 'history_archive_2023_04')
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_history', days=365, stdout=out)
+        self.assertIn('2 archives and 0 notifications', out.getvalue())
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class JobConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'job'
+
+    def ready(self):
+        """register the tasks.py module of every app"""
+        from django.utils.module_loading import autodiscover_modules
+
+        autodiscover_modules('tasks')
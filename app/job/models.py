@@ -0,0 +1,152 @@
+"""
+Models for the background jobs
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from branch import context as branch_context
+from branch.models import Branch
+
+
+CHANNEL = 'jobs'
+
+# inserts tried while the active job of the key keeps finishing
+ENQUEUE_ATTEMPTS = 3
+
+
+class JobManager(models.Manager):
+    """manager queueing and claiming the jobs"""
+
+    def enqueue(self, name, payload, key=None, run_at=None):
+        """queue a job, a key already used by an active job
+        returns that job instead of queueing another one"""
+        from job.registry import get_task
+
+        task = get_task(name)
+        using = router.db_for_write(self.model)
+        for _ in range(ENQUEUE_ATTEMPTS):
+            try:
+                with transaction.atomic(using=using):
+                    job = self.create(
+                        name=name, payload=payload, key=key,
+                        max_attempts=task.max_attempts,
+                        run_at=run_at or timezone.now(),
+                        branch_id=branch_context.current_branch_id(),
+                    )
+                break
+            except IntegrityError:
+                if key is None:
+                    raise
+                active = self.active().using(using).filter(key=key).first()
+                if active is not None:
+                    return active
+                # the job holding the key finished meanwhile, queue again
+        else:
+            # the key keeps being taken and released, return its last job
+            return self.using(using).filter(key=key).latest('id')
+
+        # wake up the idle workers once the job is visible
+        transaction.on_commit(lambda: self.wake_up(using), using=using)
+        return job
+
+    def wake_up(self, using='default'):
+        """tell the workers LISTENing that a job is ready"""
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, ''])
+
+    def active(self):
+        """jobs waiting or running"""
+        return self.filter(status__in=[Job.PENDING, Job.RUNNING])
+
+    def claim(self, worker, limit=1):
+        """lock the next jobs due and mark them running, the jobs
+        locked by another worker are skipped rather than waited for"""
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+        with transaction.atomic():
+            # the worker running these died, the jobs out of attempts
+            # fail and the others are taken over
+            self.filter(status=Job.RUNNING, locked_at__lt=stale,
+                        attempts__gte=F('max_attempts')).update(
+                status=Job.FAILED, error='the worker running the job died',
+                finished_at=now, locked_by='', locked_at=None,
+            )
+            jobs = list(
+                self.select_for_update(skip_locked=True)
+                .filter(Q(status=Job.PENDING, run_at__lte=now)
+                        | Q(status=Job.RUNNING, locked_at__lt=stale))
+                .order_by('run_at', 'id')[:limit]
+            )
+            for job in jobs:
+                job.status = Job.RUNNING
+                job.attempts += 1
+                job.locked_by = worker
+                job.locked_at = now
+                job.started_at = now
+            self.bulk_update(jobs, ['status', 'attempts', 'locked_by',
+                                    'locked_at', 'started_at'])
+        return jobs
+
+    def heartbeat(self, worker, ids):
+        """tell the other workers the jobs are still running"""
+        return (self.filter(id__in=ids, status=Job.RUNNING, locked_by=worker)
+                .update(locked_at=timezone.now()))
+
+
+class Job(models.Model):
+    """A function run by the job workers"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    status_choices = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # the task runs in the branch it was queued in, see branch.context
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE,
+                               related_name='+', null=True, blank=True)
+    key = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=status_choices,
+                              default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobManager()
+
+    class Meta:
+        constraints = [
+            # a single active job per key
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=Q(status__in=['pending', 'running']),
+                name='job_one_active_per_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['run_at', 'id'],
+                         condition=Q(status__in=['pending', 'running']),
+                         name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
@@ -0,0 +1,55 @@
+"""
+Registry of the functions the job workers can run
+
+A task is a function of JSON serializable keyword arguments returning a
+JSON serializable result, registered with the task decorator in the
+tasks.py module of its app:
+
+    @task('course.archive', max_attempts=1)
+    def archive_course(course_id):
+        ...
+"""
+
+
+tasks = {}
+
+
+class JobError(Exception):
+    """failure retrying the job cannot fix, the job fails at once"""
+
+
+class Task:
+    """a registered function and its retry policy"""
+
+    def __init__(self, name, func, max_attempts):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def enqueue(self, key=None, run_at=None, **payload):
+        """queue a run of the task, see JobManager.enqueue"""
+        from job.models import Job
+
+        return Job.objects.enqueue(self.name, payload, key=key, run_at=run_at)
+
+
+def task(name, max_attempts=3):
+    """register a function as a task"""
+    def decorator(func):
+        if name in tasks:
+            raise ValueError(f'task {name} is already registered')
+        tasks[name] = Task(name, func, max_attempts)
+        return tasks[name]
+
+    return decorator
+
+
+def get_task(name):
+    """return the registered task, JobError when unknown"""
+    try:
+        return tasks[name]
+    except KeyError:
+        raise JobError(f'unknown task {name}')
@@ -0,0 +1,15 @@
+"""
+Serializers for the job model
+"""
+
+from rest_framework import serializers
+from job.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer to display the status of a job"""
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at',
+                  'result', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
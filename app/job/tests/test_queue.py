@@ -0,0 +1,197 @@
+"""
+The background job queue, see job.models and job.worker
+"""
+
+from datetime import timedelta
+
+import psycopg2
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from branch import context as branch_context
+from branch.models import Branch
+from job.models import Job
+from job.registry import JobError, task
+from job.worker import Worker, run_job
+
+
+# the branch each run of tests.echo ran in
+runs = []
+
+
+@task('tests.echo')
+def echo(value):
+    runs.append(branch_context.current_branch_id())
+    return value
+
+
+@task('tests.flaky', max_attempts=2)
+def flaky():
+    raise RuntimeError('try again')
+
+
+@task('tests.broken')
+def broken():
+    raise JobError('no point in retrying')
+
+
+class JobTestCase(TransactionTestCase):
+    """the jobs are committed, the workers see them from their own
+    connections"""
+
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        runs.clear()
+        # the connections of the worker threads close after every job
+        self.max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+
+    def tearDown(self):
+        connection.settings_dict['CONN_MAX_AGE'] = self.max_age
+
+    def reload(self, job):
+        return Job.objects.get(id=job.id)
+
+
+class EnqueueTests(JobTestCase):
+    """queueing the jobs"""
+
+    def test_enqueue(self):
+        job = echo.enqueue(value=1)
+        self.assertEqual((job.name, job.payload, job.status, job.max_attempts),
+                         ('tests.echo', {'value': 1}, Job.PENDING, 3))
+        self.assertEqual(flaky.enqueue().max_attempts, 2)
+        self.assertIsNone(job.branch_id)
+
+    def test_branch_of_the_request(self):
+        branch = branch_context.default_branch()
+        with branch_context.use_branch(branch):
+            job = echo.enqueue(value=1)
+        self.assertEqual(job.branch_id, branch.id)
+
+    def test_unknown_task(self):
+        with self.assertRaises(JobError):
+            Job.objects.enqueue('tests.unknown', {})
+
+    def test_key_of_an_active_job(self):
+        first = echo.enqueue(key='echo', value=1)
+        second = echo.enqueue(key='echo', value=2)
+        self.assertEqual(second.id, first.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+        Job.objects.claim('worker')
+        self.assertEqual(echo.enqueue(key='echo', value=3).id, first.id)
+
+    def test_key_of_a_finished_job(self):
+        first = echo.enqueue(key='echo', value=1)
+        run_job(Job.objects.claim('worker')[0])
+        second = echo.enqueue(key='echo', value=2)
+        self.assertNotEqual(second.id, first.id)
+        self.assertEqual(second.status, Job.PENDING)
+
+
+class ClaimTests(JobTestCase):
+    """handing out the due jobs"""
+
+    def test_claim(self):
+        first = echo.enqueue(value=1)
+        second = echo.enqueue(value=2)
+        echo.enqueue(value=3, run_at=timezone.now() + timedelta(hours=1))
+
+        claimed = Job.objects.claim('worker', limit=5)
+        self.assertEqual([job.id for job in claimed], [first.id, second.id])
+        job = self.reload(first)
+        self.assertEqual((job.status, job.attempts, job.locked_by),
+                         (Job.RUNNING, 1, 'worker'))
+        self.assertEqual(Job.objects.claim('other', limit=5), [])
+
+    def test_locked_jobs_are_skipped(self):
+        first = echo.enqueue(value=1)
+        second = echo.enqueue(value=2)
+        # another worker in the middle of claiming the first job
+        other = psycopg2.connect(**connection.get_connection_params())
+        try:
+            with other.cursor() as cursor:
+                cursor.execute(f'SELECT id FROM {Job._meta.db_table} '
+                               f'WHERE id = %s FOR UPDATE', [first.id])
+            claimed = Job.objects.claim('worker')
+        finally:
+            other.close()
+        self.assertEqual([job.id for job in claimed], [second.id])
+        self.assertEqual(self.reload(first).status, Job.PENDING)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_jobs(self):
+        taken, dead = echo.enqueue(value=1), flaky.enqueue()
+        Job.objects.claim('worker', limit=2)
+        Job.objects.filter(id=dead.id).update(attempts=2)
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=2))
+
+        claimed = Job.objects.claim('other', limit=2)
+        self.assertEqual([job.id for job in claimed], [taken.id])
+        self.assertEqual((claimed[0].attempts, claimed[0].locked_by),
+                         (2, 'other'))
+        self.assertEqual(self.reload(dead).status, Job.FAILED)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_heartbeat(self):
+        job = echo.enqueue(value=1)
+        Job.objects.claim('worker')
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(Job.objects.heartbeat('other', [job.id]), 0)
+        self.assertEqual(Job.objects.heartbeat('worker', [job.id]), 1)
+        self.assertEqual(Job.objects.claim('other'), [])
+
+
+class RunTests(JobTestCase):
+    """running the jobs and recording their outcome"""
+
+    def run_once(self, job):
+        run_job(Job.objects.claim('worker')[0])
+        return self.reload(job)
+
+    def test_success(self):
+        job = self.run_once(echo.enqueue(value=[1, 2]))
+        self.assertEqual((job.status, job.result, job.locked_by),
+                         (Job.SUCCEEDED, [1, 2], ''))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_then_fail(self):
+        job = self.run_once(flaky.enqueue())
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('try again', job.error)
+        self.assertGreater(job.run_at, timezone.now())
+        # not due yet
+        self.assertEqual(Job.objects.claim('worker'), [])
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('job.worker', 'WARNING'):
+            job = self.run_once(job)
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_job_error_fails_at_once(self):
+        with self.assertLogs('job.worker', 'WARNING'):
+            job = self.run_once(broken.enqueue())
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+
+    def test_taken_over_job_is_not_overwritten(self):
+        job = echo.enqueue(value=1)
+        claimed = Job.objects.claim('worker')[0]
+        # another worker took it over after the lock timeout
+        Job.objects.update(started_at=timezone.now() + timedelta(seconds=1))
+        run_job(claimed)
+        self.assertEqual(self.reload(job).status, Job.RUNNING)
+
+    def test_worker(self):
+        other = Branch.objects.create(name='other', slug='other')
+        echo.enqueue(value=1)
+        with branch_context.use_branch(other):
+            echo.enqueue(value=2)
+        Worker(concurrency=2, poll=0.1).run(once=True)
+        self.assertEqual(sorted(runs, key=str), sorted([None, other.id],
+                                                       key=str))
+        self.assertFalse(Job.objects.active().exists())
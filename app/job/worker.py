@@ -0,0 +1,188 @@
+"""
+Worker running the queued jobs
+
+The worker claims due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so
+any number of workers share the queue without handing out a job twice,
+and runs them in a pool of threads. Between jobs it waits on LISTEN for
+the NOTIFY sent by enqueue, polling every few seconds for the retries
+and the scheduled jobs. A failed job is retried with an exponential
+backoff until it runs out of attempts.
+
+The jobs of every branch are queued on the primary, see
+core.db_router.BranchRouter, and a task runs in the branch it was
+queued in, with its database.
+"""
+
+import logging
+import os
+import random
+import select
+import socket
+import threading
+import traceback
+import time
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
+from datetime import timedelta
+
+import psycopg2
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from branch import context as branch_context
+from job.models import CHANNEL, Job
+from job.registry import JobError, get_task
+
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """seconds before the next attempt, doubling with every
+    failure, with jitter so failed jobs do not retry in lockstep"""
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+                settings.JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1)
+
+
+def run_task(job):
+    """call the task of the job in the branch of the job"""
+    task = get_task(job.name)
+    if job.branch_id is None:
+        return task(**job.payload)
+    branch = branch_context.get_branches().by_id.get(job.branch_id)
+    if branch is None:
+        raise JobError(f'unknown branch {job.branch_id}')
+    with branch_context.use_branch(branch):
+        return task(**job.payload)
+
+
+def run_job(job):
+    """run a claimed job and record its outcome"""
+    try:
+        result = run_task(job)
+    except Exception as exc:
+        job.error = traceback.format_exc()
+        if isinstance(exc, JobError) or job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.warning('job %s failed: %s', job, exc)
+        else:
+            job.status = Job.PENDING
+            delay = timedelta(seconds=retry_delay(job.attempts))
+            job.run_at = timezone.now() + delay
+            logger.info('job %s failed, retrying at %s', job, job.run_at)
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+    finally:
+        close_old_connections()
+
+    job.locked_by = ''
+    job.locked_at = None
+    # only the worker holding the job records it, a job taken over or
+    # failed after the lock timeout is not overwritten by the slow worker
+    held = Job.objects.filter(id=job.id, status=Job.RUNNING,
+                              started_at=job.started_at)
+    held.update(
+        status=job.status, result=job.result, error=job.error,
+        run_at=job.run_at, finished_at=job.finished_at,
+        locked_by='', locked_at=None,
+    )
+    close_old_connections()
+    return job
+
+
+class Worker:
+    """claim and run jobs until stopped"""
+
+    def __init__(self, concurrency=None, poll=None):
+        self.concurrency = concurrency or settings.JOB_CONCURRENCY
+        self.poll = poll or settings.JOB_POLL_SECONDS
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.connection = None
+        self.beat_at = time.monotonic()
+
+    def stop(self):
+        """finish the running jobs and return"""
+        self.stopping.set()
+
+    def run(self, once=False):
+        """run jobs, once returns as soon as the queue is empty"""
+        # future: job
+        running = {}
+        with ThreadPoolExecutor(self.concurrency,
+                                thread_name_prefix='job') as pool:
+            while not self.stopping.is_set():
+                free = self.concurrency - len(running)
+                jobs = Job.objects.claim(self.name, free) if free else []
+                running.update((pool.submit(run_job, job), job)
+                               for job in jobs)
+                self.heartbeat(running)
+                close_old_connections()
+                if once and not running:
+                    break
+                if len(jobs) == free and free:
+                    # the queue may hold more, claim again
+                    continue
+                if running:
+                    # wait for a free thread, waking up for the new jobs
+                    self.wait_for_running(running, FIRST_COMPLETED)
+                else:
+                    self.wait_for_jobs()
+            while running:
+                self.wait_for_running(running, ALL_COMPLETED)
+                self.heartbeat(running)
+                close_old_connections()
+        self.close()
+
+    def wait_for_running(self, running, return_when):
+        """wait at most the poll interval for the running jobs"""
+        done, _ = wait(running, timeout=self.poll, return_when=return_when)
+        for future in done:
+            del running[future]
+
+    def heartbeat(self, running):
+        """refresh the lock of the running jobs, four times per lock
+        timeout, so that a long job is not taken over while it runs"""
+        now = time.monotonic()
+        if not running or now - self.beat_at < settings.JOB_LOCK_TIMEOUT / 4:
+            return
+        self.beat_at = now
+        Job.objects.heartbeat(self.name, [job.id for job in running.values()])
+
+    def wait_for_jobs(self):
+        """sleep until a job is queued or the poll interval is over"""
+        try:
+            if self.connection is None:
+                self.connection = self.listen()
+            if select.select([self.connection], [], [], self.poll)[0]:
+                self.connection.poll()
+                self.connection.notifies.clear()
+        except psycopg2.Error:
+            logger.warning('cannot listen to %s, polling', CHANNEL)
+            self.close()
+            self.stopping.wait(self.poll)
+
+    def listen(self):
+        """open the connection waiting for the queued jobs"""
+        params = connections['default'].get_connection_params()
+        connection = psycopg2.connect(**params)
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{CHANNEL}"')
+        return connection
+
+    def close(self):
+        """close the LISTEN connection"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
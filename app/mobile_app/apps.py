@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MobileAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mobile_app'
+
+    def ready(self):
+        """rebuild the autocomplete index on catalog writes"""
+        from mobile_app import autocomplete
+
+        autocomplete.connect_signals()
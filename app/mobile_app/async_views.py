@@ -0,0 +1,155 @@
+"""
+Async views for the mobile app catalog
+
+These views are served by the ASGI application. They reuse the
+viewsets in mobile_app.views for authentication, permissions, filtering
+and serializers, and run the ORM calls in worker threads so independent
+queries of one request run concurrently and a slow database round-trip
+does not hold the event loop.
+"""
+
+import asyncio
+
+from django.http import HttpResponseNotAllowed
+from rest_framework.generics import get_object_or_404
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.response import Response
+from course import models as CourseModels
+from core.utils import run_sync
+from course.serializers import (GetCommentSerializer, latest_comments,
+                                rating_summary)
+from mobile_app import views
+
+
+def _represent(serializer, instance, overrides):
+    """serialize an instance using already fetched values
+    for some of its fields"""
+    ret = {}
+    for field_name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field_name in overrides:
+            ret[field_name] = overrides[field_name]
+            continue
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            continue
+        check_for_none = (attribute.pk if isinstance(attribute, PKOnlyObject)
+                          else attribute)
+        if check_for_none is None:
+            ret[field_name] = None
+        else:
+            ret[field_name] = field.to_representation(attribute)
+
+    return ret
+
+
+async def _dispatch(request, viewset_class, action, handler, **kwargs):
+    """run the handler for the action of the viewset with the
+    same authentication, permissions and rendering as the sync view"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    view = viewset_class(action_map={'get': action}, args=(),
+                         kwargs=kwargs, format_kwarg=None)
+    request = view.initialize_request(request, **kwargs)
+    view.request = request
+    view.headers = view.default_response_headers
+
+    try:
+        await run_sync(view.initial, request, **kwargs)
+        response = Response(await handler(view, **kwargs))
+    except Exception as exc:
+        response = view.handle_exception(exc)
+
+    response = view.finalize_response(request, response, **kwargs)
+    return await run_sync(response.render)
+
+
+def _get_object(view, queryset):
+    """get the object of a detail action, the relations are
+    fetched by the caller so the query plan of the view is skipped"""
+    obj = get_object_or_404(queryset, pk=view.kwargs['pk'])
+    view.check_object_permissions(view.request, obj)
+    return obj
+
+
+def _list(view):
+    """list the filtered queryset of the view"""
+    queryset = view.filter_queryset(view.get_queryset())
+    page = view.paginate_queryset(queryset)
+    if page is not None:
+        return view.get_paginated_response(
+            view.get_serializer(page, many=True).data
+        ).data
+
+    return view.get_serializer(queryset, many=True).data
+
+
+async def _retrieve_course(view, pk):
+    """fetch the course, its tags, comments and
+    ratings concurrently"""
+    course, tags, comments, ratings = await asyncio.gather(
+        run_sync(_get_object, view,
+                 view.get_queryset().select_related('instructor')),
+        run_sync(lambda: list(CourseModels.Tag.objects.filter(course__id=pk))),
+        run_sync(latest_comments, pk),
+        run_sync(rating_summary, pk),
+    )
+
+    serializer = view.get_serializer(course)
+    fields = serializer.fields
+    return _represent(serializer, course, {
+        'tags': fields['tags'].to_representation(tags),
+        'comments': GetCommentSerializer(comments, many=True).data,
+        'ratings': ratings,
+    })
+
+
+async def _retrieve_teacher(view, pk):
+    """fetch the teacher and the teacher courses concurrently"""
+    teacher, courses = await asyncio.gather(
+        run_sync(_get_object, view, view.get_queryset()),
+        run_sync(lambda: list(
+            CourseModels.Course.objects.filter(instructor__id=pk))),
+    )
+
+    serializer = view.get_serializer(teacher)
+    return _represent(serializer, teacher, {
+        'courses': serializer.fields['courses'].to_representation(courses),
+    })
+
+
+async def _list_view(view):
+    """list the queryset of the view"""
+    return await run_sync(_list, view)
+
+
+async def course_list(request):
+    """async version of CoursesViewSet.list"""
+    return await _dispatch(request, views.CoursesViewSet, 'list', _list_view)
+
+
+async def course_detail(request, pk):
+    """async version of CoursesViewSet.retrieve"""
+    return await _dispatch(request, views.CoursesViewSet, 'retrieve',
+                           _retrieve_course, pk=pk)
+
+
+async def tag_list(request):
+    """async version of GetTagsViewSet.list"""
+    return await _dispatch(request, views.GetTagsViewSet, 'list', _list_view)
+
+
+async def teacher_detail(request, pk):
+    """async version of TeacherViewSet.retrieve"""
+    return await _dispatch(request, views.TeacherViewSet, 'retrieve',
+                           _retrieve_teacher, pk=pk)
+
+
+async def student_course_list(request):
+    """async version of StudentCoursesViewSet.list"""
+    return await _dispatch(request, views.StudentCoursesViewSet, 'list',
+                           _list_view)
@@ -0,0 +1,218 @@
+"""
+Prefix index of the mobile search box
+
+Every worker keeps the names of the tags, the courses and the teachers
+in a sorted array of normalized keys, one key starting at every word of
+a name, so the prefix of any word is found with a binary search. The
+entries are ranked once, by enrollments then rating, and the best
+entries of the prefixes matching many keys are kept when the index is
+built, so a lookup never ranks more than HEAVY_PREFIX keys.
+
+The index is rebuilt when the last catalog change recorded by the sync
+triggers moved. A worker looks for it at most every
+AUTOCOMPLETE_CHECK_SECONDS, right away after saving a tag, a course or
+a teacher itself, and rebuilds every AUTOCOMPLETE_MAX_AGE_SECONDS for
+the enrollment counts, which are not tracked.
+
+Every branch has its own index of its courses and teachers, the tags
+are shared by the branches.
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+
+from branch import context as branch_context
+from course.models import Course, Tag
+from sync import changes as sync_changes
+from teacher.models import Teacher
+
+
+TAG, COURSE, TEACHER = 'tag', 'course', 'teacher'
+# models whose changes rebuild the index
+TRACKED = {TAG: Tag, COURSE: Course, TEACHER: Teacher}
+WORD_RE = re.compile(r'\w+')
+# prefixes of more keys have their best entries ranked when building,
+# a lookup ranks at most this many keys
+HEAVY_PREFIX = 200
+# sorts after every character of the keys
+LAST_CHARACTER = '\U0010ffff'
+
+Entry = namedtuple('Entry', 'type id name enrollments rating')
+
+
+def normalize(text):
+    """casefolded text without accents and repeated spaces"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text
+                   if not unicodedata.combining(char))
+    return ' '.join(text.split())
+
+
+def keys_of(name):
+    """the keys of a name, from every word to its end"""
+    text = normalize(name)
+    return [text[match.start():] for match in WORD_RE.finditer(text)]
+
+
+def load_entries():
+    """the entries of every tag and of the courses and teachers of the
+    current branch, tags and teachers have the enrollments and the mean
+    rating of their courses"""
+    courses = list(Course.objects.annotate(enrolled=Count('enrollments'))
+                   .values_list('id', 'name', 'instructor_id', 'enrolled',
+                                'rating'))
+    entries = [Entry(COURSE, id, name, enrollments, float(rating))
+               for id, name, _, enrollments, rating in courses]
+    by_course = {course[0]: course for course in courses}
+
+    def totals(names, pairs):
+        """entries of the names from their (id, course) pairs"""
+        enrollments, ratings = {}, {}
+        for id, course_id in pairs:
+            if course_id not in by_course:
+                # a course of another branch
+                continue
+            _, _, _, course_enrollments, rating = by_course[course_id]
+            enrollments[id] = enrollments.get(id, 0) + course_enrollments
+            ratings.setdefault(id, []).append(float(rating))
+        return [(id, name, enrollments.get(id, 0),
+                 sum(ratings[id]) / len(ratings[id])
+                 if id in ratings else 0.0)
+                for id, name in names]
+
+    tag_names = Tag.objects.values_list('id', 'name')
+    tag_courses = Course.tags.through.objects.values_list('tag_id',
+                                                          'course_id')
+    entries += [Entry(TAG, *row) for row in totals(tag_names, tag_courses)]
+
+    teachers = Teacher.objects.values_list('id', 'first_name', 'last_name')
+    teacher_names = [(id, f'{first_name} {last_name}'.strip())
+                     for id, first_name, last_name in teachers]
+    teacher_courses = [(instructor_id, id)
+                       for id, _, instructor_id, _, _ in courses
+                       if instructor_id is not None]
+    entries += [Entry(TEACHER, *row)
+                for row in totals(teacher_names, teacher_courses)]
+    return entries
+
+
+class PrefixIndex:
+    """the entries, best first, the sorted keys and the position of the
+    entry of every key"""
+
+    def __init__(self, entries, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.entries = sorted(entries, key=lambda entry: (
+            -entry.enrollments, -entry.rating, entry.name, entry.type,
+            entry.id))
+        keys = sorted((key, position)
+                      for position, entry in enumerate(self.entries)
+                      for key in keys_of(entry.name))
+        self.keys = [key for key, _ in keys]
+        self.positions = array('l', [position for _, position in keys])
+
+        # the heavy prefixes of a range of keys sharing a shorter one
+        limit = settings.AUTOCOMPLETE_MAX_PAGE_SIZE
+        self.top = {}
+        pending = [(0, len(self.keys), 1)]
+        while pending:
+            start, end, length = pending.pop()
+            while start < end:
+                prefix = self.keys[start][:length]
+                if len(prefix) < length:
+                    # the shorter prefix itself, sorted first
+                    start += 1
+                    continue
+                stop = bisect_left(self.keys, prefix + LAST_CHARACTER,
+                                   start, end)
+                if stop - start > HEAVY_PREFIX:
+                    self.top[prefix] = array('l', heapq.nsmallest(
+                        limit, set(self.positions[start:stop])))
+                    pending.append((start, stop, length + 1))
+                start = stop
+
+    def search(self, text, limit):
+        """the best entries with a word starting with the text"""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        positions = self.top.get(prefix)
+        if positions is None:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + LAST_CHARACTER, start)
+            positions = heapq.nsmallest(limit, set(self.positions[start:end]))
+        return [self.entries[position] for position in positions[:limit]]
+
+
+# branch id -> index, with the time it was checked at
+_indexes = {}
+_checked_at = {}
+# branches whose index looks for changes on the next lookup
+_changed = set()
+_lock = threading.Lock()
+
+
+def catalog_version():
+    """token of the last change of a tag, a course or a teacher"""
+    return sync_changes.latest_token(
+        [model._meta.label_lower for model in TRACKED.values()])
+
+
+def get_index():
+    """the index of the current branch in the process, rebuilt when the
+    catalog changed"""
+    branch_id = branch_context.current_branch_id()
+    check_seconds = settings.AUTOCOMPLETE_CHECK_SECONDS
+    index = _indexes.get(branch_id)
+    if index is not None and branch_id not in _changed and \
+            time.monotonic() - _checked_at[branch_id] < check_seconds:
+        return index
+    with _lock:
+        now = time.monotonic()
+        index = _indexes.get(branch_id)
+        if index is not None and branch_id not in _changed and \
+                now - _checked_at[branch_id] < check_seconds:
+            return index
+        # a change saved while building is checked by the next lookup
+        _changed.discard(branch_id)
+        version = catalog_version()
+        max_age = settings.AUTOCOMPLETE_MAX_AGE_SECONDS
+        if (index is None or index.version != version
+                or now - index.built_at >= max_age):
+            index = _indexes[branch_id] = PrefixIndex(load_entries(), version)
+        _checked_at[branch_id] = now
+        return index
+
+
+def search(text, limit):
+    """the best tags, courses and teachers matching the text"""
+    return get_index().search(text, limit)
+
+
+def changed():
+    """look for catalog changes on the next lookup of every branch"""
+    _changed.update(_indexes)
+
+
+def connect_signals():
+    """look for changes once a tracked row saved by the process commits"""
+    def on_change(sender, **kwargs):
+        transaction.on_commit(changed)
+
+    for name, model in TRACKED.items():
+        post_save.connect(on_change, sender=model, weak=False,
+                          dispatch_uid=f'autocomplete_{name}_saved')
+        post_delete.connect(on_change, sender=model, weak=False,
+                            dispatch_uid=f'autocomplete_{name}_deleted')
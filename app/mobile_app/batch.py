@@ -0,0 +1,136 @@
+"""
+In-process execution of the sub-requests of a batch
+
+Every sub-request is a copy of the batch request with its own method,
+path and body, dispatched straight to the view routed to its path, so
+the views run their own permission checks as if they were called
+directly. The user authenticated by the batch is handed to the views
+accepting the same authentication, the others authenticate the copied
+headers themselves.
+"""
+
+import asyncio
+import contextvars
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+
+logger = logging.getLogger(__name__)
+
+# shared by the batches of the process, its threads keep their database
+# connections between batches like the request threads do
+_pool = ThreadPoolExecutor(settings.BATCH_MAX_THREADS,
+                           thread_name_prefix='batch')
+
+
+def _error(status, detail):
+    return {'status': status, 'body': {'detail': detail}}
+
+
+def _build_request(request, method, path, query, body):
+    """copy the batch request for a sub-request"""
+    environ = {key: value for key, value in request.META.items()
+               if not key.startswith('wsgi.')}
+    content = b'' if body is None else json.dumps(body).encode()
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': request.META.get('SCRIPT_NAME', ''),
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'HTTP_ACCEPT': 'application/json',
+        # the absolute urls of the sub-request keep the scheme of the batch
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(content),
+    })
+    return WSGIRequest(environ)
+
+
+def _share_authentication(batch, sub_request, callback):
+    """let the view reuse the authentication of the batch"""
+    for name in ('_force_auth_user', '_force_auth_token'):
+        # forced by the test client, it would force every direct call too
+        if hasattr(batch._request, name):
+            setattr(sub_request, name, getattr(batch._request, name))
+    authenticator = batch.successful_authenticator
+    view_class = getattr(callback, 'cls', None)
+    if authenticator is None or view_class is None:
+        return
+    if type(authenticator) in view_class.authentication_classes:
+        sub_request._force_auth_user = batch.user
+        sub_request._force_auth_token = batch.auth
+
+
+def run_item(batch, item):
+    """run a sub-request and return its status and body"""
+    url = urlsplit(item['path'])
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return _error(404, 'Not found.')
+    if (not getattr(match.func, '__module__', '').startswith('mobile_app.')
+            or match.url_name == 'batch'):
+        return _error(404, 'Not a mobile app route.')
+
+    method = item['method']
+    sub_request = _build_request(batch._request, method, url.path, url.query,
+                                 item.get('body'))
+    sub_request.resolver_match = match
+    _share_authentication(batch, sub_request, match.func)
+
+    try:
+        if asyncio.iscoroutinefunction(match.func):
+            response = async_to_sync(match.func)(sub_request, *match.args,
+                                                 **match.kwargs)
+        else:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+    except Http404:
+        return _error(404, 'Not found.')
+    except Exception:
+        logger.exception('batch sub-request %s %s failed',
+                         method, item['path'])
+        return _error(500, 'Server error.')
+
+    if isinstance(response, Response):
+        body = response.data
+    elif response.get('Content-Type', '').startswith('application/json'):
+        body = json.loads(response.content or 'null')
+    else:
+        body = response.content.decode(response.charset or 'utf-8') or None
+    return {'status': response.status_code, 'body': body}
+
+
+def _run_in_thread(context, batch, item):
+    """run a sub-request in a pool thread with the context of the batch"""
+    # like a request, drop the connection if it expired or broke meanwhile
+    close_old_connections()
+    try:
+        return context.run(run_item, batch, item)
+    finally:
+        close_old_connections()
+
+
+def run_batch(batch, items, parallel=False):
+    """run the sub-requests, in parallel threads when asked and every
+    sub-request is read only, in order otherwise"""
+    if not parallel or len(items) < 2 or any(
+            item['method'] not in SAFE_METHODS for item in items):
+        return [run_item(batch, item) for item in items]
+
+    futures = [_pool.submit(_run_in_thread, contextvars.copy_context(),
+                            batch, item)
+               for item in items]
+    return [future.result() for future in futures]
@@ -0,0 +1,60 @@
+"""
+Serializers for the mobile app API
+"""
+
+from django.conf import settings
+from rest_framework import serializers
+
+from course.serializers import CourseCommentSerializer
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """a sub-request of a batch"""
+    method = serializers.ChoiceField(
+        choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.CharField(
+        help_text='path of a mobile app route with its query string')
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for a batch of mobile app requests"""
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+    parallel = serializers.BooleanField(
+        default=False,
+        help_text='run the sub-requests in parallel, only when they are '
+                  'all GET',
+    )
+
+    def validate_requests(self, value):
+        """limit the size of a batch"""
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f'A batch holds at most {settings.BATCH_MAX_REQUESTS} requests'
+            )
+        return value
+
+
+class BatchResultSerializer(serializers.Serializer):
+    """the response of a sub-request"""
+    status = serializers.IntegerField()
+    body = serializers.JSONField(allow_null=True)
+
+
+class BatchResponseSerializer(serializers.Serializer):
+    """the responses of a batch, in the order of the requests"""
+    responses = BatchResultSerializer(many=True)
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    """a tag, course or teacher suggested by the search box"""
+    type = serializers.ChoiceField(choices=['tag', 'course', 'teacher'])
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class CommentPageSerializer(serializers.Serializer):
+    """a page of the comments of a course"""
+    next = serializers.URLField(allow_null=True)
+    previous = serializers.URLField(allow_null=True)
+    results = CourseCommentSerializer(many=True)
@@ -0,0 +1,78 @@
+"""
+The async read path of the mobile catalog, see mobile_app.async_views
+"""
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from core.management.commands.check_query_budgets import Dataset
+
+
+@override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=[])
+class AsyncViewTests(TransactionTestCase):
+    """the async views answer like the sync viewsets they mirror"""
+
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        # the async views query from worker threads, outside a test
+        # transaction, their connections close after every call
+        self.max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        self.dataset = Dataset(2)
+        self.token = Token.objects.create(user=self.dataset.student).key
+
+    def tearDown(self):
+        connection.settings_dict['CONN_MAX_AGE'] = self.max_age
+
+    async def assert_same(self, path, token=None):
+        """get the sync and the async version of the path"""
+        auth = f'Token {token}' if token else ''
+        expected = await sync_to_async(self.client.get)(
+            f'/api/mobile-app/{path}', HTTP_AUTHORIZATION=auth)
+        # the async client sends its extra arguments as headers
+        response = await self.async_client.get(
+            f'/api/mobile-app/async/{path}', authorization=auth)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    async def test_catalog(self):
+        ids = self.dataset.ids
+        for path in ('courses/', f'courses/{ids["course"]}/', 'tags/',
+                     f'teachers/{ids["teacher"]}/'):
+            with self.subTest(path=path):
+                response = await self.assert_same(path)
+                self.assertEqual(response.status_code, 200)
+
+    async def test_pages(self):
+        expected = await sync_to_async(self.client.get)(
+            '/api/mobile-app/courses/?page_size=1')
+        response = await self.async_client.get(
+            '/api/mobile-app/async/courses/?page_size=1')
+        self.assertEqual(response.json()['results'],
+                         expected.json()['results'])
+        self.assertIn('/async/courses/?cursor=', response.json()['next'])
+
+    async def test_missing_objects(self):
+        for path in ('courses/0/', 'teachers/0/'):
+            with self.subTest(path=path):
+                response = await self.assert_same(path)
+                self.assertEqual(response.status_code, 404)
+
+    async def test_student_courses(self):
+        response = await self.assert_same('get-courses/', self.token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json())
+
+    async def test_anonymous_student_courses(self):
+        response = await self.assert_same('get-courses/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_other_methods(self):
+        response = await self.async_client.post('/api/mobile-app/async/tags/')
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,181 @@
+"""
+The search box suggestions, see mobile_app.autocomplete
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from branch import context as branch_context
+from branch.models import Branch
+from course.models import Course, Enrollment, Tag
+from mobile_app import autocomplete
+from mobile_app.autocomplete import COURSE, TAG, TEACHER, Entry
+from teacher.models import Teacher
+
+
+def names(entries):
+    return [entry.name for entry in entries]
+
+
+class PrefixIndexTests(SimpleTestCase):
+    """the sorted keys and the ranking of the entries"""
+
+    def test_normalize(self):
+        self.assertEqual(autocomplete.normalize(' Café  au LAIT '),
+                         'cafe au lait')
+        self.assertEqual(autocomplete.keys_of('Intro to Python'),
+                         ['intro to python', 'to python', 'python'])
+
+    def test_any_word(self):
+        index = autocomplete.PrefixIndex([
+            Entry(COURSE, 1, 'Intro to Python', 10, 4.0),
+            Entry(TAG, 2, 'python', 30, 3.0),
+            Entry(TEACHER, 3, 'Pyotr Pythonov', 10, 5.0),
+            Entry(COURSE, 4, 'Django', 50, 5.0),
+        ], version=None)
+        # by enrollments then rating, once per entry
+        self.assertEqual(names(index.search('PY', 10)),
+                         ['python', 'Pyotr Pythonov', 'Intro to Python'])
+        self.assertEqual(names(index.search('python', 1)), ['python'])
+        self.assertEqual(names(index.search('to py', 10)),
+                         ['Intro to Python'])
+        self.assertEqual(index.search('  ', 10), [])
+        self.assertEqual(index.search('rust', 10), [])
+
+    @override_settings(AUTOCOMPLETE_MAX_PAGE_SIZE=5)
+    def test_heavy_prefixes(self):
+        entries = [Entry(COURSE, id, f'course {id} level {id % 7}',
+                         id % 13, float(id % 5))
+                   for id in range(3 * autocomplete.HEAVY_PREFIX)]
+        index = autocomplete.PrefixIndex(entries, version=None)
+        self.assertIn('c', index.top)
+        self.assertIn('level', index.top)
+        self.assertNotIn('level 1', index.top)
+
+        ranked = sorted(entries, key=lambda entry: (
+            -entry.enrollments, -entry.rating, entry.name))
+        for text in ('c', 'cou', 'level', 'level 3', '12'):
+            with self.subTest(text=text):
+                expected = [entry for entry in ranked
+                            if any(key.startswith(text) for key in
+                                   autocomplete.keys_of(entry.name))]
+                self.assertEqual(index.search(text, 5), expected[:5])
+
+
+class AutocompleteTestCase(TestCase):
+    """a teacher with 2 courses of a shared tag, one of them with
+    a student"""
+
+    def setUp(self):
+        autocomplete._indexes.clear()
+        autocomplete._checked_at.clear()
+        autocomplete._changed.clear()
+        self.addCleanup(autocomplete._indexes.clear)
+        self.teacher = Teacher.objects.create(
+            email='ada@search.test', first_name='Ada', last_name='Lovelace',
+            gender='Female')
+        self.tag = Tag.objects.create(name='Programming')
+        self.python, self.pascal = Course.objects.bulk_create([
+            Course(name='Python basics', price=100, instructor=self.teacher,
+                   rating=4),
+            Course(name='Pascal', price=100, instructor=self.teacher,
+                   rating=2),
+        ])
+        self.tag.course_set.add(self.python, self.pascal)
+        student = get_user_model().objects.create(email='s@search.test')
+        Enrollment.objects.create(course=self.python, student=student)
+
+
+class LoadTests(AutocompleteTestCase):
+    """the entries read from the database"""
+
+    def test_entries(self):
+        entries = {(entry.type, entry.id): entry
+                   for entry in autocomplete.load_entries()}
+        self.assertEqual(entries[COURSE, self.python.id],
+                         Entry(COURSE, self.python.id, 'Python basics', 1,
+                               4.0))
+        # the enrollments and the mean rating of their courses
+        self.assertEqual(entries[TAG, self.tag.id],
+                         Entry(TAG, self.tag.id, 'Programming', 1, 3.0))
+        self.assertEqual(entries[TEACHER, self.teacher.id],
+                         Entry(TEACHER, self.teacher.id, 'Ada Lovelace', 1,
+                               3.0))
+
+    def test_branches(self):
+        other = Branch.objects.create(name='Other', slug='other',
+                                      host='other.test')
+        Course.objects.create(name='Prolog', price=100, branch=other,
+                              instructor=self.teacher)
+        with branch_context.use_branch(other):
+            entries = autocomplete.load_entries()
+        # the tags are shared, their courses are not
+        self.assertEqual(sorted(names(entries)), ['Programming', 'Prolog'])
+        self.assertEqual(
+            [entry.enrollments for entry in entries if entry.type == TAG],
+            [0])
+
+
+class IndexTests(AutocompleteTestCase):
+    """rebuilding the index of a worker"""
+
+    def test_cached(self):
+        index = autocomplete.get_index()
+        with self.assertNumQueries(0):
+            self.assertIs(autocomplete.get_index(), index)
+
+    def test_changes(self):
+        index = autocomplete.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Prolog')
+        rebuilt = autocomplete.get_index()
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(names(rebuilt.search('pro', 10)),
+                         ['Programming', 'Prolog'])
+
+        # checked again, nothing changed
+        autocomplete.changed()
+        self.assertIs(autocomplete.get_index(), rebuilt)
+
+    @override_settings(AUTOCOMPLETE_CHECK_SECONDS=60)
+    def test_changes_of_other_workers(self):
+        index = autocomplete.get_index()
+        # saved by another process, no signal here
+        Tag.objects.bulk_create([Tag(name='Prolog')])
+        self.assertIs(autocomplete.get_index(), index)
+        autocomplete._checked_at[None] -= 60
+        self.assertIsNot(autocomplete.get_index(), index)
+
+    def test_per_branch(self):
+        other = Branch.objects.create(name='Other', slug='other',
+                                      host='other.test')
+        index = autocomplete.get_index()
+        with branch_context.use_branch(other):
+            self.assertEqual(names(autocomplete.search('p', 10)),
+                             ['Programming'])
+        self.assertIs(autocomplete.get_index(), index)
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class AutocompleteViewTests(AutocompleteTestCase):
+    """the suggestions of the mobile app"""
+
+    def test_search(self):
+        response = APIClient().get('/api/mobile-app/autocomplete/?q=p')
+        self.assertEqual(response.status_code, 200)
+        # as many enrollments, the course has the best rating
+        self.assertEqual(response.json(), [
+            {'type': 'course', 'id': self.python.id,
+             'name': 'Python basics'},
+            {'type': 'tag', 'id': self.tag.id, 'name': 'Programming'},
+            {'type': 'course', 'id': self.pascal.id, 'name': 'Pascal'},
+        ])
+
+    def test_limit(self):
+        client = APIClient()
+        response = client.get('/api/mobile-app/autocomplete/?q=p&limit=1')
+        self.assertEqual(len(response.json()), 1)
+        response = client.get('/api/mobile-app/autocomplete/?limit=x')
+        self.assertEqual(response.status_code, 400)
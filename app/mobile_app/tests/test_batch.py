@@ -0,0 +1,147 @@
+"""
+The batch endpoint of the mobile app, see mobile_app.batch
+"""
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.management.commands.check_query_budgets import Dataset
+
+
+BATCH = '/api/mobile-app/batch/'
+PREFIX = '/api/mobile-app/'
+
+
+class BatchTestCase:
+
+    def client_of(self, user):
+        """a client sending the token of the user"""
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def batch(self, user, requests, parallel=False):
+        response = self.client_of(user).post(
+            BATCH, {'requests': requests, 'parallel': parallel},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['responses']
+
+
+@override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=[])
+class PermissionParityTests(BatchTestCase, TestCase):
+    """a sub-request gets the response of a direct call of its route"""
+
+    def setUp(self):
+        self.dataset = Dataset(2)
+        ids = self.dataset.ids
+        course, comment = ids['course'], ids['comment']
+        self.requests = [
+            ('GET', 'courses/', None),
+            ('GET', f'courses/{course}/', None),
+            ('GET', 'courses/0/', None),
+            ('GET', 'get-courses/', None),
+            ('GET', 'me/', None),
+            ('GET', 'recommendations/', None),
+            ('GET', 'sync/?limit=5', None),
+            ('GET', 'autocomplete/?q=cou', None),
+            ('POST', f'courses/{course}/post_comment/',
+             {'comment': 'batched', 'rating': 4}),
+            ('POST', 'course-register/', {'id': ids['other_course']}),
+            ('DELETE', f'courses/{course}/comments/{comment}/', None),
+        ]
+
+    def direct(self, user, method, path, body):
+        client = self.client_of(user)
+        response = getattr(client, method.lower())(
+            PREFIX + path, body, format='json')
+        return {'status': response.status_code,
+                'body': response.json() if response.content else None}
+
+    def test_parity(self):
+        dataset = self.dataset
+        users = {'student': dataset.student, 'spare': dataset.spare_student,
+                 'staff': dataset.staff, 'anonymous': None}
+        for name, user in users.items():
+            for method, path, body in self.requests:
+                with self.subTest(user=name, method=method, path=path):
+                    # both run on the same data
+                    with transaction.atomic():
+                        expected = self.direct(user, method, path, body)
+                        transaction.set_rollback(True)
+                    item = {'method': method, 'path': PREFIX + path}
+                    if body is not None:
+                        item['body'] = body
+                    with transaction.atomic():
+                        result, = self.batch(user, [item])
+                        transaction.set_rollback(True)
+                    self.assertEqual(result, expected)
+
+    def test_invalid_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token nope')
+        response = client.post(BATCH, {'requests': [
+            {'path': PREFIX + 'courses/'}]}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_other_routes(self):
+        results = self.batch(self.dataset.student, [
+            {'path': '/api/dashboard/courses/'},
+            {'path': PREFIX + 'batch/', 'method': 'POST'},
+            {'path': PREFIX + 'nowhere/'},
+        ])
+        self.assertEqual([result['status'] for result in results],
+                         [404, 404, 404])
+
+    def test_writes_run_in_order(self):
+        course = f'{PREFIX}courses/{self.dataset.ids["course"]}/'
+        results = self.batch(self.dataset.student, [
+            {'method': 'POST', 'path': f'{course}post_comment/',
+             'body': {'comment': 'first', 'rating': 5}},
+            {'path': f'{course}comments/?page_size=1'},
+        ], parallel=True)
+        self.assertEqual(results[1]['body']['results'][0]['comment'], 'first')
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_size(self):
+        response = self.client_of(self.dataset.student).post(
+            BATCH, {'requests': [{'path': PREFIX + 'tags/'}] * 3},
+            format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=['*'], DATABASE_REPLICAS=[])
+class ParallelBatchTests(BatchTestCase, TransactionTestCase):
+    """the read only batches run in the threads of the pool"""
+
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        # the pool threads close their connections after every request
+        self.max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        self.dataset = Dataset(2)
+
+    def tearDown(self):
+        connection.settings_dict['CONN_MAX_AGE'] = self.max_age
+
+    def test_parallel_matches_serial(self):
+        course = self.dataset.ids['course']
+        requests = [{'path': PREFIX + path} for path in (
+            'courses/', f'courses/{course}/', 'get-courses/',
+            'async/get-courses/', f'async/courses/{course}/', 'me/',
+        )]
+        serial = self.batch(self.dataset.student, requests)
+        self.assertEqual(self.batch(self.dataset.student, requests,
+                                    parallel=True), serial)
+        self.assertEqual({result['status'] for result in serial}, {200})
+        # the async views share the authentication of the batch too
+        anonymous = self.batch(None, requests[2:4], parallel=True)
+        self.assertEqual([result['status'] for result in anonymous],
+                         [401, 401])
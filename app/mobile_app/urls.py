@@ -3,7 +3,7 @@ URL mapping for the mobile app API
 """
 
 from django.urls import path, include
-from mobile_app import views
+from mobile_app import views, async_views
 from rest_framework.routers import DefaultRouter
 
 
@@ -18,4 +18,18 @@ urlpatterns = [
     path('me/', views.ManageStudentView.as_view(), name='me'),
     path('', include(router.urls)),
     path('course-register/', views.CourseRegisterView.as_view(), name='course-register'),
+    path('autocomplete/', views.AutocompleteView.as_view(),
+         name='autocomplete'),
+    path('recommendations/', views.RecommendationsView.as_view(),
+         name='recommendations'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('batch/', views.BatchView.as_view(), name='batch'),
+    path('async/tags/', async_views.tag_list, name='async-tag-list'),
+    path('async/courses/', async_views.course_list, name='async-course-list'),
+    path('async/courses/<int:pk>/', async_views.course_detail,
+         name='async-course-detail'),
+    path('async/teachers/<int:pk>/', async_views.teacher_detail,
+         name='async-teacher-detail'),
+    path('async/get-courses/', async_views.student_course_list,
+         name='async-get-courses'),
 ]
\ No newline at end of file
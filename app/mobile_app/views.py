@@ -14,9 +14,11 @@ from rest_framework.response import Response
 from user.serializers import AppUserSerializer, AuthTokenSerializer
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.pagination import CommentPagination, RankedCoursePagination
 from core.permissions import IsStudent
+from core.mixins import AutoPrefetchMixin, CompiledListMixin, MessagePackMixin
 from course import serializers as CourseSerializers
-from course import models as CourseModels
+from course import models as CourseModels, ranking
 from teacher import(
      serializers as TeacherSerializers,
      models as TeacherModels,
@@ -29,22 +31,28 @@ from drf_spectacular.utils import (
 )
 from rest_framework.decorators import action
 from rest_framework import status
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Case, IntegerField, When
+from branch import context as branch_context
+from sync import changes as sync_changes, serializers as SyncSerializers
+from mobile_app import autocomplete, batch, serializers as MobileSerializers
+from recommendation import index as recommendations, similarity
 
 
-class CreateStudentView(generics.CreateAPIView):
+class CreateStudentView(MessagePackMixin, generics.CreateAPIView):
     """Create a new student"""
     serializer_class = AppUserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(MessagePackMixin, ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_class = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-
-class ManageStudentView(generics.RetrieveUpdateAPIView):
+class ManageStudentView(MessagePackMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated student"""
     serializer_class = AppUserSerializer
     authentication_classes = [authentication.TokenAuthentication]
@@ -55,7 +63,8 @@ class ManageStudentView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
-class GetTagsViewSet(mixins.ListModelMixin,
+class GetTagsViewSet(MessagePackMixin, CompiledListMixin, AutoPrefetchMixin,
+                     mixins.ListModelMixin,
                      viewsets.GenericViewSet):
     """list all the Tags """
 
@@ -90,9 +99,8 @@ class GetTagsViewSet(mixins.ListModelMixin,
         ]
     )
 )
-
-
-class CoursesViewSet(mixins.ListModelMixin,
+class CoursesViewSet(MessagePackMixin, CompiledListMixin, AutoPrefetchMixin,
+                     mixins.ListModelMixin,
                      mixins.RetrieveModelMixin,
                      viewsets.GenericViewSet):
     """Retreive and list courses """
@@ -101,6 +109,7 @@ class CoursesViewSet(mixins.ListModelMixin,
     filter_backends = (filters.SearchFilter,)
     search_fields = ('name', 'instructor__first_name', 'instructor__last_name', 'tags__name')
     authentication_classes = [authentication.TokenAuthentication]
+    pagination_class = RankedCoursePagination
 
     def get_serializer_class(self):
         """return serializer class for the request"""
@@ -108,6 +117,8 @@ class CoursesViewSet(mixins.ListModelMixin,
             return CourseSerializers.MobileAppCourseSerializer
         if self.action == 'post_comment':
             return CourseSerializers.PostCommentSerializer
+        if self.action == 'comments':
+            return CourseSerializers.CourseCommentSerializer
         return self.serializer_class
 
     def get_queryset(self):
@@ -121,7 +132,7 @@ class CoursesViewSet(mixins.ListModelMixin,
         if level:
             queryset = queryset.filter(level=level)
 
-        return queryset.distinct().order_by('-rating')
+        return queryset.distinct().order_by('-ranking_score', '-id')
 
 
     def get_permissions(self):
@@ -140,6 +151,27 @@ class CoursesViewSet(mixins.ListModelMixin,
         serializer.save(student=request.user, course=course)
         return Response(serializer.data)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('cursor', OpenApiTypes.STR,
+                             description='cursor of the page'),
+            OpenApiParameter('page_size', OpenApiTypes.INT,
+                             description=f'comments per page, at most '
+                                         f'{settings.COMMENT_MAX_PAGE_SIZE}'),
+        ],
+        responses=MobileSerializers.CommentPageSerializer,
+    )
+    @action(detail=True, methods=['GET'])
+    def comments(self, request, pk=None):
+        """pages of the comments of the course, newest first"""
+        course = self.get_object()
+        paginator = CommentPagination()
+        comments = self.optimize_queryset(
+            CourseModels.Comment.objects.filter(course=course))
+        page = paginator.paginate_queryset(comments, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['DELETE'], url_path='comments/(?P<comment_id>\d+)')
     def delete_comment(self, request, pk=None, comment_id=None):
         try:
@@ -148,19 +180,21 @@ class CoursesViewSet(mixins.ListModelMixin,
             if comment.student != request.user:
                 raise PermissionDenied("You don't have permission to delete this comment.")
             comment.delete()  # Delete the comment
+            ranking.update_rankings([course.id])
             return Response(status=status.HTTP_204_NO_CONTENT)
         except comment.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
 
-class TeacherViewSet(mixins.RetrieveModelMixin,
+class TeacherViewSet(MessagePackMixin, AutoPrefetchMixin,
+                     mixins.RetrieveModelMixin,
                      viewsets.GenericViewSet):
     """manage the teacher API """
     serializer_class = TeacherSerializers.DetailAppTeacher
     queryset = TeacherModels.Teacher.objects.all()
 
 
-class CourseRegisterView(generics.CreateAPIView):
+class CourseRegisterView(MessagePackMixin, generics.CreateAPIView):
     """register students to courses"""
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [IsStudent, permissions.IsAuthenticated]
@@ -171,12 +205,17 @@ class CourseRegisterView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         student = serializer.save()
-        courses = CourseModels.Course.objects.filter(students__student=student)
+        similarity.mark_dirty([serializer.validated_data['id']])
+        ranking.update_rankings([serializer.validated_data['id']])
+        courses = CourseModels.Course.objects.filter(
+            enrollments__student=student)
         serializer = CourseSerializers.CourseSerializer(courses, many=True)
         return Response(serializer.data)
 
 
-class StudentCoursesViewSet(mixins.ListModelMixin,
+class StudentCoursesViewSet(MessagePackMixin, CompiledListMixin,
+                            AutoPrefetchMixin,
+                            mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """list the courses of the authorized student"""
     serializer_class = CourseSerializers.CourseSerializer
@@ -188,10 +227,96 @@ class StudentCoursesViewSet(mixins.ListModelMixin,
         """filter the courses"""
         queryset = self.queryset
         student = self.request.user
-        return queryset.filter(students__student=student)
+        return queryset.filter(enrollments__student=student)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'q',
+            OpenApiTypes.STR,
+            description='what the student typed so far',
+        ),
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description='maximum number of suggestions',
+        ),
+    ],
+    responses=MobileSerializers.AutocompleteSerializer(many=True),
+)
+class AutocompleteView(MessagePackMixin, generics.GenericAPIView):
+    """suggest tags, courses and teachers while the student types,
+    served from the in-memory index of the worker"""
+    serializer_class = MobileSerializers.AutocompleteSerializer
+    # public catalog, no token lookup per keystroke
+    authentication_classes = []
+
+    def get_limit(self):
+        """the number of suggestions asked by the client"""
+        try:
+            limit = int(self.request.query_params.get(
+                'limit', settings.AUTOCOMPLETE_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': 'A number is required'})
+        return max(1, min(limit, settings.AUTOCOMPLETE_MAX_PAGE_SIZE))
+
+    def get(self, request, *args, **kwargs):
+        """return the most popular names with a word starting with q"""
+        entries = autocomplete.search(request.query_params.get('q', ''),
+                                      self.get_limit())
+        serializer = self.get_serializer(entries, many=True)
+        return Response(serializer.data)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description='maximum number of recommended courses',
+        ),
+    ],
+    responses=CourseSerializers.MobileAppCourseSerializer(many=True),
+)
+class RecommendationsView(MessagePackMixin, AutoPrefetchMixin,
+                          generics.GenericAPIView):
+    """courses to recommend to the authorized student"""
+    serializer_class = CourseSerializers.MobileAppCourseSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [IsStudent, permissions.IsAuthenticated]
 
+    def get_limit(self):
+        """the number of courses asked by the client"""
+        try:
+            limit = int(self.request.query_params.get(
+                'limit', settings.RECOMMENDATION_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': 'A number is required'})
+        return max(1, min(limit, settings.RECOMMENDATION_MAX_PAGE_SIZE))
+
+    def get(self, request, *args, **kwargs):
+        """return the open courses taken with or sharing tags with the
+        courses of the student, completed by the best ranked ones"""
+        limit = self.get_limit()
+        ranked, history = recommendations.recommend(request.user, limit)
+        # the open candidates first, then the best ranked courses for
+        # students without history or with too few open candidates
+        ordering = ['-ranking_score', '-id']
+        if ranked:
+            rank = Case(*[When(id=course_id, then=position)
+                          for position, course_id in enumerate(ranked)],
+                        output_field=IntegerField())
+            ordering.insert(0, rank.asc(nulls_last=True))
+        queryset = (CourseModels.Course.objects.filter(registration_open=True)
+                    .exclude(id__in=history).order_by(*ordering))
+        courses = self.optimize_queryset(queryset)[:limit]
+
+        serializer = self.get_serializer(courses, many=True)
+        return Response(serializer.data)
 
-class CommentViewSet(mixins.CreateModelMixin,
+
+class CommentViewSet(MessagePackMixin, mixins.CreateModelMixin,
                      viewsets.GenericViewSet):
     """viewset for the comment API"""
     serializer_classes = CourseSerializers.PostCommentSerializer
@@ -200,4 +325,91 @@ class CommentViewSet(mixins.CreateModelMixin,
     queryset = CourseModels.Comment.objects.all()
 
 
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.STR,
+            description='token of the last sync, omit it for a full download',
+        ),
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description='maximum number of changed objects',
+        ),
+    ]
+)
+class SyncView(MessagePackMixin, AutoPrefetchMixin, generics.GenericAPIView):
+    """download the catalog changes since the last sync"""
+    serializer_class = SyncSerializers.SyncSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+
+    def get_since(self):
+        """the token of the last sync"""
+        try:
+            return sync_changes.parse_token(
+                self.request.query_params.get('since'))
+        except ValueError:
+            raise ValidationError({'since': 'Invalid sync token'})
+
+    def get_limit(self):
+        """the page size asked by the client"""
+        try:
+            limit = int(self.request.query_params.get(
+                'limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': 'A number is required'})
+        return max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
+
+    def get(self, request, *args, **kwargs):
+        """return the upserted and deleted objects of the branch after
+        the token"""
+        changes, token, has_more = sync_changes.read_changes(
+            self.get_since(), self.get_limit(),
+            branch_context.current_branch_id(),
+        )
+
+        changed = {label: [] for label in SyncSerializers.RESOURCES}
+        for change in changes:
+            changed[change.model].append(change)
+
+        data = {'token': sync_changes.format_token(token),
+                'has_more': has_more}
+        deleted = {}
+        resources = SyncSerializers.RESOURCES.items()
+        for label, (key, serializer_class) in resources:
+            ids = [change.object_id for change in changed[label]
+                   if not change.deleted]
+            instances = []
+            if ids:
+                serializer = serializer_class(
+                    context=self.get_serializer_context())
+                queryset = (apps.get_model(label).objects
+                            .filter(id__in=ids).order_by('id'))
+                instances = list(self.optimize_queryset(queryset, serializer))
+            data[key] = serializer_class(
+                instances, many=True, context=self.get_serializer_context()
+            ).data
+            # deleted since the change was recorded, its tombstone follows
+            found = {instance.id for instance in instances}
+            deleted[key] = [change.object_id for change in changed[label]
+                            if change.deleted or change.object_id not in found]
+        data['deleted'] = deleted
+        return Response(data)
+
+
+@extend_schema(responses=MobileSerializers.BatchResponseSerializer)
+class BatchView(MessagePackMixin, generics.GenericAPIView):
+    """run several mobile app requests in one round trip"""
+    serializer_class = MobileSerializers.BatchSerializer
+    authentication_classes = [authentication.TokenAuthentication]
 
+    def post(self, request, *args, **kwargs):
+        """run the sub-requests and return their responses in order,
+        every sub-request is checked like a direct call of its route"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses = batch.run_batch(request,
+                                    serializer.validated_data['requests'],
+                                    serializer.validated_data['parallel'])
+        return Response({'responses': responses})
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class NotificationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notification'
+
+    def ready(self):
+        """announce the new notifications to the streams"""
+        from django.db.models.signals import post_save
+        from notification.events import notification_saved
+        from notification.models import Notification
+
+        post_save.connect(notification_saved, sender=Notification)
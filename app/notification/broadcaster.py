@@ -0,0 +1,166 @@
+"""
+In-process broadcaster of the notification events
+
+One connection per worker process and database LISTENs on the
+notification channel, the notifications of a branch with its own
+database are announced there. The event loop watches its socket, so
+waiting costs no thread, and the new notifications are read once and
+put in the queue of every connected client of their branch. A client
+that does not keep up is dropped and resumes from its Last-Event-ID when
+it reconnects.
+"""
+
+import asyncio
+import contextvars
+import logging
+
+import psycopg2
+from django.db import connections
+from django.db.models import Max
+
+from core.utils import run_sync
+from notification.events import CHANNEL, fetch_events
+from notification.models import Notification
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+RECONNECT_SECONDS = (1, 2, 5, 10, 30)
+
+
+class Broadcaster:
+    """fan out the notifications announced on a channel
+    to the subscribed queues"""
+
+    def __init__(self, channel=CHANNEL, using='default'):
+        self.channel = channel
+        self.using = using
+        # queue: branch id of the subscriber, None for every branch
+        self.subscribers = {}
+        self.connection = None
+        self.loop = None
+        self.last_id = None
+        self.pending = []
+        self.fetching = False
+
+    def subscribe(self, branch_id=None):
+        """return a queue receiving (id, branch id, event) of the new
+        notifications of the branch, None is put in the queue when the
+        subscriber is dropped"""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            # outside the context of the subscriber, the notifications
+            # of every branch are read
+            contextvars.Context().run(loop.create_task, self.connect())
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers[queue] = branch_id
+        return queue
+
+    def unsubscribe(self, queue):
+        """stop sending events to the queue"""
+        self.subscribers.pop(queue, None)
+
+    async def connect(self, attempt=0):
+        """open the LISTEN connection and catch up with
+        the notifications created while disconnected"""
+        try:
+            self.connection = await run_sync(self._listen)
+        except psycopg2.Error:
+            delay = RECONNECT_SECONDS[min(attempt, len(RECONNECT_SECONDS) - 1)]
+            logger.warning('cannot listen to %s, retrying in %ss',
+                           self.channel, delay)
+            self.loop.call_later(delay, self.loop.create_task,
+                                 self.connect(attempt + 1))
+            return
+
+        self.loop.add_reader(self.connection.fileno(), self.on_readable)
+        if self.last_id is None:
+            self.last_id = await run_sync(self._max_id)
+        else:
+            self.schedule_fetch(None)
+
+    def _listen(self):
+        """blocking part of connect()"""
+        params = connections[self.using].get_connection_params()
+        connection = psycopg2.connect(**params)
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _max_id(self):
+        """id of the newest notification"""
+        return (Notification.objects.using(self.using)
+                .aggregate(last_id=Max('id'))['last_id'] or 0)
+
+    def on_readable(self):
+        """read the NOTIFY messages waiting on the connection"""
+        try:
+            self.connection.poll()
+        except psycopg2.Error:
+            logger.warning('lost the connection listening to %s', self.channel)
+            self.loop.remove_reader(self.connection.fileno())
+            self.connection.close()
+            self.loop.create_task(self.connect())
+            return
+
+        ids = [int(notify.payload) for notify in self.connection.notifies]
+        self.connection.notifies.clear()
+        if ids:
+            self.schedule_fetch(ids)
+
+    def schedule_fetch(self, ids):
+        """fetch the announced notifications, None catches up
+        with every notification after the last one seen"""
+        self.pending.append(ids)
+        if not self.fetching:
+            self.fetching = True
+            self.loop.create_task(self.fetch())
+
+    async def fetch(self):
+        """read the pending notifications and queue them"""
+        try:
+            while self.pending:
+                batches, self.pending = self.pending, []
+                if any(ids is None for ids in batches):
+                    events = await run_sync(fetch_events, after=self.last_id,
+                                            limit=None, using=self.using)
+                else:
+                    ids = [i for ids in batches for i in ids]
+                    events = await run_sync(fetch_events, ids=ids,
+                                            limit=None, using=self.using)
+                for event in events:
+                    self.last_id = max(self.last_id or 0, event[0])
+                    self.broadcast(event)
+        except Exception:
+            logger.exception('cannot fetch the notifications')
+        finally:
+            self.fetching = False
+
+    def broadcast(self, event):
+        """put the event in the queues of its branch, dropping the full ones"""
+        _, event_branch, _ = event
+        for queue, branch_id in list(self.subscribers.items()):
+            if branch_id is not None and branch_id != event_branch:
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+# database alias: broadcaster
+_broadcasters = {}
+
+
+def get_broadcaster(using='default'):
+    """the broadcaster of the notifications of a database, started
+    by its first subscriber"""
+    if using not in _broadcasters:
+        _broadcasters[using] = Broadcaster(using=using)
+    return _broadcasters[using]
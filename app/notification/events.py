@@ -0,0 +1,86 @@
+"""
+Notification events
+
+Every saved notification is announced with NOTIFY on the CHANNEL of
+its database, the payload is the notification id. A notification
+coalesced by NotificationManager.notify is announced again, its event
+has the same id and the new count. PostgreSQL delivers
+the message when the transaction commits, a rolled back notification
+is never announced. Producers using bulk_create skip the signals and
+call publish() for the new rows.
+
+The events carry the branch of the course of their notification, a
+stream only sends those of its branch.
+"""
+
+import json
+
+from django.db import connections
+from django.db.models import F
+from rest_framework.renderers import BaseRenderer
+
+from notification.models import Notification
+from notification.serializers import NotificationSerializer
+
+
+CHANNEL = 'notifications'
+
+# seconds an EventSource waits before reconnecting
+RETRY_MS = 3000
+
+
+def publish(notification_ids, using='default'):
+    """announce new notifications to the listening workers"""
+    with connections[using].cursor() as cursor:
+        for notification_id in notification_ids:
+            cursor.execute('SELECT pg_notify(%s, %s)',
+                           [CHANNEL, str(notification_id)])
+
+
+def notification_saved(sender, instance, created, using, **kwargs):
+    """publish the notifications when they are created"""
+    if created:
+        publish([instance.id], using)
+
+
+def format_event(data):
+    """format a notification as a server-sent event"""
+    return (f"id: {data['id']}\n"
+            f"event: notification\n"
+            f"data: {json.dumps(data)}\n\n")
+
+
+def fetch_events(after=None, ids=None, limit=500, using='default'):
+    """return (id, branch id, event) of the notifications after an id
+    or with the given ids, oldest first"""
+    # read from the primary, replicas may not have the new rows yet
+    queryset = (Notification.objects.using(using)
+                .annotate(branch_id=F('course__branch_id')).order_by('id'))
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    notifications = list(queryset[:limit])
+    data = NotificationSerializer(notifications, many=True).data
+    return [(notification.id, notification.branch_id, format_event(item))
+            for notification, item in zip(notifications, data)]
+
+
+def parse_event_id(value):
+    """parse a Last-Event-ID, None when missing or invalid"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class EventStreamRenderer(BaseRenderer):
+    """render already formatted server-sent events"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            # error details
+            data = f'event: error\ndata: {json.dumps(data)}\n\n'
+        return data.encode(self.charset)
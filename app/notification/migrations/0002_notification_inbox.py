@@ -0,0 +1,80 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def merge_open_duplicates(apps, schema_editor):
+    """keep the newest notification of every (course, kind) and
+    count the duplicates in it"""
+    Notification = apps.get_model('notification', 'Notification')
+    table = Notification._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH groups AS (
+                SELECT course_id, kind, max(id) AS keep_id, count(*) AS total
+                FROM {table}
+                GROUP BY course_id, kind
+                HAVING count(*) > 1
+            ), kept AS (
+                UPDATE {table} n SET count = groups.total
+                FROM groups WHERE n.id = groups.keep_id
+            )
+            DELETE FROM {table} n
+            USING groups
+            WHERE n.course_id = groups.course_id
+              AND n.kind = groups.kind
+              AND n.id <> groups.keep_id
+        """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('capacity', 'Capacity')], default='capacity', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='is_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(merge_open_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('course', 'kind'), name='notification_one_open_per_kind'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['id'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('resolved_at__isnull', False)), fields=['resolved_at'], name='notification_resolved_idx'),
+        ),
+    ]
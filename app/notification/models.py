@@ -2,12 +2,76 @@
 Models for the notification API
 """
 
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import Q
+from branch.managers import BranchManager
 from course.models import Course
 
 
+class NotificationManager(BranchManager):
+    """manager coalescing the open notifications, in the branch
+    of their course"""
+    lookup = 'course__branch'
+
+    def notify(self, course, kind, message):
+        """open a notification of this kind for the course, or bump the
+        count of the one already open, return (id, created)"""
+        using = router.db_for_write(self.model)
+        table = self.model._meta.db_table
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {table} (course_id, kind, message, count, is_read,
+                                     created_at, updated_at)
+                VALUES (%s, %s, %s, 1, false, now(), now())
+                ON CONFLICT (course_id, kind) WHERE resolved_at IS NULL
+                DO UPDATE SET count = {table}.count + 1,
+                              message = EXCLUDED.message,
+                              is_read = false,
+                              updated_at = now()
+                RETURNING id, xmax = 0
+            """, [course.id, kind, message])
+            notification_id, created = cursor.fetchone()
+
+        # raw SQL skips post_save, announce the new notification, or the
+        # new count of the coalesced one
+        from notification.events import publish
+        publish([notification_id], using)
+        return notification_id, created
+
+
 class Notification(models.Model):
     """A notificaion in the system"""
 
+    CAPACITY = 'capacity'
+    kind_choices = [
+        (CAPACITY, 'Capacity'),
+    ]
+
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=kind_choices,
+                            default=CAPACITY)
     message = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    objects = NotificationManager()
+
+    class Meta:
+        constraints = [
+            # a single open notification per course and kind
+            models.UniqueConstraint(
+                fields=['course', 'kind'],
+                condition=Q(resolved_at__isnull=True),
+                name='notification_one_open_per_kind',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['id'], condition=Q(is_read=False),
+                         name='notification_unread_idx'),
+            models.Index(fields=['resolved_at'],
+                         condition=Q(resolved_at__isnull=False),
+                         name='notification_resolved_idx'),
+        ]
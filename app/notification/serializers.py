@@ -3,6 +3,8 @@ Serializers for the notification model
 """
 
 
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from notification.models import Notification
 from course.models import Course
@@ -12,7 +14,43 @@ class NotificationSerializer(serializers.ModelSerializer):
     """Serializer to display a notification"""
     class Meta:
         model = Notification
-        fields = ['id', 'message']
+        fields = ['id', 'message', 'course', 'kind', 'count', 'is_read',
+                  'created_at', 'updated_at', 'resolved_at']
+
+
+def apply_descisions(descisions):
+    """close the registration of the courses of the accepted
+    notifications and resolve every notification, in one transaction
+
+    descisions maps notification ids to True (close) or False (keep open),
+    returns the message of every notification"""
+    with transaction.atomic():
+        notifications = {
+            notification.id: notification for notification in
+            Notification.objects.select_for_update(of=('self',))
+            .filter(id__in=descisions, resolved_at__isnull=True)
+        }
+        missing = set(descisions) - set(notifications)
+        if missing:
+            raise serializers.ValidationError(
+                {'notification_id':
+                 f'No open notification with id {sorted(missing)}'}
+            )
+
+        close = [notification.course_id for notification_id, notification
+                 in notifications.items() if descisions[notification_id]]
+        Course.objects.filter(id__in=close).update(registration_open=False,
+                                                   updated_at=timezone.now())
+        Notification.objects.filter(id__in=notifications).update(
+            resolved_at=timezone.now(), is_read=True,
+            updated_at=timezone.now(),
+        )
+
+    return {
+        notification_id: 'registration closed' if close_registration
+        else 'registration still open'
+        for notification_id, close_registration in descisions.items()
+    }
 
 
 class DescisionSerializer(serializers.Serializer):
@@ -26,15 +64,51 @@ class DescisionSerializer(serializers.Serializer):
         """close or keep courses registration
         open based on the descision"""
 
-        notification = Notification.objects.get(id=validated_data['notification_id'])
-        course_id = notification.course.id
-        course = Course.objects.get(id=course_id)
-        if validated_data['descision']:
-            course.registration_open = False
-            course.save()
-            message = 'registration closed'
-            return message
+        messages = apply_descisions(
+            {validated_data['notification_id']: validated_data['descision']}
+        )
+        return messages[validated_data['notification_id']]
+
+
+class BatchDescisionSerializer(serializers.Serializer):
+    """Serializer for answering many notifications at once"""
+
+    descisions = DescisionSerializer(many=True, allow_empty=False)
 
-        message = 'registration still open'
+    def validate_descisions(self, value):
+        """a notification can only be answered once"""
+        ids = [item['notification_id'] for item in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'A notification is answered twice')
+        return value
 
-        return message
\ No newline at end of file
+    def create(self, validated_data):
+        """apply every descision in one transaction"""
+        messages = apply_descisions({
+            item['notification_id']: item['descision']
+            for item in validated_data['descisions']
+        })
+        return [{'notification_id': notification_id, 'message': message}
+                for notification_id, message in messages.items()]
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """Serializer to mark notifications as read"""
+
+    ids = serializers.ListField(child=serializers.IntegerField(),
+                                required=False)
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        """select some notifications or all of them"""
+        if not attrs['all'] and not attrs.get('ids'):
+            raise serializers.ValidationError('Give the ids or all')
+        return attrs
+
+    def create(self, validated_data):
+        """mark the notifications as read, return how many changed"""
+        queryset = Notification.objects.filter(is_read=False)
+        if not validated_data['all']:
+            queryset = queryset.filter(id__in=validated_data['ids'])
+        return queryset.update(is_read=True, updated_at=timezone.now())
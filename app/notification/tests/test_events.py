@@ -0,0 +1,143 @@
+"""
+The notification events, see notification.events and
+notification.broadcaster
+"""
+
+import asyncio
+import json
+import select
+import time
+
+import psycopg2
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from branch.models import Branch
+from course.models import Course
+from notification import broadcaster, events
+from notification.models import Notification
+from teacher.models import Teacher
+
+
+def create_course(name='course', branch=None):
+    teacher = Teacher.objects.create(
+        email=f'{name}@events.test', first_name='Teacher', last_name=name,
+        gender='Male', **({'branch': branch} if branch else {}))
+    return Course.objects.create(name=name, price=100, instructor=teacher,
+                                 **({'branch': branch} if branch else {}))
+
+
+class PublishTests(TransactionTestCase):
+    """the notifications are announced when their transaction commits"""
+
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        self.listener = psycopg2.connect(**connection.get_connection_params())
+        self.listener.set_session(autocommit=True)
+        with self.listener.cursor() as cursor:
+            cursor.execute(f'LISTEN "{events.CHANNEL}"')
+        self.course = create_course()
+
+    def tearDown(self):
+        self.listener.close()
+
+    def announced(self, expected=0):
+        """the ids announced since the last call, waiting a moment for
+        the expected number of them"""
+        ids = []
+        deadline = time.monotonic() + (1 if expected else 0.2)
+        while True:
+            self.listener.poll()
+            ids += [int(notify.payload) for notify in self.listener.notifies]
+            self.listener.notifies.clear()
+            remaining = deadline - time.monotonic()
+            if (expected and len(ids) >= expected) or remaining <= 0:
+                return ids
+            select.select([self.listener], [], [], remaining)
+
+    def test_created_notification(self):
+        with transaction.atomic():
+            notification = Notification.objects.create(course=self.course,
+                                                       message='full')
+            self.assertEqual(self.announced(), [])
+        self.assertEqual(self.announced(1), [notification.id])
+
+    def test_rolled_back_notification(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Notification.objects.create(course=self.course, message='full')
+            raise RuntimeError()
+        self.assertEqual(self.announced(), [])
+
+    def test_coalesced_notification(self):
+        first, _ = Notification.objects.notify(
+            self.course, Notification.CAPACITY, 'full')
+        second, created = Notification.objects.notify(
+            self.course, Notification.CAPACITY, 'still full')
+        self.assertFalse(created)
+        self.assertEqual(self.announced(2), [first, second])
+
+
+class FetchEventsTests(TestCase):
+    """the events read for the announced ids"""
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='other', slug='other')
+        self.course = create_course()
+        self.other = create_course('other', self.branch)
+        self.first = Notification.objects.create(course=self.course,
+                                                 message='first')
+        self.second = Notification.objects.create(course=self.other,
+                                                  message='second')
+
+    def test_after(self):
+        fetched = events.fetch_events(after=self.first.id)
+        self.assertEqual([(id, branch_id) for id, branch_id, _ in fetched],
+                         [(self.second.id, self.branch.id)])
+
+    def test_ids(self):
+        fetched = events.fetch_events(ids=[self.second.id, self.first.id])
+        self.assertEqual([id for id, _, _ in fetched],
+                         [self.first.id, self.second.id])
+
+    def test_event_has_the_count(self):
+        Notification.objects.notify(self.course, Notification.CAPACITY, 'a')
+        Notification.objects.notify(self.course, Notification.CAPACITY, 'b')
+        # coalesced into the open notification of the course
+        _, _, event = events.fetch_events(ids=[self.first.id])[0]
+        lines = event.splitlines()
+        self.assertEqual(lines[1], 'event: notification')
+        data = json.loads(lines[2][len('data: '):])
+        self.assertEqual(lines[0], f'id: {data["id"]}')
+        self.assertEqual((data['count'], data['message']), (3, 'b'))
+        self.assertTrue(event.endswith('\n\n'))
+
+    def test_parse_event_id(self):
+        self.assertEqual(events.parse_event_id('12'), 12)
+        self.assertIsNone(events.parse_event_id('twelve'))
+        self.assertIsNone(events.parse_event_id(None))
+
+
+class BroadcastTests(SimpleTestCase):
+    """the events go to the subscribers of their branch"""
+
+    def test_branches(self):
+        fanout = broadcaster.Broadcaster()
+        first, second, every = (asyncio.Queue() for _ in range(3))
+        fanout.subscribers = {first: 1, second: 2, every: None}
+        fanout.broadcast((10, 1, 'event'))
+        self.assertEqual(first.get_nowait(), (10, 1, 'event'))
+        self.assertTrue(second.empty())
+        self.assertEqual(every.get_nowait(), (10, 1, 'event'))
+
+    def test_slow_subscriber_is_dropped(self):
+        fanout = broadcaster.Broadcaster()
+        slow = asyncio.Queue(1)
+        fanout.subscribers = {slow: None}
+        fanout.broadcast((10, 1, 'event'))
+        fanout.broadcast((11, 1, 'event'))
+        # told to reconnect from its Last-Event-ID
+        self.assertIsNone(slow.get_nowait())
+        self.assertTrue(slow.empty())
+        self.assertNotIn(slow, fanout.subscribers)
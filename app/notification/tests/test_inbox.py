@@ -0,0 +1,189 @@
+"""
+The notification inbox: coalescing, read state and descisions, see
+NotificationManager.notify and notification.serializers
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from course.models import Course, Enrollment
+from course.serializers import notify_capacity
+from notification.models import Notification
+from notification.serializers import apply_descisions
+from schedule.models import ClassRoom
+from teacher.models import Teacher
+
+
+URL = '/api/dashboard/notification/'
+
+
+class InboxTestCase(TestCase):
+
+    def setUp(self):
+        teacher = Teacher.objects.create(
+            email='teacher@inbox.test', first_name='Teacher', last_name='1',
+            gender='Male')
+        self.course, self.other = Course.objects.bulk_create([
+            Course(name=name, price=100, instructor=teacher,
+                   registration_open=True)
+            for name in ('course', 'other')
+        ])
+        staff = get_user_model().objects.create(email='staff@inbox.test',
+                                                is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(staff)
+
+    def notify(self, course=None, message='full'):
+        return Notification.objects.notify(course or self.course,
+                                           Notification.CAPACITY, message)
+
+
+class NotifyTests(InboxTestCase):
+    """one open notification per course and kind"""
+
+    def test_first_notification_is_created(self):
+        notification_id, created = self.notify()
+        self.assertTrue(created)
+        self.assertEqual(Notification.objects.get(id=notification_id).count,
+                         1)
+
+    def test_repeats_are_coalesced(self):
+        notification_id, _ = self.notify(message='first')
+        Notification.objects.filter(id=notification_id).update(is_read=True)
+        same_id, created = self.notify(message='second')
+
+        self.assertEqual((same_id, created), (notification_id, False))
+        notification = Notification.objects.get(id=notification_id)
+        self.assertEqual(notification.count, 2)
+        self.assertEqual(notification.message, 'second')
+        # unread again, the admin has not seen the new registrations
+        self.assertFalse(notification.is_read)
+
+    def test_courses_are_apart(self):
+        first, _ = self.notify()
+        second, created = self.notify(self.other)
+        self.assertTrue(created)
+        self.assertNotEqual(first, second)
+
+    def test_resolved_notification_is_not_reopened(self):
+        first, _ = self.notify()
+        Notification.objects.filter(id=first).update(
+            resolved_at=timezone.now())
+        second, created = self.notify()
+        self.assertTrue(created)
+        self.assertNotEqual(first, second)
+
+    def test_full_course(self):
+        ClassRoom.objects.create(name='room', capacity=2)
+        User = get_user_model()
+        for index in range(3):
+            Enrollment.objects.create(
+                course=self.course,
+                student=User.objects.create(email=f'{index}@inbox.test'))
+            notify_capacity(self.course)
+
+        notification = Notification.objects.get(course=self.course)
+        self.assertEqual(notification.count, 2)
+        self.assertTrue(notification.message.startswith('3 students'))
+
+
+class ReadStateTests(InboxTestCase):
+    """the admin marks notifications as read"""
+
+    def setUp(self):
+        super().setUp()
+        self.first, _ = self.notify()
+        self.second, _ = self.notify(self.other)
+
+    def unread(self):
+        return self.client.get(f'{URL}unread_count/').json()['unread']
+
+    def test_mark_some(self):
+        response = self.client.post(f'{URL}mark_read/',
+                                    {'ids': [self.first]}, format='json')
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertEqual(self.unread(), 1)
+        listed = self.client.get(URL, {'is_read': 'false'}).json()
+        self.assertEqual([item['id'] for item in listed], [self.second])
+
+    def test_mark_all(self):
+        response = self.client.post(f'{URL}mark_read/', {'all': True},
+                                    format='json')
+        self.assertEqual(response.json(), {'updated': 2})
+        self.assertEqual(self.unread(), 0)
+
+    def test_mark_nothing(self):
+        response = self.client.post(f'{URL}mark_read/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DescisionTests(InboxTestCase):
+    """the descisions close the registrations and resolve the
+    notifications once"""
+
+    def setUp(self):
+        super().setUp()
+        self.first, _ = self.notify()
+        self.second, _ = self.notify(self.other)
+
+    def assert_open(self, course, is_open):
+        course.refresh_from_db()
+        self.assertEqual(course.registration_open, is_open)
+
+    def test_descisions(self):
+        messages = apply_descisions({self.first: True, self.second: False})
+        self.assertEqual(messages, {self.first: 'registration closed',
+                                    self.second: 'registration still open'})
+        self.assert_open(self.course, False)
+        self.assert_open(self.other, True)
+        self.assertFalse(Notification.objects.filter(
+            resolved_at__isnull=True).exists())
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_descision_is_applied_once(self):
+        response = self.client.post(f'{URL}descision/', {
+            'notification_id': self.first, 'descision': True}, format='json')
+        self.assertEqual(response.json(), {'message': 'registration closed'})
+        Course.objects.filter(id=self.course.id).update(
+            registration_open=True)
+
+        response = self.client.post(f'{URL}descision/', {
+            'notification_id': self.first, 'descision': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+        # reopened since, the replayed descision does not close it again
+        self.assert_open(self.course, True)
+
+    def test_batch_is_all_or_nothing(self):
+        apply_descisions({self.second: False})
+        response = self.client.post(f'{URL}batch_descision/', {'descisions': [
+            {'notification_id': self.first, 'descision': True},
+            {'notification_id': self.second, 'descision': True},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assert_open(self.course, True)
+        self.assertTrue(Notification.objects.filter(
+            id=self.first, resolved_at__isnull=True).exists())
+
+    def test_batch(self):
+        response = self.client.post(f'{URL}batch_descision/', {'descisions': [
+            {'notification_id': self.first, 'descision': True},
+            {'notification_id': self.second, 'descision': False},
+        ]}, format='json')
+        self.assertEqual(response.json(), {'results': [
+            {'notification_id': self.first, 'message': 'registration closed'},
+            {'notification_id': self.second,
+             'message': 'registration still open'},
+        ]})
+        self.assert_open(self.course, False)
+        listed = self.client.get(URL, {'resolved': 'false'}).json()
+        self.assertEqual(listed, [])
+
+    def test_batch_answers_a_notification_once(self):
+        response = self.client.post(f'{URL}batch_descision/', {'descisions': [
+            {'notification_id': self.first, 'descision': True},
+            {'notification_id': self.first, 'descision': False},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assert_open(self.course, True)
@@ -0,0 +1,140 @@
+"""
+In-memory recommendation index of a worker
+
+Every process keeps the neighbours and the tags of all the courses in
+compact arrays and reloads the rows recomputed since its last load at
+most every RECOMMENDATION_REFRESH_SECONDS. A recommendation then reads
+the database only for the courses of the student and the candidates.
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+
+from course.models import Archive, Course
+from recommendation.models import CourseNeighbours
+
+
+# rows committed late by a slow refresh are picked up by the next reload
+RELOAD_OVERLAP = timedelta(seconds=60)
+CO_ENROLLMENT_WEIGHT = 1.0
+TAG_WEIGHT = 0.5
+# candidates scored per recommended course, the closed ones are dropped
+CANDIDATES = 3
+
+
+class SimilarityIndex:
+    """the neighbours of every course, the tags of every course and the
+    courses of every tag
+
+    readers never lock, a reload replaces the entries it changes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """forget every course, the next refresh loads them all"""
+        self.neighbours = {}
+        self.tags = {}
+        self.tag_courses = {}
+        self.loaded_until = None
+        self.checked_at = None
+
+    def stale(self):
+        """the index was not reloaded for RECOMMENDATION_REFRESH_SECONDS"""
+        max_age = settings.RECOMMENDATION_REFRESH_SECONDS
+        return (self.checked_at is None or
+                time.monotonic() - self.checked_at >= max_age)
+
+    def refresh(self, force=False):
+        """load the rows recomputed since the last load"""
+        if not force and not self.stale():
+            return 0
+        with self.lock:
+            if not force and not self.stale():
+                return 0
+            queryset = CourseNeighbours.objects.all()
+            if self.loaded_until is not None:
+                queryset = queryset.filter(
+                    updated_at__gt=self.loaded_until - RELOAD_OVERLAP)
+            rows = list(queryset.values_list('course_id', 'similar_ids',
+                                             'scores', 'tags', 'updated_at'))
+            for course_id, similar, scores, tags, updated_at in rows:
+                self.load(course_id, similar, scores, tags)
+                if self.loaded_until is None or updated_at > self.loaded_until:
+                    self.loaded_until = updated_at
+            self.checked_at = time.monotonic()
+            return len(rows)
+
+    def load(self, course_id, similar, scores, tags):
+        """replace the entries of a course"""
+        self.neighbours[course_id] = (array('l', similar), array('f', scores))
+        old = set(self.tags.get(course_id, ()))
+        self.tags[course_id] = array('l', tags)
+        # new sets, a reader may be iterating over the old ones
+        for tag in old.difference(tags):
+            self.tag_courses[tag] = self.tag_courses[tag] - {course_id}
+        for tag in set(tags).difference(old):
+            courses = self.tag_courses.get(tag, frozenset())
+            self.tag_courses[tag] = courses | {course_id}
+
+    def scores(self, history):
+        """score of the courses for a student who took the history
+        courses, the co-enrollment scores plus the share of the tags of
+        the history each course has"""
+        scores = {}
+        for course_id in history:
+            similar, weights = self.neighbours.get(course_id, ((), ()))
+            for other, weight in zip(similar, weights):
+                scores[other] = (scores.get(other, 0.0)
+                                 + CO_ENROLLMENT_WEIGHT * weight)
+
+        tag_counts = Counter(tag for course_id in history
+                             for tag in self.tags.get(course_id, ()))
+        total = sum(tag_counts.values())
+        for tag, count in tag_counts.items():
+            share = TAG_WEIGHT * count / total
+            for other in self.tag_courses.get(tag, ()):
+                scores[other] = scores.get(other, 0.0) + share
+
+        for course_id in history:
+            scores.pop(course_id, None)
+        return scores
+
+    def rank(self, history, limit):
+        """ids of the best courses for the history, best first"""
+        scores = self.scores(history)
+        return heapq.nlargest(
+            limit, scores,
+            key=lambda course_id: (scores[course_id], -course_id))
+
+
+_index = SimilarityIndex()
+
+
+def get_index():
+    """the index of the process, reloaded when stale"""
+    _index.refresh()
+    return _index
+
+
+def history_of(user):
+    """ids of the courses the student takes or took"""
+    enrolled = (Course.objects.filter(enrollments__student=user)
+                .values_list('id', flat=True))
+    archived = (Archive.objects.filter(students=user)
+                .values_list('course_id', flat=True))
+    return set(enrolled.union(archived))
+
+
+def recommend(user, limit):
+    """ids of the candidate courses for the student, best first, and
+    the ids of the courses of the student"""
+    history = history_of(user)
+    return get_index().rank(history, limit * CANDIDATES), history
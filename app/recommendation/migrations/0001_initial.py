@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:15
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('course', '0015_archive_archived_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseNeighbours',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbours', serialize=False, to='course.course')),
+                ('similar_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('scores', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=list, size=None)),
+                ('tags', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DirtyCourse',
+            fields=[
+                ('course_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('dirtied_at', models.DateTimeField()),
+            ],
+        ),
+    ]
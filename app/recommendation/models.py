@@ -0,0 +1,30 @@
+"""
+Models for the course recommendations
+"""
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+from course.models import Course
+
+
+class CourseNeighbours(models.Model):
+    """The courses most often taken with a course and the tags of the
+    course, what the in-memory index of a worker needs to know about it
+
+    rows are computed by recommendation.similarity, the scores are the
+    cosine similarity of the students of both courses"""
+
+    course = models.OneToOneField(Course, on_delete=models.CASCADE,
+                                  primary_key=True, related_name='neighbours')
+    similar_ids = ArrayField(models.IntegerField(), default=list)
+    scores = ArrayField(models.FloatField(), default=list)
+    tags = ArrayField(models.IntegerField(), default=list)
+    updated_at = models.DateTimeField(db_index=True)
+
+
+class DirtyCourse(models.Model):
+    """A course whose students changed since its neighbours were
+    computed, the refresh job only deletes the marks it has seen"""
+
+    course_id = models.BigIntegerField(primary_key=True)
+    dirtied_at = models.DateTimeField()
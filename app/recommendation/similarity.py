@@ -0,0 +1,198 @@
+"""
+Item to item similarity of the courses
+
+Two courses are similar when the same students take them: the score is
+the cosine similarity of their student sets, current enrollments and
+archived runs together. The sparse course x course product is computed
+by PostgreSQL with a self join of the enrollments, only the top
+RECOMMENDATION_NEIGHBOURS of every course are kept.
+
+Enrollment changes mark their courses dirty and queue the refresh job,
+which recomputes the dirty courses and every course sharing a student
+with them or listing them as a neighbour.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from course.models import Archive, Course, Enrollment
+from recommendation.models import CourseNeighbours, DirtyCourse
+
+
+def _enrolled_sql():
+    """(course_id, user_id) of the current and archived students"""
+    return f"""
+        SELECT course_id, student_id AS user_id
+        FROM {Enrollment._meta.db_table}
+        UNION
+        SELECT archive.course_id, archived.user_id
+        FROM {Archive._meta.db_table} archive
+        JOIN {Archive.students.through._meta.db_table} archived
+          ON archived.archive_id = archive.id
+    """
+
+
+def neighbours_sql():
+    """top neighbours and scores of the courses in %(ids)s"""
+    return f"""
+        WITH enrolled AS ({_enrolled_sql()}),
+        sizes AS (
+            SELECT course_id, count(*) AS size FROM enrolled GROUP BY course_id
+        ),
+        pairs AS (
+            SELECT a.course_id, b.course_id AS similar_id,
+                   count(*) AS together
+            FROM enrolled a
+            JOIN enrolled b
+              ON b.user_id = a.user_id AND b.course_id <> a.course_id
+            WHERE a.course_id = ANY(%(ids)s)
+            GROUP BY a.course_id, b.course_id
+        ),
+        ranked AS (
+            SELECT pairs.course_id, pairs.similar_id, score,
+                   row_number() OVER (
+                       PARTITION BY pairs.course_id
+                       ORDER BY score DESC, pairs.similar_id
+                   ) AS rank
+            FROM pairs
+            JOIN sizes a ON a.course_id = pairs.course_id
+            JOIN sizes b ON b.course_id = pairs.similar_id,
+            LATERAL (
+                SELECT pairs.together / sqrt(a.size * b.size) AS score
+            ) cosine
+        )
+        SELECT course_id, array_agg(similar_id ORDER BY rank),
+               array_agg(score ORDER BY rank)
+        FROM ranked WHERE rank <= %(limit)s
+        GROUP BY course_id
+    """
+
+
+def affected_sql():
+    """courses whose neighbours change with the courses in %(ids)s"""
+    return f"""
+        WITH enrolled AS ({_enrolled_sql()})
+        SELECT DISTINCT b.course_id
+        FROM enrolled a JOIN enrolled b ON b.user_id = a.user_id
+        WHERE a.course_id = ANY(%(ids)s)
+        UNION
+        SELECT course_id FROM {CourseNeighbours._meta.db_table}
+        WHERE similar_ids && %(ids)s::integer[]
+        UNION
+        SELECT unnest(%(ids)s::integer[])
+    """
+
+
+def compute(course_ids):
+    """recompute and save the neighbours of the courses"""
+    if not course_ids:
+        return 0
+    using = router.db_for_write(CourseNeighbours)
+    with connections[using].cursor() as cursor:
+        cursor.execute(neighbours_sql(), {
+            'ids': list(course_ids),
+            'limit': settings.RECOMMENDATION_NEIGHBOURS,
+        })
+        neighbours = {course_id: (similar, scores)
+                      for course_id, similar, scores in cursor}
+
+    tags = {}
+    for course_id, tag_id in (Course.tags.through.objects.using(using)
+                              .filter(course_id__in=course_ids)
+                              .values_list('course_id', 'tag_id')):
+        tags.setdefault(course_id, []).append(tag_id)
+
+    existing = list(Course.objects.using(using).filter(id__in=course_ids)
+                    .values_list('id', flat=True))
+    rows = [(course_id, *neighbours.get(course_id, ([], [])),
+             sorted(tags.get(course_id, [])))
+            for course_id in existing]
+    if not rows:
+        return 0
+    table = CourseNeighbours._meta.db_table
+    values = ', '.join(['(%s, %s::integer[], %s::float8[], %s::integer[], '
+                        'clock_timestamp())'] * len(rows))
+    with connections[using].cursor() as cursor:
+        # clock_timestamp, the indexes reload the rows of the last seconds
+        cursor.execute(f"""
+            INSERT INTO {table}
+                (course_id, similar_ids, scores, tags, updated_at)
+            VALUES {values}
+            ON CONFLICT (course_id) DO UPDATE
+            SET similar_ids = EXCLUDED.similar_ids, scores = EXCLUDED.scores,
+                tags = EXCLUDED.tags, updated_at = EXCLUDED.updated_at
+        """, [value for row in rows for value in row])
+    return len(rows)
+
+
+def mark_dirty(course_ids):
+    """the students of the courses changed, refresh their neighbours"""
+    from recommendation.tasks import refresh_neighbours
+
+    using = router.db_for_write(DirtyCourse)
+    table = DirtyCourse._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} (course_id, dirtied_at)
+            SELECT id, clock_timestamp() FROM unnest(%s::bigint[]) AS id
+            ON CONFLICT (course_id)
+            DO UPDATE SET dirtied_at = EXCLUDED.dirtied_at
+        """, [sorted(set(course_ids))])
+    # a burst of enrollments is refreshed by a single job
+    delay = timedelta(seconds=settings.RECOMMENDATION_DELAY_SECONDS)
+    refresh_neighbours.enqueue(
+        key='recommendation.refresh',
+        run_at=timezone.now() + delay,
+    )
+
+
+def clear_marks(marks, using='default'):
+    """delete the seen marks, the marks set again meanwhile stay"""
+    if not marks:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"""
+            DELETE FROM {DirtyCourse._meta.db_table} dirty
+            USING unnest(%s::bigint[], %s::timestamptz[])
+                  AS seen(course_id, dirtied_at)
+            WHERE dirty.course_id = seen.course_id
+              AND dirty.dirtied_at = seen.dirtied_at
+        """, [[course_id for course_id, _ in marks],
+              [dirtied_at for _, dirtied_at in marks]])
+
+
+def refresh_dirty():
+    """recompute the neighbours affected by the dirty courses until no
+    course is dirty, return the number of recomputed courses"""
+    using = router.db_for_write(DirtyCourse)
+    refreshed = 0
+    while True:
+        marks = list(DirtyCourse.objects.using(using)
+                     .values_list('course_id', 'dirtied_at'))
+        if not marks:
+            return refreshed
+        with connections[using].cursor() as cursor:
+            cursor.execute(affected_sql(),
+                           {'ids': [course_id for course_id, _ in marks]})
+            affected = [course_id for course_id, in cursor]
+        with transaction.atomic(using=using):
+            refreshed += compute(affected)
+            clear_marks(marks, using)
+
+
+def refresh_all(chunk_size=500):
+    """recompute the neighbours of every course"""
+    using = router.db_for_write(DirtyCourse)
+    marks = list(DirtyCourse.objects.using(using)
+                 .values_list('course_id', 'dirtied_at'))
+    ids = list(Course.objects.using(using).order_by('id')
+               .values_list('id', flat=True))
+    refreshed = 0
+    for start in range(0, len(ids), chunk_size):
+        with transaction.atomic(using=using):
+            refreshed += compute(ids[start:start + chunk_size])
+    clear_marks(marks, using)
+    return refreshed
@@ -0,0 +1,15 @@
+"""
+Background tasks of the recommendations
+"""
+
+from job.registry import task
+from recommendation import similarity
+
+
+@task('recommendation.refresh')
+def refresh_neighbours(full=False):
+    """recompute the neighbours of the dirty courses, or of every
+    course, return the number of recomputed courses"""
+    if full:
+        return similarity.refresh_all()
+    return similarity.refresh_dirty()
@@ -0,0 +1,181 @@
+"""
+The course recommendations, see recommendation.similarity and
+recommendation.index
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from course.models import Archive, Course, Enrollment, Tag
+from job.models import Job
+from recommendation import index as recommendations, similarity
+from recommendation.models import CourseNeighbours, DirtyCourse
+from teacher.models import Teacher
+
+
+class RecommendationTestCase(TestCase):
+    """courses a and b are taken by the same 2 students, c shares one
+    of them, d shares a tag with a and e is taken by another student"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = User.objects.bulk_create([
+            User(email=f'student{index}@recommend.test')
+            for index in range(4)
+        ])
+        teacher = Teacher.objects.create(
+            email='teacher@recommend.test', first_name='Teacher',
+            last_name='Recommend', gender='Male')
+        self.a, self.b, self.c, self.d, self.e = Course.objects.bulk_create([
+            Course(name=name, price=100, instructor=teacher,
+                   registration_open=True, ranking_score=score)
+            for name, score in zip('abcde', [5, 4, 3, 2, 1])
+        ])
+        self.tag, other = Tag.objects.bulk_create([Tag(name='shared'),
+                                                   Tag(name='other')])
+        self.a.tags.add(self.tag)
+        self.d.tags.add(self.tag)
+        self.b.tags.add(other)
+        first, second, third, fourth = self.users
+        self.enroll(self.a, first, second)
+        self.enroll(self.b, first, second)
+        self.enroll(self.c, second, third)
+        self.enroll(self.e, fourth)
+        self.courses = [self.a, self.b, self.c, self.d, self.e]
+
+    def enroll(self, course, *students):
+        Enrollment.objects.bulk_create([
+            Enrollment(course=course, student=student)
+            for student in students
+        ])
+
+    def neighbours(self, course):
+        row = CourseNeighbours.objects.get(course=course)
+        return dict(zip(row.similar_ids, row.scores))
+
+
+class SimilarityTests(RecommendationTestCase):
+    """the neighbours computed by PostgreSQL"""
+
+    def test_cosine(self):
+        similarity.compute([course.id for course in self.courses])
+        self.assertEqual(self.neighbours(self.a),
+                         {self.b.id: 1.0, self.c.id: 0.5})
+        self.assertEqual(self.neighbours(self.d), {})
+        self.assertEqual(CourseNeighbours.objects.get(course=self.d).tags,
+                         [self.tag.id])
+
+    @override_settings(RECOMMENDATION_NEIGHBOURS=1)
+    def test_top_neighbours(self):
+        similarity.compute([self.a.id])
+        self.assertEqual(self.neighbours(self.a), {self.b.id: 1.0})
+
+    def test_archived_students(self):
+        archive = Archive.objects.create(
+            course=self.e, course_version=1, course_price=100,
+            total_earnings=100, total_students=1)
+        archive.students.add(self.users[0])
+        similarity.compute([self.e.id])
+        # the archived and the current student of e
+        self.assertEqual(self.neighbours(self.e),
+                         {self.a.id: 0.5, self.b.id: 0.5})
+
+    def test_refresh_dirty(self):
+        similarity.refresh_all()
+        self.enroll(self.e, self.users[1])
+        similarity.mark_dirty([self.e.id, self.e.id])
+        similarity.mark_dirty([self.e.id])
+        # a single refresh job for the burst
+        self.assertEqual(
+            Job.objects.filter(name='recommendation.refresh').count(), 1)
+
+        # e and the courses sharing a student with it
+        self.assertEqual(similarity.refresh_dirty(), 4)
+        self.assertFalse(DirtyCourse.objects.exists())
+        self.assertIn(self.e.id, self.neighbours(self.a))
+        self.assertIn(self.e.id, self.neighbours(self.c))
+
+    def test_marks_set_again_stay(self):
+        similarity.mark_dirty([self.a.id])
+        seen = list(DirtyCourse.objects.values_list('course_id',
+                                                    'dirtied_at'))
+        similarity.mark_dirty([self.a.id])
+        similarity.clear_marks(seen)
+        self.assertTrue(DirtyCourse.objects.filter(course_id=self.a.id)
+                        .exists())
+
+    def test_deleted_course(self):
+        similarity.refresh_all()
+        self.b.delete()
+        self.assertEqual(similarity.compute([self.a.id, 0]), 1)
+        self.assertEqual(self.neighbours(self.a), {self.c.id: 0.5})
+
+
+class IndexTests(RecommendationTestCase):
+    """the in-memory index of a worker"""
+
+    def setUp(self):
+        super().setUp()
+        similarity.refresh_all()
+        self.index = recommendations.SimilarityIndex()
+        self.index.refresh()
+
+    def test_scores(self):
+        scores = self.index.scores({self.a.id})
+        # co-enrollment plus the shared tag
+        self.assertEqual(scores, {self.b.id: 1.0, self.c.id: 0.5,
+                                  self.d.id: 0.5})
+        self.assertEqual(self.index.rank({self.a.id}, 2),
+                         [self.b.id, self.c.id])
+
+    def test_reload(self):
+        # not stale yet
+        self.assertEqual(self.index.refresh(), 0)
+        self.d.tags.clear()
+        similarity.compute([self.d.id])
+        self.index.refresh(force=True)
+        self.assertEqual(self.index.tag_courses[self.tag.id],
+                         frozenset({self.a.id}))
+        self.assertNotIn(self.d.id, self.index.scores({self.a.id}))
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class RecommendationViewTests(RecommendationTestCase):
+    """the recommendations of the mobile app"""
+
+    def setUp(self):
+        super().setUp()
+        similarity.refresh_all()
+        recommendations._index.reset()
+        self.addCleanup(recommendations._index.reset)
+        self.client = APIClient()
+
+    def recommend(self, user, limit=10):
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            f'/api/mobile-app/recommendations/?limit={limit}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()]
+
+    def test_history(self):
+        # the candidates of a and b, then the best ranked ones
+        self.assertEqual(self.recommend(self.users[0]),
+                         [self.c.id, self.d.id, self.e.id])
+
+    def test_closed_candidates(self):
+        Course.objects.filter(id=self.c.id).update(registration_open=False)
+        self.assertEqual(self.recommend(self.users[0]),
+                         [self.d.id, self.e.id])
+
+    def test_no_history(self):
+        student = get_user_model().objects.create(email='new@recommend.test')
+        self.assertEqual(self.recommend(student, limit=2),
+                         [self.a.id, self.b.id])
+
+    def test_invalid_limit(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(
+            '/api/mobile-app/recommendations/?limit=many')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenCourse',
+            fields=[
+                ('course_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('dimensions', models.JSONField(default=list)),
+                ('paid_students', models.IntegerField(default=0)),
+                ('earnings', models.DecimalField(decimal_places=5, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Rollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('teacher', 'Teacher'), ('course', 'Course'), ('level', 'Level'), ('tag', 'Tag')], max_length=10)),
+                ('key', models.CharField(max_length=64)),
+                ('label', models.CharField(max_length=255)),
+                ('period', models.DateField(blank=True, null=True)),
+                ('earnings', models.DecimalField(decimal_places=5, default=0, max_digits=16)),
+                ('paid_students', models.IntegerField(default=0)),
+                ('archives', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='rollup',
+            index=models.Index(fields=['dimension', 'period'], name='rollup_report_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('period__isnull', False)), fields=('dimension', 'key', 'period'), name='rollup_one_per_period'),
+        ),
+        migrations.AddConstraint(
+            model_name='rollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('period__isnull', True)), fields=('dimension', 'key'), name='rollup_one_open'),
+        ),
+    ]
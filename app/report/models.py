@@ -0,0 +1,64 @@
+"""
+Models for the dashboard reports
+"""
+
+from django.db import models
+from django.db.models import Q
+
+
+class Rollup(models.Model):
+    """Earnings and paid students of a teacher, course, level or tag
+
+    a row with a period (the first day of a month) adds up the archives
+    of the month, the row without period holds the paid students of the
+    courses still running. Rows are maintained by report.rollups and
+    recomputed by the rebuild_rollups command."""
+
+    TEACHER = 'teacher'
+    COURSE = 'course'
+    LEVEL = 'level'
+    TAG = 'tag'
+    dimension_choices = [
+        (TEACHER, 'Teacher'),
+        (COURSE, 'Course'),
+        (LEVEL, 'Level'),
+        (TAG, 'Tag'),
+    ]
+
+    dimension = models.CharField(max_length=10, choices=dimension_choices)
+    key = models.CharField(max_length=64)
+    label = models.CharField(max_length=255)
+    period = models.DateField(null=True, blank=True)
+    earnings = models.DecimalField(decimal_places=5, max_digits=16, default=0)
+    paid_students = models.IntegerField(default=0)
+    archives = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dimension', 'key', 'period'],
+                condition=Q(period__isnull=False),
+                name='rollup_one_per_period',
+            ),
+            models.UniqueConstraint(
+                fields=['dimension', 'key'],
+                condition=Q(period__isnull=True),
+                name='rollup_one_open',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'period'],
+                         name='rollup_report_idx'),
+        ]
+
+
+class OpenCourse(models.Model):
+    """What the paid students of a course added to the open rollups,
+    so the next refresh can take it back. The course id is not a
+    foreign key, the row outlives a deleted course until its refresh."""
+
+    course_id = models.BigIntegerField(primary_key=True)
+    # [dimension, key, label] of every rollup the course was booked in
+    dimensions = models.JSONField(default=list)
+    paid_students = models.IntegerField(default=0)
+    earnings = models.DecimalField(decimal_places=5, max_digits=16, default=0)
@@ -0,0 +1,140 @@
+"""
+Incremental maintenance of the report rollups
+
+book_archive() adds an ended course to the rollups of its month and
+refresh_open() recomputes the paid students of courses whose
+enrollments, paid flags or price changed, moving the difference into
+the open rollups. Both add deltas with an upsert, so concurrent
+bookings add up instead of overwriting each other.
+"""
+
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from course.models import Archive, Course
+from report.models import OpenCourse, Rollup
+
+
+def month_of(value):
+    """first day of the month of a datetime"""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def course_dimensions(course):
+    """[dimension, key, label] of every rollup a course is reported in,
+    the instructor and the tags are expected to be loaded"""
+    dimensions = [
+        [Rollup.COURSE, str(course.id), course.name],
+        [Rollup.TEACHER, str(course.instructor_id), str(course.instructor)],
+        [Rollup.LEVEL, course.level, course.get_level_display()],
+    ]
+    dimensions += [[Rollup.TAG, str(tag.id), tag.name]
+                   for tag in course.tags.all()]
+    return dimensions
+
+
+def add(deltas, dimensions, earnings, paid_students, archives=0, period=None):
+    """add amounts to the deltas of the dimensions, keyed by
+    (dimension, key, period) and holding [label, earnings, paid, archives]"""
+    for dimension, key, label in dimensions:
+        delta = deltas.setdefault((dimension, key, period),
+                                  [label, Decimal(0), 0, 0])
+        delta[0] = label
+        delta[1] += earnings
+        delta[2] += paid_students
+        delta[3] += archives
+
+
+def book(deltas, using=None):
+    """add the deltas to the rollups"""
+    rows = [(dimension, key, label, period, *amounts)
+            for (dimension, key, period), (label, *amounts) in deltas.items()
+            if any(amounts)]
+    using = using or router.db_for_write(Rollup)
+    table = Rollup._meta.db_table
+    with connections[using].cursor() as cursor:
+        for closed, target in (
+                (True, '(dimension, key, period) WHERE period IS NOT NULL'),
+                (False, '(dimension, key) WHERE period IS NULL')):
+            batch = [row for row in rows if (row[3] is not None) == closed]
+            if not batch:
+                continue
+            values = ', '.join(['(%s, %s, %s, %s::date, %s, %s, %s)']
+                               * len(batch))
+            cursor.execute(f"""
+                INSERT INTO {table} (dimension, key, label, period, earnings,
+                                     paid_students, archives)
+                VALUES {values}
+                ON CONFLICT {target}
+                DO UPDATE SET
+                    label = EXCLUDED.label,
+                    earnings = {table}.earnings + EXCLUDED.earnings,
+                    paid_students = {table}.paid_students
+                                    + EXCLUDED.paid_students,
+                    archives = {table}.archives + EXCLUDED.archives
+            """, [value for row in batch for value in row])
+
+
+def courses_for_rollups(queryset):
+    """courses with what course_dimensions() and the open rollups read"""
+    paid = Count('enrollments', filter=Q(enrollments__paid=True))
+    return (queryset.select_related('instructor').prefetch_related('tags')
+            .annotate(paid=paid))
+
+
+def archive_deltas(archives):
+    """deltas of archives loaded with their course, instructor and tags"""
+    deltas = {}
+    for archive in archives:
+        add(deltas, course_dimensions(archive.course),
+            archive.total_earnings, archive.total_students, 1,
+            month_of(archive.archived_at))
+    return deltas
+
+
+def book_archive(archive):
+    """add an archive to the rollups of its month"""
+    archive = (Archive.objects.select_related('course__instructor')
+               .prefetch_related('course__tags').get(id=archive.id))
+    book(archive_deltas([archive]))
+
+
+def open_booking(course):
+    """what the paid students of a course add to the open rollups"""
+    return OpenCourse(course_id=course.id,
+                      dimensions=course_dimensions(course),
+                      paid_students=course.paid,
+                      earnings=course.paid * course.price)
+
+
+def refresh_open(course_ids):
+    """book the difference between the paid students of the courses
+    and what they added to the open rollups before"""
+    course_ids = sorted(set(course_ids))
+    with transaction.atomic():
+        # the booking rows serialize the refreshes of a course
+        OpenCourse.objects.bulk_create(
+            [OpenCourse(course_id=course_id) for course_id in course_ids],
+            ignore_conflicts=True,
+        )
+        bookings = list(OpenCourse.objects.select_for_update()
+                        .filter(course_id__in=course_ids)
+                        .order_by('course_id'))
+        courses = {course.id: course for course in courses_for_rollups(
+            Course.objects.filter(id__in=course_ids))}
+
+        deltas = {}
+        for booking in bookings:
+            add(deltas, booking.dimensions, -booking.earnings,
+                -booking.paid_students)
+            course = courses.get(booking.course_id)
+            if course is None:
+                booking.delete()
+                continue
+            new = open_booking(course)
+            add(deltas, new.dimensions, new.earnings, new.paid_students)
+            new.save()
+        book(deltas)
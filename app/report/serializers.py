@@ -0,0 +1,26 @@
+"""
+Serializers for the dashboard reports
+"""
+
+from rest_framework import serializers
+from report.models import Rollup
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    """query parameters of a report"""
+    by = serializers.ChoiceField(choices=Rollup.dimension_choices,
+                                 default=Rollup.TEACHER)
+    period = serializers.ChoiceField(choices=['month', 'year', 'all'],
+                                     default='month')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+
+class RollupSerializer(serializers.Serializer):
+    """earnings and paid students of a report row"""
+    key = serializers.CharField()
+    label = serializers.CharField()
+    period = serializers.DateField(source='bucket', allow_null=True)
+    earnings = serializers.DecimalField(decimal_places=5, max_digits=16)
+    paid_students = serializers.IntegerField()
+    archives = serializers.IntegerField()
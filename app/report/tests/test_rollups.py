@@ -0,0 +1,212 @@
+"""
+The report rollups, see report.rollups and the rebuild_rollups command
+"""
+
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.management.commands.check_query_budgets import Dataset
+from course.models import Course, Enrollment
+from course.tasks import archive_course
+from report import rollups
+from report.models import OpenCourse, Rollup
+
+
+def snapshot():
+    """the rollups that add something, by (dimension, key, period)"""
+    return {
+        (rollup.dimension, rollup.key, rollup.period): (
+            rollup.label, rollup.earnings, rollup.paid_students,
+            rollup.archives)
+        for rollup in Rollup.objects.all()
+        if rollup.earnings or rollup.paid_students or rollup.archives
+    }
+
+
+class RollupTestCase:
+    """a dataset of 4 courses of 2 teachers, 2 paid students each and
+    2 archives of the first 2 courses, booked as they were created"""
+
+    def setUp(self):
+        self.dataset = Dataset(2)
+        self.course = Course.objects.get(id=self.dataset.ids['course'])
+        self.teacher = str(self.dataset.ids['teacher'])
+        self.month = rollups.month_of(timezone.now())
+
+    def rollup(self, dimension, key, period=None):
+        return Rollup.objects.get(dimension=dimension, key=key,
+                                  period=period)
+
+    def amounts(self, dimension, key, period=None):
+        rollup = self.rollup(dimension, key, period)
+        return rollup.earnings, rollup.paid_students, rollup.archives
+
+
+class IncrementalTests(RollupTestCase, TestCase):
+    """bookings add deltas to the rollups"""
+
+    def test_dataset(self):
+        # 2 courses of the teacher with 2 paid students at 100
+        self.assertEqual(self.amounts(Rollup.TEACHER, self.teacher),
+                         (Decimal(400), 4, 0))
+        # 2 archives of 2 courses of 200 and 2 students each
+        self.assertEqual(
+            self.amounts(Rollup.TEACHER, self.teacher, self.month),
+            (Decimal(800), 8, 4))
+        # every course has both tags
+        self.assertEqual(
+            self.amounts(Rollup.TAG, str(self.dataset.ids['tag'])),
+            (Decimal(800), 8, 0))
+        self.assertEqual(self.rollup(Rollup.LEVEL, 'all_levels').label,
+                         'All_levels')
+
+    def test_paid_flag(self):
+        Enrollment.objects.filter(
+            course=self.course, student=self.dataset.student,
+        ).update(paid=False)
+        rollups.refresh_open([self.course.id])
+        self.assertEqual(self.amounts(Rollup.COURSE, str(self.course.id)),
+                         (Decimal(100), 1, 0))
+        self.assertEqual(self.amounts(Rollup.TEACHER, self.teacher),
+                         (Decimal(300), 3, 0))
+
+        # only the difference is booked
+        rollups.refresh_open([self.course.id, self.course.id])
+        self.assertEqual(self.amounts(Rollup.TEACHER, self.teacher),
+                         (Decimal(300), 3, 0))
+
+    def test_price_and_label(self):
+        Course.objects.filter(id=self.course.id).update(price=150,
+                                                        name='renamed')
+        rollups.refresh_open([self.course.id])
+        rollup = self.rollup(Rollup.COURSE, str(self.course.id))
+        self.assertEqual((rollup.label, rollup.earnings),
+                         ('renamed', Decimal(300)))
+        self.assertEqual(self.amounts(Rollup.TEACHER, self.teacher),
+                         (Decimal(500), 4, 0))
+
+    def test_deleted_course(self):
+        course_id = self.course.id
+        self.course.delete()
+        rollups.refresh_open([course_id])
+        self.assertEqual(self.amounts(Rollup.COURSE, str(course_id)),
+                         (Decimal(0), 0, 0))
+        self.assertEqual(self.amounts(Rollup.TEACHER, self.teacher),
+                         (Decimal(200), 2, 0))
+        self.assertFalse(
+            OpenCourse.objects.filter(course_id=course_id).exists())
+        # the archives stay in their month
+        self.assertEqual(
+            self.amounts(Rollup.TEACHER, self.teacher, self.month),
+            (Decimal(800), 8, 4))
+
+    def test_end_course(self):
+        archive_course(course_id=self.course.id)
+        # the paid students move from the open rollups to the month
+        self.assertEqual(self.amounts(Rollup.TEACHER, self.teacher),
+                         (Decimal(200), 2, 0))
+        self.assertEqual(
+            self.amounts(Rollup.TEACHER, self.teacher, self.month),
+            (Decimal(1000), 10, 5))
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class ReportViewTests(RollupTestCase, TestCase):
+    """the dashboard reports read the rollups"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.dataset.staff)
+
+    def get(self, path):
+        response = self.client.get(f'/api/dashboard/reports/{path}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {row['key']: row for row in response.json()}
+
+    def test_by_period(self):
+        rows = self.get('?by=teacher&period=year')
+        row = rows[self.teacher]
+        self.assertEqual(row['period'],
+                         str(self.month.replace(month=1)))
+        self.assertEqual((Decimal(row['earnings']), row['paid_students'],
+                          row['archives']), (Decimal(800), 8, 4))
+        # the teacher of the other courses has no archive
+        self.assertEqual(len(rows), 1)
+
+        next_month = (self.month.replace(day=28)
+                      + timezone.timedelta(days=4)).replace(day=1)
+        self.assertEqual(self.get(f'?start={next_month}'), {})
+
+    def test_open(self):
+        rows = self.get('open/?by=course')
+        self.assertEqual(len(rows), 4)
+        row = rows[str(self.course.id)]
+        self.assertEqual((row['label'], row['period'], row['paid_students']),
+                         (self.course.name, None, 2))
+
+    def test_reads_the_rollups_only(self):
+        self.get('?by=tag&period=all')
+        Rollup.objects.all().delete()
+        self.assertEqual(self.get('?by=tag&period=all'), {})
+        self.assertEqual(self.get('open/?by=level'), {})
+
+    def test_invalid_dimension(self):
+        response = self.client.get('/api/dashboard/reports/?by=student')
+        self.assertEqual(response.status_code, 400)
+
+
+class RebuildTests(RollupTestCase, TransactionTestCase):
+    """the rebuild reads the chunks from other threads"""
+
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        # the connections of the worker threads close with their chunk
+        self.max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        super().setUp()
+
+    def tearDown(self):
+        connection.settings_dict['CONN_MAX_AGE'] = self.max_age
+
+    def rebuild(self):
+        call_command('rebuild_rollups', workers=3, chunk_size=1,
+                     stdout=StringIO())
+
+    def test_matches_the_bookings(self):
+        Enrollment.objects.filter(
+            course=self.course, student=self.dataset.student,
+        ).update(paid=False)
+        rollups.refresh_open([self.course.id])
+        archive_course(course_id=self.dataset.ids['other_course'])
+        booked = snapshot()
+        bookings = dict(OpenCourse.objects.values_list('course_id',
+                                                       'paid_students'))
+
+        self.rebuild()
+        self.assertEqual(snapshot(), booked)
+        self.assertEqual(
+            dict(OpenCourse.objects.values_list('course_id',
+                                                'paid_students')),
+            {course_id: paid for course_id, paid in bookings.items()
+             if paid})
+
+    def test_from_empty_tables(self):
+        booked = snapshot()
+        Rollup.objects.all().delete()
+        OpenCourse.objects.all().delete()
+        self.rebuild()
+        self.assertEqual(snapshot(), booked)
+
+        # bookings go on from the rebuilt rollups
+        rollups.refresh_open([self.course.id])
+        self.assertEqual(snapshot(), booked)
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:51
+
+import branch.context
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+DAYS = ['saturday', 'sunday', 'monday', 'tuesday', 'wednesday', 'thuresday', 'friday']
+
+
+def merge_schedules(apps, schema_editor):
+    """keep one schedule for the default branch, the first one which
+    was the only one read, with the course times of the others"""
+    Schedule = apps.get_model('schedule', 'Schedule')
+    schedules = list(Schedule.objects.order_by('id'))
+    if len(schedules) < 2:
+        return
+    kept, others = schedules[0], schedules[1:]
+    for day in DAYS:
+        through = getattr(Schedule, day).through
+        course_times = (through.objects.filter(schedule_id__in=[other.id for other in others])
+                        .values_list('coursetime_id', flat=True).distinct())
+        through.objects.bulk_create(
+            [through(schedule_id=kept.id, coursetime_id=id) for id in course_times],
+            ignore_conflicts=True,
+        )
+    Schedule.objects.filter(id__in=[other.id for other in others]).delete()
+
+    # check the deferred foreign keys now, the pending checks would
+    # forbid altering the table in this transaction
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('schedule', '0003_auto_20240214_1912'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classroom',
+            name='branch',
+            field=models.ForeignKey(default=branch.context.branch_of_new_rows, on_delete=django.db.models.deletion.PROTECT, related_name='classrooms', to='branch.branch'),
+        ),
+        migrations.RunPython(merge_schedules, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='schedule',
+            name='branch',
+            field=models.OneToOneField(default=branch.context.branch_of_new_rows, on_delete=django.db.models.deletion.PROTECT, related_name='schedule', to='branch.branch'),
+        ),
+    ]
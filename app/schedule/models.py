@@ -3,18 +3,32 @@ Models for the schedule
 """
 
 from django.db import models
+from branch.context import (branch_of_new_rows, current_branch_id,
+                            default_branch)
+from branch.managers import BranchManager
+from branch.models import Branch
 from course.models import Course
 
 
 class ClassRoom(models.Model):
-    """a classroom in the center"""
+    """a classroom of a branch"""
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT,
+                               related_name='classrooms',
+                               default=branch_of_new_rows)
     name = models.CharField(max_length = 255)
     capacity = models.PositiveIntegerField()
 
+    objects = BranchManager()
+
     def __str__(self):
         return f'{self.name} , {self.capacity}'
 
 
+class CourseTimeManager(BranchManager):
+    """manager of the course times, in the branch of their course"""
+    lookup = 'course__branch'
+
+
 class CourseTime(models.Model):
     """model to distribute courses to classrooms and times"""
     course = models.ForeignKey(
@@ -32,6 +46,8 @@ class CourseTime(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    objects = CourseTimeManager()
+
     def __str__(self):
         return f'{self.course}/{self.classroom}/{self.start_time} : {self.end_time}'
 
@@ -42,8 +58,23 @@ class Day(models.Model):
         return self.name
 
 
+class ScheduleManager(BranchManager):
+    """manager of the schedules, one per branch"""
+
+    def current(self):
+        """the schedule of the current branch, created on first use"""
+        branch_id = current_branch_id()
+        if branch_id is None:
+            branch_id = default_branch().id
+        schedule, _ = self.get_or_create(branch_id=branch_id)
+        return schedule
+
+
 class Schedule(models.Model):
-    """schedule for classrooms and courses"""
+    """schedule for the classrooms and courses of a branch"""
+    branch = models.OneToOneField(Branch, on_delete=models.PROTECT,
+                                  related_name='schedule',
+                                  default=branch_of_new_rows)
     saturday = models.ManyToManyField('CourseTime', blank=True, related_name='saturday_courses')
     sunday = models.ManyToManyField('CourseTime', blank=True, related_name='sunday_courses')
     monday = models.ManyToManyField('CourseTime', blank=True, related_name='monday_courses')
@@ -51,3 +82,5 @@ class Schedule(models.Model):
     wednesday = models.ManyToManyField('CourseTime', blank=True, related_name='wednesday_courses')
     thuresday = models.ManyToManyField('CourseTime', blank=True, related_name='thuresday_courses')
     friday = models.ManyToManyField('CourseTime', blank=True, related_name='friday_courses')
+
+    objects = ScheduleManager()
@@ -21,6 +21,7 @@ class ClassRoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClassRoom
         fields = '__all__'
+        read_only_fields = ['branch']
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -71,7 +72,7 @@ class CourseTimeDaySerializer(serializers.Serializer):
 
 
         if day:
-            schedule_instance = Schedule.objects.first()
+            schedule_instance = Schedule.objects.current()
             schedule_day = getattr(schedule_instance, f"{day.lower()}")
             course_times= schedule_day.filter(classroom=classroom_instance)
             start_time = validated_data['start_time']
@@ -118,6 +119,14 @@ class ScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Schedule
         fields = '__all__'
+        read_only_fields = ['branch']
+
+    def validate(self, attrs):
+        """a branch has one schedule"""
+        if self.instance is None and Schedule.objects.exists():
+            raise serializers.ValidationError(
+                'The branch already has a schedule')
+        return attrs
 
     def to_representation(self, instance):
         """Order CourseTime instances before serializing"""
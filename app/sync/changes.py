@@ -0,0 +1,77 @@
+"""
+Reading the tracked changes
+
+A sync token is "<txid>.<seq>", the transaction and the order inside
+it of the last change a client has seen. Changes are read in that
+order and only once every older transaction is finished (below the
+xmin of the snapshot), so a change committed late by a slow
+transaction can never land behind a token already handed out. A long
+running transaction delays the changes after it, it never loses them.
+
+A client only reads the changes of its branch and of the objects shared
+by every branch, see the branch column of the changes.
+"""
+
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from sync.models import Change
+
+
+INITIAL_TOKEN = (0, 0)
+
+
+def parse_token(value):
+    """parse a sync token, ValueError when invalid"""
+    if not value:
+        return INITIAL_TOKEN
+    txid, seq = (int(part) for part in value.split('.'))
+    if txid < 0 or seq < 0:
+        raise ValueError(value)
+    return txid, seq
+
+
+def format_token(token):
+    """format a (txid, seq) token"""
+    return '%d.%d' % token
+
+
+def visible_changes():
+    """the changes of the finished transactions and of the current one"""
+    horizon = RawSQL('txid_snapshot_xmin(txid_current_snapshot())', [])
+    # a transaction sees its own changes
+    own = RawSQL('txid_current_if_assigned()', [])
+    return Change.objects.filter(Q(txid__lt=horizon) | Q(txid=own))
+
+
+def latest_token(models=None):
+    """token of the last readable change of the models, a catalog
+    version that moves whenever one of their objects changes"""
+    queryset = visible_changes()
+    if models is not None:
+        queryset = queryset.filter(model__in=models)
+    latest = (queryset.order_by('-txid', '-seq')
+              .values_list('txid', 'seq').first())
+    return latest or INITIAL_TOKEN
+
+
+def read_changes(since=INITIAL_TOKEN, limit=500, branch_id=None):
+    """return the changes after the token, oldest first, the
+    token of the last one and whether more changes are waiting,
+    only those seen in the branch when one is given"""
+    txid, seq = since
+    queryset = (visible_changes()
+                .filter(Q(txid__gt=txid) | Q(txid=txid, seq__gt=seq))
+                .order_by('txid', 'seq'))
+    if branch_id is not None:
+        queryset = queryset.filter(Q(branch_id=branch_id)
+                                   | Q(branch__isnull=True))
+    if since == INITIAL_TOKEN:
+        # a new client has nothing to delete
+        queryset = queryset.filter(deleted=False)
+
+    changes = list(queryset[:limit + 1])
+    changes, has_more = changes[:limit], len(changes) > limit
+    if changes:
+        since = (changes[-1].txid, changes[-1].seq)
+    return changes, since, has_more
@@ -0,0 +1,86 @@
+from django.db import migrations
+
+
+# (model label, table, id column, kind) of every tracked table, a
+# change of a relation table is a change of the object it points to
+TRACKED = [
+    ('course.course', 'course_course', 'id', 'object'),
+    ('course.course', 'course_course_tags', 'course_id', 'relation'),
+    ('teacher.teacher', 'teacher_teacher', 'id', 'object'),
+    ('course.tag', 'course_tag', 'id', 'object'),
+    ('course.comment', 'course_comment', 'id', 'object'),
+]
+
+CREATE_FUNCTION = """
+CREATE SEQUENCE sync_change_seq;
+
+CREATE FUNCTION sync_record_change() RETURNS trigger AS $$
+DECLARE
+    row_data jsonb;
+    is_object boolean := TG_ARGV[2] = 'object';
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_data := to_jsonb(OLD);
+    ELSE
+        row_data := to_jsonb(NEW);
+        -- a save changing nothing but updated_at is not a change
+        IF TG_OP = 'UPDATE'
+           AND row_data - 'updated_at' = to_jsonb(OLD) - 'updated_at' THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    INSERT INTO sync_change (model, object_id, deleted, txid, seq, changed_at)
+    VALUES (TG_ARGV[0], (row_data ->> TG_ARGV[1])::bigint,
+            TG_OP = 'DELETE' AND is_object,
+            txid_current(), nextval('sync_change_seq'), now())
+    ON CONFLICT (model, object_id) DO UPDATE
+    SET deleted = EXCLUDED.deleted, txid = EXCLUDED.txid,
+        seq = EXCLUDED.seq, changed_at = EXCLUDED.changed_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION = """
+DROP FUNCTION sync_record_change();
+DROP SEQUENCE sync_change_seq;
+"""
+
+
+def create_triggers():
+    return ''.join(
+        f"CREATE TRIGGER sync_change AFTER INSERT OR UPDATE OR DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION sync_record_change('{label}', '{column}', '{kind}');\n"
+        for label, table, column, kind in TRACKED
+    )
+
+
+def drop_triggers():
+    return ''.join(f'DROP TRIGGER sync_change ON {table};\n'
+                   for _, table, _, _ in TRACKED)
+
+
+def record_existing():
+    """every existing object is a change for the first sync"""
+    return ''.join(
+        f"INSERT INTO sync_change (model, object_id, deleted, txid, seq, changed_at) "
+        f"SELECT '{label}', id, false, txid_current(), nextval('sync_change_seq'), now() "
+        f"FROM {table} ORDER BY id;\n"
+        for label, table, _, kind in TRACKED if kind == 'object'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+        ('course', '0014_updated_at'),
+        ('teacher', '0002_teacher_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_FUNCTION, DROP_FUNCTION),
+        migrations.RunSQL(create_triggers(), drop_triggers()),
+        migrations.RunSQL(record_existing(), 'DELETE FROM sync_change;'),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def create_function(ignored):
+    """sync_record_change() skipping the updates of the ignored columns,
+    which the mobile app never reads"""
+    ignored_sql = ''.join(f" - '{column}'" for column in ignored)
+    return f"""
+CREATE OR REPLACE FUNCTION sync_record_change() RETURNS trigger AS $$
+DECLARE
+    row_data jsonb;
+    is_object boolean := TG_ARGV[2] = 'object';
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_data := to_jsonb(OLD);
+    ELSE
+        row_data := to_jsonb(NEW);
+        -- a save changing nothing but the ignored columns is not a change
+        IF TG_OP = 'UPDATE'
+           AND row_data{ignored_sql} = to_jsonb(OLD){ignored_sql} THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    INSERT INTO sync_change (model, object_id, deleted, txid, seq, changed_at)
+    VALUES (TG_ARGV[0], (row_data ->> TG_ARGV[1])::bigint,
+            TG_OP = 'DELETE' AND is_object,
+            txid_current(), nextval('sync_change_seq'), now())
+    ON CONFLICT (model, object_id) DO UPDATE
+    SET deleted = EXCLUDED.deleted, txid = EXCLUDED.txid,
+        seq = EXCLUDED.seq, changed_at = EXCLUDED.changed_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0002_change_triggers'),
+        ('course', '0016_course_ranking_score'),
+    ]
+
+    operations = [
+        # the ranking moves with every enrollment, the app does not show it
+        migrations.RunSQL(create_function(['updated_at', 'ranking_score']),
+                          create_function(['updated_at'])),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:17
+
+import importlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+initial = importlib.import_module('sync.migrations.0002_change_triggers')
+ignore_ranking_score = importlib.import_module('sync.migrations.0003_ignore_ranking_score')
+
+# the columns the mobile app never reads, see 0003
+IGNORED = ['updated_at', 'ranking_score']
+
+# where the trigger of a table reads the branch of the object, 'branch'
+# for its own column, 'course' for the one of its course, 'shared' for
+# the objects of every branch
+BRANCH_OF = {
+    'course_course': 'branch',
+    'course_course_tags': 'course',
+    'teacher_teacher': 'branch',
+    'course_tag': 'shared',
+    'course_comment': 'course',
+}
+
+IGNORED_SQL = ''.join(f" - '{column}'" for column in IGNORED)
+
+CREATE_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION sync_record_change() RETURNS trigger AS $$
+DECLARE
+    row_data jsonb;
+    is_object boolean := TG_ARGV[2] = 'object';
+    object_branch bigint;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_data := to_jsonb(OLD);
+    ELSE
+        row_data := to_jsonb(NEW);
+        -- a save changing nothing but the ignored columns is not a change
+        IF TG_OP = 'UPDATE'
+           AND row_data{IGNORED_SQL} = to_jsonb(OLD){IGNORED_SQL} THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    object_branch := CASE TG_ARGV[3]
+        WHEN 'branch' THEN (row_data ->> 'branch_id')::bigint
+        WHEN 'course' THEN (SELECT branch_id FROM course_course
+                            WHERE id = (row_data ->> 'course_id')::bigint)
+    END;
+
+    INSERT INTO sync_change (model, object_id, deleted, txid, seq, changed_at, branch_id)
+    VALUES (TG_ARGV[0], (row_data ->> TG_ARGV[1])::bigint,
+            TG_OP = 'DELETE' AND is_object,
+            txid_current(), nextval('sync_change_seq'), now(), object_branch)
+    ON CONFLICT (model, object_id) DO UPDATE
+    SET deleted = EXCLUDED.deleted, txid = EXCLUDED.txid,
+        seq = EXCLUDED.seq, changed_at = EXCLUDED.changed_at,
+        branch_id = EXCLUDED.branch_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def create_triggers():
+    return ''.join(
+        f"CREATE TRIGGER sync_change AFTER INSERT OR UPDATE OR DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION "
+        f"sync_record_change('{label}', '{column}', '{kind}', '{BRANCH_OF[table]}');\n"
+        for label, table, column, kind in initial.TRACKED
+    )
+
+
+# the tombstones keep no branch, a deleted object is unknown to the
+# clients of the other branches
+BACKFILL = """
+UPDATE sync_change SET branch_id = course.branch_id
+FROM course_course course
+WHERE sync_change.model = 'course.course' AND course.id = sync_change.object_id;
+
+UPDATE sync_change SET branch_id = teacher.branch_id
+FROM teacher_teacher teacher
+WHERE sync_change.model = 'teacher.teacher' AND teacher.id = sync_change.object_id;
+
+UPDATE sync_change SET branch_id = course.branch_id
+FROM course_comment comment JOIN course_course course ON course.id = comment.course_id
+WHERE sync_change.model = 'course.comment' AND comment.id = sync_change.object_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('course', '0024_comment_newest_index'),
+        ('teacher', '0003_teacher_branch'),
+        ('sync', '0003_ignore_ranking_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='branch',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='branch.branch'),
+        ),
+        migrations.RunSQL(
+            initial.drop_triggers() + CREATE_FUNCTION + create_triggers(),
+            initial.drop_triggers() + ignore_ranking_score.create_function(IGNORED)
+            + initial.create_triggers(),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
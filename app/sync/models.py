@@ -0,0 +1,35 @@
+"""
+Models for the change tracking of the mobile catalog
+"""
+
+from django.db import models
+
+from branch.models import Branch
+
+
+class Change(models.Model):
+    """The last change of a tracked object
+
+    rows are written by database triggers (see the migrations), so
+    queryset updates, bulk operations and cascades are tracked too.
+    A deleted object keeps its row as a tombstone."""
+
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    # id of the transaction of the change and order inside it
+    txid = models.BigIntegerField()
+    seq = models.BigIntegerField()
+    changed_at = models.DateTimeField()
+    # branch of the object, none for the objects shared by every branch
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True,
+                               related_name='+', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'],
+                                    name='sync_change_one_per_object'),
+        ]
+        indexes = [
+            models.Index(fields=['txid', 'seq'], name='sync_change_token_idx'),
+        ]
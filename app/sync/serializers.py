@@ -0,0 +1,37 @@
+"""
+Serializers for the mobile sync
+"""
+
+from rest_framework import serializers
+from course import serializers as course_serializers
+from teacher import serializers as teacher_serializers
+
+
+# tracked model label: (key in the response, serializer)
+RESOURCES = {
+    'course.course': ('courses', course_serializers.SyncCourseSerializer),
+    'teacher.teacher': ('teachers', teacher_serializers.SyncTeacherSerializer),
+    'course.tag': ('tags', course_serializers.SyncTagSerializer),
+    'course.comment': ('comments', course_serializers.SyncCommentSerializer),
+}
+
+
+class DeletedSerializer(serializers.Serializer):
+    """ids of the deleted objects"""
+    courses = serializers.ListField(child=serializers.IntegerField())
+    teachers = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    comments = serializers.ListField(child=serializers.IntegerField())
+
+
+class SyncSerializer(serializers.Serializer):
+    """Serializer for a page of changes of the mobile catalog"""
+    token = serializers.CharField(
+        help_text='send it back as ?since= on the next sync')
+    has_more = serializers.BooleanField(
+        help_text='sync again right away with the new token')
+    courses = course_serializers.SyncCourseSerializer(many=True)
+    teachers = teacher_serializers.SyncTeacherSerializer(many=True)
+    tags = course_serializers.SyncTagSerializer(many=True)
+    comments = course_serializers.SyncCommentSerializer(many=True)
+    deleted = DeletedSerializer()
@@ -0,0 +1,180 @@
+"""
+The delta sync of the mobile catalog, see sync.changes and
+mobile_app.views.SyncView
+"""
+
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from branch.models import Branch
+from course.models import Course, Tag
+from sync import changes
+from teacher.models import Teacher
+
+
+def tokens(found):
+    return [(change.model, change.object_id, change.deleted)
+            for change in found]
+
+
+class TokenTests(TestCase):
+    """the sync tokens the clients send back"""
+
+    def test_round_trip(self):
+        self.assertEqual(changes.parse_token('12.3'), (12, 3))
+        self.assertEqual(changes.format_token((12, 3)), '12.3')
+        self.assertEqual(changes.parse_token(None), changes.INITIAL_TOKEN)
+
+    def test_invalid(self):
+        for value in ('12', 'a.b', '-1.2', '1.2.3'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                changes.parse_token(value)
+
+
+class ReadChangesTests(TestCase):
+    """the changes after a token, recorded by the triggers"""
+
+    def setUp(self):
+        self.since = changes.latest_token()
+        self.tag = Tag.objects.create(name='python')
+        self.other = Tag.objects.create(name='django')
+
+    def test_created(self):
+        found, token, has_more = changes.read_changes(self.since)
+        self.assertEqual(tokens(found), [('course.tag', self.tag.id, False),
+                                         ('course.tag', self.other.id, False)])
+        self.assertEqual(token, changes.latest_token())
+        self.assertFalse(has_more)
+        self.assertEqual(changes.read_changes(token)[0], [])
+
+    def test_pages(self):
+        found, token, has_more = changes.read_changes(self.since, limit=1)
+        self.assertEqual(tokens(found), [('course.tag', self.tag.id, False)])
+        self.assertTrue(has_more)
+        found, _, has_more = changes.read_changes(token, limit=1)
+        self.assertEqual(tokens(found),
+                         [('course.tag', self.other.id, False)])
+        self.assertFalse(has_more)
+
+    def test_one_change_per_object(self):
+        _, token, _ = changes.read_changes(self.since)
+        self.tag.name = 'python3'
+        self.tag.save()
+        self.tag.name = 'python4'
+        self.tag.save()
+        found, _, _ = changes.read_changes(token)
+        self.assertEqual(tokens(found), [('course.tag', self.tag.id, False)])
+
+    def test_only_updated_at_is_not_a_change(self):
+        _, token, _ = changes.read_changes(self.since)
+        self.tag.save()
+        self.assertEqual(changes.read_changes(token)[0], [])
+
+    def test_tombstones(self):
+        _, token, _ = changes.read_changes(self.since)
+        tag_id = self.tag.id
+        self.tag.delete()
+        found, _, _ = changes.read_changes(token)
+        self.assertEqual(tokens(found), [('course.tag', tag_id, True)])
+
+    def test_initial_token_skips_deletes(self):
+        self.tag.delete()
+        found, _, _ = changes.read_changes(changes.INITIAL_TOKEN)
+        self.assertEqual(tokens(found),
+                         [('course.tag', self.other.id, False)])
+
+
+class BranchChangesTests(TestCase):
+    """a client reads the changes of its branch and the shared ones"""
+
+    def test_branches(self):
+        since = changes.latest_token()
+        other = Branch.objects.create(name='other', slug='other')
+        teacher = Teacher.objects.create(
+            email='teacher@sync.test', first_name='Teacher', last_name='1',
+            gender='Male', branch=other)
+        course = Course.objects.create(name='course', price=100,
+                                       instructor=teacher, branch=other)
+        tag = Tag.objects.create(name='shared')
+        main = Branch.objects.get(slug='main')
+
+        found, _, _ = changes.read_changes(since, branch_id=other.id)
+        self.assertEqual(tokens(found), [
+            ('teacher.teacher', teacher.id, False),
+            ('course.course', course.id, False),
+            ('course.tag', tag.id, False),
+        ])
+        found, _, _ = changes.read_changes(since, branch_id=main.id)
+        self.assertEqual(tokens(found), [('course.tag', tag.id, False)])
+
+    def test_relations_change_their_object(self):
+        teacher = Teacher.objects.create(
+            email='teacher@sync.test', first_name='Teacher', last_name='1',
+            gender='Male')
+        course = Course.objects.create(name='course', price=100,
+                                       instructor=teacher)
+        tag = Tag.objects.create(name='tag')
+        since = changes.latest_token()
+        course.tags.add(tag)
+        found, _, _ = changes.read_changes(since)
+        self.assertEqual(tokens(found), [('course.course', course.id, False)])
+
+
+class LateCommitTests(TransactionTestCase):
+    """a change committed late never lands behind a token"""
+
+    # the branches are created by the migrations
+    serialized_rollback = True
+
+    def test_late_commit(self):
+        since = changes.latest_token()
+        slow = psycopg2.connect(**connection.get_connection_params())
+        try:
+            with slow.cursor() as cursor:
+                # the slow transaction starts first and commits last
+                cursor.execute(
+                    f"INSERT INTO {Tag._meta.db_table} (name, updated_at) "
+                    f"VALUES ('late', now()) RETURNING id")
+                late_id, = cursor.fetchone()
+            early = Tag.objects.create(name='early')
+
+            # the early change waits for the slow transaction
+            found, token, _ = changes.read_changes(since)
+            self.assertEqual(found, [])
+            self.assertEqual(token, since)
+            slow.commit()
+        finally:
+            slow.close()
+
+        found, _, _ = changes.read_changes(token)
+        self.assertEqual(tokens(found), [('course.tag', late_id, False),
+                                         ('course.tag', early.id, False)])
+
+
+class SyncViewTests(TestCase):
+    """the sync endpoint of the mobile app"""
+
+    def setUp(self):
+        student = get_user_model().objects.create(email='student@sync.test')
+        self.client = APIClient()
+        self.client.force_authenticate(student)
+        self.tag = Tag.objects.create(name='python')
+
+    def test_full_download_then_deletes(self):
+        data = self.client.get('/api/mobile-app/sync/').json()
+        self.assertEqual([tag['id'] for tag in data['tags']], [self.tag.id])
+        self.assertEqual(data['deleted']['tags'], [])
+
+        tag_id = self.tag.id
+        self.tag.delete()
+        data = self.client.get('/api/mobile-app/sync/',
+                               {'since': data['token']}).json()
+        self.assertEqual(data['tags'], [])
+        self.assertEqual(data['deleted']['tags'], [tag_id])
+
+    def test_invalid_token(self):
+        response = self.client.get('/api/mobile-app/sync/', {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:51
+
+import branch.context
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('teacher', '0002_teacher_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacher',
+            name='branch',
+            field=models.ForeignKey(db_index=False, default=branch.context.branch_of_new_rows, on_delete=django.db.models.deletion.PROTECT, related_name='teachers', to='branch.branch'),
+        ),
+        migrations.AlterField(
+            model_name='teacher',
+            name='email',
+            field=models.EmailField(max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name='teacher',
+            constraint=models.UniqueConstraint(fields=('branch', 'email'), name='teacher_email_per_branch'),
+        ),
+    ]
@@ -6,6 +6,9 @@ Teacher Model
 
 from django.db import models
 from django.conf import settings
+from branch.context import branch_of_new_rows
+from branch.managers import BranchManager
+from branch.models import Branch
 import os
 import uuid
 
@@ -20,7 +23,11 @@ def image_file_path(instance, filename):
 
 class Teacher(models.Model):
     """teacher in the system"""
-    email = models.EmailField(max_length=255, unique=True)
+    # indexed by teacher_email_per_branch
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT,
+                               related_name='teachers',
+                               default=branch_of_new_rows, db_index=False)
+    email = models.EmailField(max_length=255)
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
     phone_number = models.CharField(max_length=11)
@@ -38,6 +45,16 @@ class Teacher(models.Model):
     facebook = models.CharField(max_length=255, blank=True, null=True)
     youtube = models.CharField(max_length=255, blank=True, null=True)
     twitter =  models.CharField(max_length=255, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = BranchManager()
+
+    class Meta:
+        constraints = [
+            # checked by the serializers in the branch of the request
+            models.UniqueConstraint(fields=['branch', 'email'],
+                                    name='teacher_email_per_branch'),
+        ]
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -34,5 +34,27 @@ class DetailDashboardTeacher(serializers.ModelSerializer):
     courses = CourseSerializer(many=True, read_only=True)
     class Meta:
         model = Teacher
-        fields = '__all__'
-        read_only_fields = ['id', 'courses']
\ No newline at end of file
+        fields = ['id', 'courses', 'email', 'first_name', 'last_name',
+                  'phone_number', 'address', 'birth_day', 'gender', 'bio',
+                  'about', 'image', 'linked_in', 'facebook', 'youtube',
+                  'twitter', 'branch']
+        read_only_fields = ['id', 'courses', 'branch']
+
+    def validate_email(self, value):
+        """the email must not be another teacher's in the branch"""
+        teachers = Teacher.objects.filter(email=value)
+        if self.instance is not None:
+            teachers = teachers.exclude(id=self.instance.id)
+        if teachers.exists():
+            raise serializers.ValidationError(
+                'teacher with this email already exists.')
+        return value
+
+
+class SyncTeacherSerializer(serializers.ModelSerializer):
+    """Serializer for the teachers of the mobile sync"""
+    class Meta:
+        model = Teacher
+        fields = ['id', 'first_name', 'last_name', 'bio', 'about', 'image',
+                  'twitter', 'facebook', 'linked_in', 'youtube', 'updated_at']
+        read_only_fields = fields
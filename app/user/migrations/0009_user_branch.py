@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:51
+
+import branch.context
+from django.db import migrations, models
+import django.db.models.deletion
+from django.conf import settings
+
+
+def assign_default_branch(apps, schema_editor):
+    """the existing users belong to the default branch"""
+    Branch = apps.get_model('branch', 'Branch')
+    User = apps.get_model('user', 'User')
+    branch = Branch.objects.get(slug=settings.DEFAULT_BRANCH)
+    User.objects.update(branch=branch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('user', '0008_alter_user_gender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='branch',
+            field=models.ForeignKey(blank=True, default=branch.context.current_branch_id, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='branch.branch'),
+        ),
+        migrations.RunPython(assign_default_branch, migrations.RunPython.noop),
+    ]
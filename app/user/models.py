@@ -11,6 +11,8 @@ from django.contrib.auth.models import(
     PermissionsMixin,
 )
 from django.conf import settings
+from branch.context import current_branch_id
+from branch.models import Branch
 import os
 import uuid
 
@@ -66,6 +68,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     image = models.ImageField(upload_to=image_file_path, blank=True, null=True)
+    # the branch of the requests of the user, none to follow the host,
+    # like the users created outside a request
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL,
+                               related_name='users', null=True, blank=True,
+                               default=current_branch_id)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'
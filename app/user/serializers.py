@@ -7,7 +7,7 @@ from django.contrib.auth import(
     authenticate,
 )
 from rest_framework import serializers
-from course.models import CourseStudent
+from course.models import Enrollment
 from course.serializers import CourseSerializer
 
 
@@ -38,17 +38,27 @@ class AppUserSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+
+class OneItemListSerializer(serializers.ListSerializer):
+    """list of the single related instance"""
+    def to_representation(self, data):
+        return super().to_representation([data])
+
+
 class CourseStudentSerializer(serializers.ModelSerializer):
-    """serializer that links studen to the courses"""
-    courses = CourseSerializer(many=True, read_only=True)
+    """serializer that links studen to the courses, an enrollment shown
+    as the former course student with the list of its courses"""
+    courses = OneItemListSerializer(child=CourseSerializer(), source='course',
+                                    read_only=True)
     class Meta:
-        model = CourseStudent
+        model = Enrollment
         fields = ['paid', 'courses']
 
 
 class DetailAppUserSerializer(AppUserSerializer):
     """Detailed Serializer for the app user"""
-    course_student = CourseStudentSerializer(many=True, read_only=True)
+    course_student = CourseStudentSerializer(source='enrollments', many=True,
+                                             read_only=True)
     class Meta(AppUserSerializer.Meta):
         fields = AppUserSerializer.Meta.fields+['address', 'phone_number', 'gender', 'birth_day', 'course_student']
 